@@ -3,14 +3,18 @@ from __future__ import annotations as _annotations
 from collections.abc import Iterator
 from importlib.metadata import version
 from pathlib import Path
+from typing import cast
 
 import pytest
 
+from .config import parse_workers
 from .eval_example import EvalExample
 from .find_examples import CodeExample, find_examples
+from .lazy_globals import LazyGlobal
+from .session import ExamplesSession
 
 __version__ = version('pytest_examples')
-__all__ = 'find_examples', 'CodeExample', 'EvalExample'
+__all__ = 'find_examples', 'CodeExample', 'EvalExample', 'LazyGlobal'
 
 
 def pytest_addoption(parser) -> None:
@@ -24,11 +28,58 @@ def pytest_addoption(parser) -> None:
             'Update code examples to reflect print output and linting.'
         ),
     )
+    group.addoption(
+        '--update-examples-fixpoint',
+        action='store_true',
+        help=(
+            'Like --update-examples, but repeat formatting and updating print output for each example '
+            'until its code stops changing, so one run gives stable files.'
+        ),
+    )
     group.addoption(
         '--update-examples-disable-summary',
         action='store_true',
         help='Disable the summary of updated examples at the end of the test run.',
     )
+    group.addoption(
+        '--update-examples-workers',
+        type=parse_workers,
+        default='auto',
+        help=(
+            'Number of processes used to format examples passed to `run_many()` in update mode, '
+            'default "auto" which uses one per available CPU, 1 formats them in this process.'
+        ),
+    )
+    group.addoption(
+        '--examples-lint-prefetch',
+        type=int,
+        default=0,
+        help=(
+            'Lint the next N collected examples with ruff in background threads while each test runs, '
+            'default 0 which lints every collected example at once when the first is linted.'
+        ),
+    )
+    group.addoption(
+        '--examples-formatter',
+        choices=('black', 'ruff'),
+        default='black',
+        help='Backend used to format examples and print output, `ruff` uses `ruff format`, default black.',
+    )
+    group.addoption(
+        '--examples-max-checkpoints',
+        type=int,
+        default=16,
+        help='Maximum number of checkpoint processes kept by `run_group(..., checkpoints=True)`, default 16.',
+    )
+    group.addoption(
+        '--examples-ruff-servers',
+        type=int,
+        default=0,
+        help=(
+            'Number of long-lived `ruff server` processes to lint and fix examples with, '
+            'default 0 which starts ruff for each check instead.'
+        ),
+    )
 
 
 summary: str | None = None
@@ -49,10 +100,47 @@ def _examples_to_update(pytestconfig: pytest.Config) -> Iterator[list[CodeExampl
             summary = summary_
 
 
+def pytest_configure(config: pytest.Config) -> None:
+    """`--update-examples-fixpoint` implies `--update-examples`."""
+    if config.getoption('update_examples_fixpoint'):
+        config.option.update_examples = True
+
+
+_collected_examples = pytest.StashKey[list[CodeExample]]()
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    """Record the examples tests are parametrized with, so they can be linted and type checked together."""
+    examples: list[CodeExample] = []
+    for item in items:
+        callspec = getattr(item, 'callspec', None)
+        if callspec is not None:
+            examples.extend(v for v in callspec.params.values() if isinstance(v, CodeExample))
+    config.stash[_collected_examples] = examples
+
+
+@pytest.fixture(scope='session')
+def _examples_session(pytestconfig: pytest.Config) -> Iterator[ExamplesSession]:
+    """Don't use this directly, it holds resources shared by all `EvalExample` instances."""
+    session = ExamplesSession(
+        max_checkpoints=cast(int, pytestconfig.getoption('examples_max_checkpoints')),
+        ruff_servers=cast(int, pytestconfig.getoption('examples_ruff_servers')),
+        lint_prefetch=cast(int, pytestconfig.getoption('examples_lint_prefetch')),
+    )
+    collected = pytestconfig.stash.get(_collected_examples, [])
+    session.ruff.add(collected)
+    session.format_prefetch.add(collected)
+    session.mypy.add(collected)
+    yield session
+    session.close()
+
+
 @pytest.fixture(name='eval_example')
-def eval_example(tmp_path: Path, request: pytest.FixtureRequest, _examples_to_update) -> Iterator[EvalExample]:
+def eval_example(
+    tmp_path: Path, request: pytest.FixtureRequest, _examples_to_update, _examples_session
+) -> Iterator[EvalExample]:
     """Fixture to return a `EvalExample` instance for running and linting examples."""
-    eval_ex = EvalExample(tmp_path=tmp_path, pytest_request=request)
+    eval_ex = EvalExample(tmp_path=tmp_path, pytest_request=request, session=_examples_session)
     yield eval_ex
     if request.config.getoption('update_examples'):
         _examples_to_update.extend(eval_ex.to_update)
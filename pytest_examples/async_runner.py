@@ -0,0 +1,101 @@
+from __future__ import annotations as _annotations
+
+import asyncio
+import contextvars
+import sys
+import warnings
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+__all__ = 'AsyncRunner', 'LoopFactory', 'LeftoverTasksWarning'
+
+LoopFactory = Callable[[], asyncio.AbstractEventLoop]
+
+
+class LeftoverTasksWarning(UserWarning):
+    """Emitted when an example finishes while tasks it started are still pending."""
+
+
+if sys.version_info >= (3, 11):
+    from asyncio import Runner as _Runner
+else:
+
+    class _Runner:
+        """Minimal stand-in for `asyncio.Runner` which was added in Python 3.11."""
+
+        def __init__(self, *, loop_factory: LoopFactory | None = None):
+            self._loop_factory = loop_factory
+            self._loop: asyncio.AbstractEventLoop | None = None
+
+        def get_loop(self) -> asyncio.AbstractEventLoop:
+            if self._loop is None:
+                self._loop = self._loop_factory() if self._loop_factory else asyncio.new_event_loop()
+            return self._loop
+
+        def run(self, coro: Coroutine[Any, Any, Any], *, context: contextvars.Context | None = None) -> Any:
+            # `run_until_complete` already runs the task in a copy of the current context
+            return self.get_loop().run_until_complete(coro)
+
+        def close(self) -> None:
+            if self._loop is None:
+                return
+            loop = self._loop
+            try:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+                loop.run_until_complete(loop.shutdown_default_executor())
+            finally:
+                loop.close()
+                self._loop = None
+
+
+class AsyncRunner:
+    """Run coroutines from examples on one event loop which is reused for the whole session.
+
+    This avoids creating and tearing down a new event loop, default executor and signal handlers
+    for every example, as `asyncio.run()` does.
+    """
+
+    def __init__(self, loop_factory: LoopFactory | None = None):
+        self.loop_factory = loop_factory
+        self._runner = _Runner(loop_factory=loop_factory)
+
+    def run(self, coro: Coroutine[Any, Any, Any], *, label: str) -> Any:
+        """Run `coro` to completion, then cancel and report any tasks it left running.
+
+        Args:
+            coro: The coroutine to run.
+            label: Used to identify the example in the warning about leftover tasks.
+        """
+        __tracebackhide__ = True
+        try:
+            # run in a copy of the caller's context rather than the one captured when the loop was created,
+            # so e.g. the example's print routing applies inside the loop
+            return self._runner.run(coro, context=contextvars.copy_context())
+        finally:
+            self._cancel_leftover_tasks(label)
+
+    def close(self) -> None:
+        self._runner.close()
+
+    def _cancel_leftover_tasks(self, label: str) -> None:
+        loop = self._runner.get_loop()
+        if loop.is_closed():
+            return
+        tasks = [t for t in asyncio.all_tasks(loop) if not t.done()]
+        if not tasks:
+            return
+
+        for task in tasks:
+            task.cancel()
+
+        async def wait_cancelled() -> None:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._runner.run(wait_cancelled())
+        names = ', '.join(sorted(t.get_name() for t in tasks))
+        warnings.warn(
+            f'{label}: {len(tasks)} task(s) were still running when the example finished and have been cancelled: '
+            f'{names}',
+            LeftoverTasksWarning,
+            stacklevel=2,
+        )
@@ -0,0 +1,373 @@
+from __future__ import annotations as _annotations
+
+import hashlib
+import os
+import pickle
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable
+
+from .document import BlockResult, chain_rlimits, new_namespace, run_chain, worker_died_error
+from .lazy_globals import LazyGlobal, ResolveLazy
+from .limits import Limits
+
+if TYPE_CHECKING:
+    from .find_examples import CodeExample
+    from .run_code import PrintStatement
+
+__all__ = 'CheckpointStore', 'CheckpointRunBlock', 'globals_key'
+
+CheckpointRunBlock = Callable[['CodeExample', ModuleType, Any], 'list[PrintStatement] | None']
+"""Function to run one example in the namespace of the given module, with the state of the current run."""
+
+
+@dataclass
+class Checkpoint:
+    """A parked process holding the namespace of a chain after a given block."""
+
+    address: str
+    pid: int
+
+
+class CheckpointStore:
+    """Fork-based checkpoints, so a chain of examples can be resumed without replaying its earlier blocks.
+
+    After each block of a chain succeeds, the process running the chain forks, and the child is parked
+    waiting for commands on a unix socket. When a chain is run again and the sources of some of its leading blocks
+    are unchanged, it's resumed by forking the checkpoint after the last unchanged block.
+
+    At most `max_checkpoints` processes are kept, the least recently used is stopped first. Checkpoint processes
+    exit when the process which created them does, so checkpoints only survive for the life of the store,
+    e.g. one pytest session.
+    """
+
+    def __init__(self, max_checkpoints: int = 16):
+        self.max_checkpoints = max_checkpoints
+        self._checkpoints: OrderedDict[str, Checkpoint] = OrderedDict()
+        self._directory: Path | None = None
+
+    @staticmethod
+    def supported() -> bool:
+        return hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX')
+
+    def run_chain(
+        self,
+        chain: list[CodeExample],
+        run_block: CheckpointRunBlock,
+        *,
+        context: str,
+        module_globals: dict[str, Any] | None,
+        resolve_lazy: ResolveLazy | None = None,
+        limits: Callable[[CodeExample], Limits] | None = None,
+        run_state: Any = None,
+    ) -> list[BlockResult]:
+        """Run a chain of examples in a forked process, resuming from the best checkpoint available.
+
+        Args:
+            chain: The examples to run in order in one namespace.
+            run_block: Function to run one example in the namespace of the given module, it's called with
+                `run_state` as its third argument. A resumed checkpoint calls the `run_block` of the run which
+                parked it, so `run_block` should only depend on `context`, `run_state` and the example, not on
+                anything else it captures.
+            context: Identifies everything apart from the examples' sources which affects how blocks are run,
+                checkpoints are only reused for an identical context.
+            module_globals: Globals to add to the namespace before running the first block.
+            resolve_lazy: If not None, used to get the value of `LazyGlobal`s from `module_globals`.
+            limits: If not None, gives the limits for each example. The process running the chain applies the total
+                limits of the blocks it runs as rlimits, as `run_chains` does for its workers.
+            run_state: Picklable state for this run, e.g. the test's temporary directory, sent to resumed checkpoints.
+
+        Returns:
+            Results for every example in `chain`.
+        """
+        keys = chain_keys(chain, context)
+        start = 0
+        checkpoint = None
+        for i in range(len(chain), 0, -1):
+            checkpoint = self._checkpoints.get(keys[i - 1])
+            if checkpoint is not None:
+                self._checkpoints.move_to_end(keys[i - 1])
+                start = i
+                break
+
+        if start == len(chain):
+            # every block ran before, but we still need their print statements, so resume after the previous block
+            start -= 1
+            checkpoint = self._checkpoints.get(keys[start - 1]) if start else None
+
+        command = _Command(
+            chain,
+            start,
+            keys,
+            set(self._checkpoints),
+            self._get_directory(),
+            os.getpid(),
+            [limits(example) for example in chain] if limits else None,
+            run_state,
+        )
+        if checkpoint is not None:
+            response = self._resume(keys[start - 1], checkpoint, command)
+        else:
+            response = None
+        if response is None:
+            command.start = 0
+            response = _fork_and_run(command, run_block, new_namespace(module_globals, resolve_lazy), limits)
+
+        results, new_checkpoints = response
+        for key, new_checkpoint in new_checkpoints:
+            self._add(key, new_checkpoint)
+        return [BlockResult(from_checkpoint=True) if r is None else r for r in results]
+
+    def close(self) -> None:
+        while self._checkpoints:
+            _, checkpoint = self._checkpoints.popitem()
+            _stop(checkpoint)
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def __len__(self) -> int:
+        return len(self._checkpoints)
+
+    def _resume(self, key: str, checkpoint: Checkpoint, command: _Command) -> _Response | None:
+        try:
+            conn = _connect(checkpoint.address)
+            with conn:
+                conn.send(command)
+                results: list[BlockResult | None] = [None] * len(command.chain)
+                return results, _receive(conn, results, command.start)
+        except (OSError, EOFError):
+            # the process has died, forget about it
+            self._checkpoints.pop(key, None)
+            return None
+
+    def _add(self, key: str, checkpoint: Checkpoint) -> None:
+        if key in self._checkpoints:
+            _stop(checkpoint)
+            return
+        self._checkpoints[key] = checkpoint
+        while len(self._checkpoints) > self.max_checkpoints:
+            _, evicted = self._checkpoints.popitem(last=False)
+            _stop(evicted)
+
+    def _get_directory(self) -> str:
+        if self._directory is None:
+            # keep this short, unix socket paths are limited to around 100 characters
+            self._directory = Path(tempfile.mkdtemp(prefix='pytest-examples-'))
+        return str(self._directory)
+
+
+def globals_key(module_globals: dict[str, Any] | None) -> str | None:
+    """Key identifying the values of `module_globals`, for use in a checkpoint's context.
+
+    Values are identified by a hash of their pickle, and `LazyGlobal`s by their factory and scope.
+
+    Returns:
+        The key, or `None` if a value can't be pickled, in which case checkpoints can't be used safely.
+    """
+    h = hashlib.sha256()
+    for name, value in sorted((module_globals or {}).items()):
+        if isinstance(value, LazyGlobal):
+            factory = value.factory
+            part = f'lazy:{getattr(factory, "__qualname__", "")}:{id(factory)}:{value.scope}'.encode()
+        else:
+            try:
+                part = pickle.dumps(value)
+            except Exception:
+                return None
+        h.update(f'\0{name}\0'.encode())
+        h.update(hashlib.sha256(part).digest())
+    return h.hexdigest()
+
+
+def chain_keys(chain: list[CodeExample], context: str) -> list[str]:
+    """Keys identifying the state of the namespace after each block of `chain`."""
+    h = hashlib.sha256(context.encode())
+    keys: list[str] = []
+    for example in chain:
+        h.update(f'\0{example.path}\0{example.source}'.encode())
+        keys.append(h.hexdigest())
+    return keys
+
+
+@dataclass
+class _Command:
+    chain: list[CodeExample]
+    start: int
+    keys: list[str]
+    existing_keys: set[str]
+    directory: str
+    main_pid: int
+    limits: list[Limits] | None
+    """The limits of each block, if any."""
+    run_state: Any
+    """Passed to `run_block`, so blocks run in resumed checkpoints use the state of the current run."""
+
+
+# results for each block in the chain, `None` for blocks before `start`, and the new checkpoints
+_Response = tuple['list[BlockResult | None]', 'list[tuple[str, Checkpoint]]']
+
+
+def _fork_and_run(
+    command: _Command, run_block: CheckpointRunBlock, module: ModuleType, limits: Callable[[CodeExample], Limits] | None
+) -> _Response:
+    """Fork a process to run the chain from `command.start` and wait for its results."""
+    parent_sock, child_sock = socket.socketpair()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        parent_sock.close()
+        with Connection(child_sock.detach()) as conn:
+            _run_and_exit(conn, command, run_block, module)
+
+    child_sock.close()
+    with Connection(parent_sock.detach()) as conn:
+        results: list[BlockResult | None] = [None] * len(command.chain)
+        try:
+            return results, _receive(conn, results, command.start)
+        except EOFError:
+            _, status = os.waitpid(pid, 0)
+            # results are sent as each block finishes, so only the block being run is lost
+            index = next(i for i in range(command.start, len(results)) if results[i] is None)
+            error = worker_died_error(os.waitstatus_to_exitcode(status), command.chain[index], limits)
+            results[index] = BlockResult(error=error)
+            results[index + 1 :] = [BlockResult(skipped=True) for _ in command.chain[index + 1 :]]
+            return results, []
+        finally:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+def _receive(conn: Connection, results: list[BlockResult | None], start: int) -> list[tuple[str, Checkpoint]]:
+    """Receive the result of each block run from `start` into `results`, then return the new checkpoints.
+
+    Raises:
+        EOFError: if the process running the chain died, the results of the blocks it finished are in `results`.
+    """
+    index = start
+    while True:
+        message = conn.recv()
+        if not isinstance(message, BlockResult):
+            return message
+        results[index] = message
+        index += 1
+
+
+def _run_and_exit(conn: Connection, command: _Command, run_block: CheckpointRunBlock, module: ModuleType) -> None:
+    """Run blocks from `command.start`, parking a checkpoint process after each successful block.
+
+    The result of each block is sent as soon as it finishes, followed by the new checkpoints.
+    """
+    try:
+        apply_rlimits = chain_rlimits(command.limits[command.start :]) if command.limits is not None else None
+        checkpoints: list[tuple[str, Checkpoint]] = []
+        keys = iter(command.keys[command.start :])
+
+        def run(example: CodeExample, module: ModuleType) -> list[PrintStatement] | None:
+            return run_block(example, module, command.run_state)
+
+        def on_result(result: BlockResult) -> None:
+            conn.send(result)
+            key = next(keys)
+            if result.error is None and not result.skipped and key not in command.existing_keys:
+                checkpoints.append((key, _park(key, command, conn, run_block, module)))
+
+        run_chain(command.chain[command.start :], run, module, on_result=on_result, apply_rlimits=apply_rlimits)
+        conn.send(checkpoints)
+    finally:
+        conn.close()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # skip pytest's and atexit cleanup, which belongs to the main process
+        os._exit(0)
+
+
+def _park(
+    key: str, command: _Command, conn: Connection, run_block: CheckpointRunBlock, module: ModuleType
+) -> Checkpoint:
+    """Fork a copy of this process which waits for commands to resume the chain from its current state."""
+    address = os.path.join(command.directory, f'{key[:16]}-{os.getpid()}.sock')
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(address)
+    listener.listen()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        # the connection belongs to the process running the chain, the main process must see EOF if that dies
+        conn.close()
+        _serve(listener, address, command.main_pid, run_block, module)
+    listener.close()
+    return Checkpoint(address, pid)
+
+
+def _serve(
+    listener: socket.socket, address: str, main_pid: int, run_block: CheckpointRunBlock, module: ModuleType
+) -> None:
+    # children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    listener.settimeout(1)
+    try:
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except socket.timeout:
+                if not _is_alive(main_pid):
+                    return
+                continue
+            sock.settimeout(None)
+            conn = Connection(sock.detach())
+            try:
+                command = conn.recv()
+            except EOFError:
+                conn.close()
+                continue
+            if command is None:
+                conn.close()
+                return
+            if os.fork() == 0:
+                listener.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                _run_and_exit(conn, command, run_block, module)
+            conn.close()
+    finally:
+        listener.close()
+        try:
+            os.unlink(address)
+        except OSError:
+            pass
+        os._exit(0)
+
+
+def _connect(address: str) -> Connection:
+    sock = socket.socket(socket.AF_UNIX)
+    sock.connect(address)
+    return Connection(sock.detach())
+
+
+def _stop(checkpoint: Checkpoint) -> None:
+    try:
+        with _connect(checkpoint.address) as conn:
+            conn.send(None)
+    except OSError:
+        try:
+            os.kill(checkpoint.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
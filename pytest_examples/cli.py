@@ -0,0 +1,221 @@
+"""The `pytest-examples` command, to lint, format and check examples without running pytest."""
+
+from __future__ import annotations as _annotations
+
+import argparse
+import sys
+import tempfile
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from textwrap import indent
+from types import ModuleType
+from typing import TypeVar
+
+from _pytest.outcomes import Failed as PytestFailed
+from black.parsing import InvalidInput
+
+from .config import DEFAULT_LINE_LENGTH, ExamplesConfig, parse_workers, pool_context
+from .document import run_chains
+from .find_examples import CodeExample, find_examples
+from .limits import Limits
+from .lint import FormatError, black_check, format_example, prefetch_format, ruff_check_batch, ruff_message
+from .modify_files import _modify_files
+from .run_code import InsertPrintStatements, PrintStatement, run_code
+from .virtual_time import uses_virtual_time
+
+__all__ = ('main',)
+
+T = TypeVar('T')
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Run the `pytest-examples` command, returning the exit code."""
+    parser = _parser()
+    args = parser.parse_args(argv)
+    config = ExamplesConfig(
+        line_length=args.line_length,
+        quotes=args.quotes,
+        magic_trailing_comma=not args.skip_magic_trailing_comma,
+        target_version=args.target_version,
+        upgrade=args.upgrade,
+        isort=args.isort,
+        ruff_line_length=args.ruff_line_length,
+        ruff_select=args.ruff_select,
+        ruff_ignore=args.ruff_ignore,
+        formatter=args.formatter,
+    )
+    examples = list(find_examples(*args.paths))
+    if args.command == 'lint':
+        errors = lint(examples, config, args.workers)
+    elif args.command == 'format':
+        errors = format_examples(examples, config, args.workers)
+    else:
+        errors = check_prints(examples, config, args.workers, update=args.update)
+
+    for example, error in errors:
+        print(f'{example}:\n{indent(error, "  ")}')
+    if errors:
+        print(f'{len(errors)} of {len(examples)} example(s) failed')
+        return 1
+    print(f'{len(examples)} example(s) passed')
+    return 0
+
+
+def lint(examples: list[CodeExample], config: ExamplesConfig, workers: int) -> list[tuple[CodeExample, str]]:
+    """Lint examples with ruff in one process, and check they're formatted in a pool of worker processes."""
+    errors: dict[int, list[str]] = {}
+    for index, diagnostics in enumerate(ruff_check_batch(examples, config)):
+        if diagnostics:
+            errors.setdefault(index, []).append(ruff_message(diagnostics))
+    if not _use_pool(examples, workers):
+        # worker processes don't share the cache, so there'd be no point formatting all the examples here first
+        prefetch_format(examples, config)
+    for index, (_, error) in enumerate(_map(black_check, examples, config, workers)):
+        if error is not None:
+            errors.setdefault(index, []).append(error)
+    return [(examples[index], '\n'.join(errors[index])) for index in sorted(errors)]
+
+
+def format_examples(examples: list[CodeExample], config: ExamplesConfig, workers: int) -> list[tuple[CodeExample, str]]:
+    """Fix examples with ruff and format them in a pool of worker processes, then update the files in place."""
+    errors: list[tuple[CodeExample, str]] = []
+    to_update: list[CodeExample] = []
+    for example, (new_source, error) in zip(examples, _map(format_example, examples, config, workers)):
+        if new_source is None:
+            errors.append((example, error or ''))
+        elif new_source != example.source:
+            example.source = new_source
+            to_update.append(example)
+    _update_files(to_update)
+    return errors
+
+
+def check_prints(
+    examples: list[CodeExample], config: ExamplesConfig, workers: int, *, update: bool
+) -> list[tuple[CodeExample, str]]:
+    """Run each example in its own namespace in forked worker processes, then check or update print statements."""
+    with tempfile.TemporaryDirectory(prefix='pytest-examples-') as tmp_dir:
+
+        def run_block(example: CodeExample, module: ModuleType) -> list[PrintStatement] | None:
+            python_file = Path(tmp_dir) / f'{example.module_name}.py'
+            python_file.write_text(example.source)
+            insert_print, _ = run_code(
+                example=example,
+                python_file=python_file,
+                loader=None,
+                config=config,
+                enable_print_mock=True,
+                print_callback=None,
+                include_print=None,
+                module_globals=None,
+                call=None,
+                limits=Limits.for_example(example, config),
+                module=module,
+                virtual_time=uses_virtual_time(example, config),
+            )
+            return insert_print.print_statements()
+
+        results = run_chains(
+            [[example] for example in examples],
+            run_block,
+            max_workers=workers,
+            limits=partial(Limits.for_example, config=config),
+        )
+
+    errors: list[tuple[CodeExample, str]] = []
+    to_update: list[CodeExample] = []
+    for example, result in zip(examples, results):
+        if result.error is not None:
+            errors.append((example, result.error.rstrip('\n')))
+            continue
+        insert_print = InsertPrintStatements.from_statements(
+            Path(f'{example.module_name}.py'), config, result.statements or [], None
+        )
+        if update:
+            new_source = insert_print.updated_print_statements(example)
+            if new_source:
+                example.source = new_source
+                to_update.append(example)
+        else:
+            try:
+                insert_print.check_print_statements(example)
+            except PytestFailed as exc:
+                errors.append((example, exc.msg or str(exc)))
+    _update_files(to_update)
+    return errors
+
+
+def _update_files(examples: list[CodeExample]) -> None:
+    if examples:
+        print(_modify_files(examples))
+
+
+def _map(
+    func: Callable[[CodeExample, ExamplesConfig], T], examples: list[CodeExample], config: ExamplesConfig, workers: int
+) -> list[tuple[T | None, str | None]]:
+    """Call `func` for each example, in a pool of worker processes if `workers` is more than 1.
+
+    Returns:
+        For each example in order, the result and `None`, or `None` and the message of the `FormatError` raised,
+        or of the `InvalidInput` raised by the formatter if the example can't be parsed.
+    """
+    if _use_pool(examples, workers):
+        with ProcessPoolExecutor(workers, mp_context=pool_context()) as pool:
+            futures = [pool.submit(func, example, config) for example in examples]
+            return [_outcome(future.result) for future in futures]
+    return [_outcome(partial(func, example, config)) for example in examples]
+
+
+def _use_pool(examples: list[CodeExample], workers: int) -> bool:
+    return workers > 1 and len(examples) > 1
+
+
+def _outcome(call: Callable[[], T]) -> tuple[T | None, str | None]:
+    try:
+        return call(), None
+    except (FormatError, InvalidInput) as exc:
+        return None, str(exc)
+
+
+def _rules(value: str) -> list[str]:
+    return [rule for rule in value.split(',') if rule]
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='pytest-examples', description='Lint, format and check code examples in markdown files and docstrings.'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    commands = {
+        'lint': 'Check examples with ruff and the formatter.',
+        'format': 'Fix examples with ruff and format them, updating files in place.',
+        'check-prints': 'Run examples and check their print output.',
+    }
+    for name, help_text in commands.items():
+        command = subparsers.add_parser(name, help=help_text, description=help_text)
+        command.add_argument('paths', nargs='+', help='Files or directories to find examples in.')
+        command.add_argument('--line-length', type=int, default=DEFAULT_LINE_LENGTH)
+        command.add_argument('--quotes', choices=('single', 'double', 'either'), default='either')
+        command.add_argument('--skip-magic-trailing-comma', action='store_true')
+        command.add_argument('--target-version', default='py37')
+        command.add_argument('--upgrade', action='store_true', help='Upgrade code to the target version.')
+        command.add_argument('--isort', action='store_true', help="Sort imports with ruff's isort rules.")
+        command.add_argument('--ruff-line-length', type=int)
+        command.add_argument('--ruff-select', type=_rules, help='Comma separated ruff rules to select.')
+        command.add_argument('--ruff-ignore', type=_rules, help='Comma separated ruff rules to ignore.')
+        command.add_argument('--formatter', choices=('black', 'ruff'), default='black')
+        command.add_argument(
+            '--workers',
+            type=parse_workers,
+            default='auto',
+            help='Number of worker processes, default "auto" which uses one per available CPU.',
+        )
+        if name == 'check-prints':
+            command.add_argument('--update', action='store_true', help='Update print output in place.')
+    return parser
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,14 @@
 from __future__ import annotations as _annotations
 
 import hashlib
+import multiprocessing
+import os
 import tempfile
+import threading
+from collections.abc import Sequence
 from dataclasses import dataclass
+from functools import cache
+from multiprocessing.context import BaseContext
 from pathlib import Path
 from typing import TYPE_CHECKING
 
@@ -16,8 +22,14 @@ if TYPE_CHECKING:
 __all__ = 'ExamplesConfig', 'DEFAULT_LINE_LENGTH'
 
 
-@dataclass
+@dataclass(frozen=True)
 class ExamplesConfig:
+    """Settings for linting, formatting and running examples.
+
+    Configs are immutable and hashable, so the black mode and ruff arguments derived from them are
+    computed once for each distinct config and shared by the whole process.
+    """
+
     line_length: int = DEFAULT_LINE_LENGTH
     quotes: Literal['single', 'double', 'either'] = 'either'
     magic_trailing_comma: bool = True
@@ -25,69 +37,164 @@ class ExamplesConfig:
     upgrade: bool = False
     isort: bool = False
     ruff_line_length: int | None = None
-    ruff_select: list[str] | None = None
-    ruff_ignore: list[str] | None = None
+    ruff_select: Sequence[str] | None = None
+    ruff_ignore: Sequence[str] | None = None
+    formatter: Literal['black', 'ruff'] = 'black'
+    """Backend used to format examples and print output, `'ruff'` uses `ruff format` which is much faster."""
     white_space_dot: bool = False
     """If True, replace spaces with `·` in example diffs."""
-
-    def black_mode(self):
-        return BlackMode(
-            line_length=self.line_length,
-            target_versions={BlackTargetVersion[self.target_version.upper()]} if self.target_version else set(),
-            string_normalization=self.quotes == 'double',
-            magic_trailing_comma=self.magic_trailing_comma,
-        )
+    timeout: float | None = None
+    """Wall-clock time limit in seconds for running each example."""
+    cpu_limit: float | None = None
+    """CPU time limit in seconds for running each example."""
+    memory_limit: int | None = None
+    """Limit in bytes on the extra address space each example may allocate."""
+    virtual_time: bool = False
+    """If True, run examples with a virtual clock so sleeps return immediately."""
+    print_max_per_line: int | None = None
+    """Maximum number of prints recorded from each line of an example, later prints from the line are only counted."""
+    print_max_arg_bytes: int | None = None
+    """Maximum size in bytes of each recorded print argument, longer arguments are truncated."""
+    print_max_bytes: int | None = None
+    """Maximum total size in bytes of the print arguments recorded for an example, later prints are only counted."""
+
+    def __post_init__(self) -> None:
+        # lists are accepted for convenience, but stored as tuples so the config is hashable
+        for name in 'ruff_select', 'ruff_ignore':
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, tuple):
+                object.__setattr__(self, name, tuple(value))
+
+    def black_mode(self) -> BlackMode:
+        return _black_mode(self)
 
     def hash(self) -> str:
-        # str(self) should be a good identifier of a specific config
-        return hashlib.md5(str(self).encode()).hexdigest()
+        return _config_hash(self)
 
     def ruff_config(self) -> tuple[str, ...]:
-        config_lines: list[str] = []
-        select: list[str] = []
-        ignore: list[str] = []
-        args: list[str] = []
-
-        # line length is enforced by black
-        if self.ruff_line_length is None:
-            # if not ruff line length, ignore E501 which is line length errors
-            # by default, ruff sets the line length to 88
-            ignore.append('E501')
-        else:
-            args.append(f'--line-length={self.ruff_line_length}')
-
-        if self.ruff_select:
-            select.extend(self.ruff_select)
-
-        if self.quotes == 'single':
-            # enforce single quotes using ruff, black will enforce double quotes
-            select.append('Q')
-            config_lines.append("flake8-quotes = {inline-quotes = 'single', multiline-quotes = 'double'}")
-
-        if self.target_version:
-            args.append(f'--target-version={self.target_version}')
-
-        if self.upgrade:
-            select.append('UP')
-        if self.isort:
-            select.append('I')
-
-        if self.ruff_ignore:
-            ignore.extend(self.ruff_ignore)
-
-        if select:
-            # use extend to not disable default select
-            args.append(f'--extend-select={",".join(select)}')
-        if ignore:
-            args.append(f'--ignore={",".join(ignore)}')
-
-        if config_lines:
-            config_toml = '\n'.join(config_lines)
-            config_file = Path(tempfile.gettempdir()) / 'pytest-examples-ruff-config' / self.hash() / 'ruff.toml'
-            if not config_file.exists() or config_file.read_text() != config_toml:
-                config_file.parent.mkdir(parents=True, exist_ok=True)
-                config_file.write_text(config_toml)
-
-            args.append(f'--config={config_file}')
-
-        return tuple(args)
+        return _ruff_config(self)
+
+    def ruff_format_config(self) -> tuple[str, ...]:
+        return _ruff_format_config(self)
+
+
+@cache
+def _black_mode(config: ExamplesConfig) -> BlackMode:
+    return BlackMode(
+        line_length=config.line_length,
+        target_versions={BlackTargetVersion[config.target_version.upper()]} if config.target_version else set(),
+        string_normalization=config.quotes == 'double',
+        magic_trailing_comma=config.magic_trailing_comma,
+    )
+
+
+@cache
+def _config_hash(config: ExamplesConfig) -> str:
+    # str(config) should be a good identifier of a specific config
+    return hashlib.md5(str(config).encode()).hexdigest()
+
+
+@cache
+def _ruff_config(config: ExamplesConfig) -> tuple[str, ...]:
+    config_lines: list[str] = []
+    select: list[str] = []
+    ignore: list[str] = []
+    args: list[str] = []
+
+    # line length is enforced by black
+    if config.ruff_line_length is None:
+        # if not ruff line length, ignore E501 which is line length errors
+        # by default, ruff sets the line length to 88
+        ignore.append('E501')
+    else:
+        args.append(f'--line-length={config.ruff_line_length}')
+
+    if config.ruff_select:
+        select.extend(config.ruff_select)
+
+    if config.quotes == 'single':
+        # enforce single quotes using ruff, black will enforce double quotes
+        select.append('Q')
+        config_lines.append("flake8-quotes = {inline-quotes = 'single', multiline-quotes = 'double'}")
+
+    if config.target_version:
+        args.append(f'--target-version={config.target_version}')
+
+    if config.upgrade:
+        select.append('UP')
+    if config.isort:
+        select.append('I')
+
+    if config.ruff_ignore:
+        ignore.extend(config.ruff_ignore)
+
+    if select:
+        # use extend to not disable default select
+        args.append(f'--extend-select={",".join(select)}')
+    if ignore:
+        args.append(f'--ignore={",".join(ignore)}')
+
+    if config_lines:
+        config_file = write_config_file('pytest-examples-ruff-config', '\n'.join(config_lines))
+        args.append(f'--config={config_file}')
+
+    return tuple(args)
+
+
+@cache
+def _ruff_format_config(config: ExamplesConfig) -> tuple[str, ...]:
+    # settings equivalent to `black_mode()`, isolated from the project's config as black is
+    args = ['--isolated', f'--line-length={config.line_length}']
+    if config.target_version:
+        args.append(f'--target-version={config.target_version}')
+    quote_style = 'double' if config.quotes == 'double' else 'preserve'
+    args += '--config', f'format.quote-style = "{quote_style}"'
+    if not config.magic_trailing_comma:
+        args += '--config', 'format.skip-magic-trailing-comma = true'
+    return tuple(args)
+
+
+def write_config_file(directory: str, content: str) -> Path:
+    """Write a `ruff.toml` under a path derived from its content in the temp directory.
+
+    Since the path is content-addressed, an existing file never needs rewriting. The file is written to a
+    temporary name and renamed into place, so concurrent processes, e.g. xdist workers, never see it half-written.
+    """
+    content_hash = hashlib.md5(content.encode()).hexdigest()
+    config_file = Path(tempfile.gettempdir()) / directory / content_hash / 'ruff.toml'
+    if not config_file.exists():
+        config_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=config_file.parent, prefix='.ruff-', suffix='.toml')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            os.replace(tmp_name, config_file)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+    return config_file
+
+
+def parse_workers(value: str) -> int:
+    """Parse a number of worker processes, `'auto'` means one per CPU available to this process."""
+    if value == 'auto':
+        try:
+            return len(os.sched_getaffinity(0))
+        except AttributeError:
+            return os.cpu_count() or 1
+    return int(value)
+
+
+def fork_is_safe() -> bool:
+    """Whether worker processes can be forked from this process, so they inherit state which can't be pickled.
+
+    Only while no other threads are running, e.g. ruff server readers, lint prefetching or a process pool's manager:
+    a lock one of them holds when the process forks stays locked forever in the child.
+    """
+    return hasattr(os, 'fork') and threading.active_count() == 1
+
+
+def pool_context() -> BaseContext:
+    """Multiprocessing context for pools of workers which only get pickled arguments, these never fork."""
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(method)
@@ -0,0 +1,344 @@
+from __future__ import annotations as _annotations
+
+import ast
+import multiprocessing
+import os
+import sys
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from multiprocessing.process import BaseProcess
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
+
+from _pytest.outcomes import Failed as PytestFailed
+
+from .config import fork_is_safe
+from .find_examples import parse_source
+from .lazy_globals import ResolveLazy, apply_module_globals
+from .limits import Limits, child_rlimits, describe_child_exit
+from .traceback import format_example_exception
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from .find_examples import CodeExample
+    from .run_code import PrintStatement
+
+__all__ = 'block_names', 'split_chains', 'run_chains', 'run_chain', 'BlockResult'
+
+# calls which can read or write any global, so we can't tell which blocks depend on each other
+_dynamic_scope_calls = {'globals', 'locals', 'vars', 'exec', 'eval', '__import__'}
+# nodes whose body runs when it's called or iterated, so the globals it uses are looked up then, not when it's defined
+_deferred_scopes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef, ast.GeneratorExp)
+
+
+def block_names(source: str) -> tuple[set[str], set[str], set[str]] | None:
+    """Find the global names a block of code binds and uses.
+
+    This is deliberately conservative: names bound or read in nested scopes are counted too, since over-counting
+    just means more blocks get run in the same chain.
+
+    Returns:
+        A tuple of `(bound, used, deferred)` names, where `deferred` are the used names which are read inside
+        a function, class or generator body, so may be looked up after later blocks have run. `None` if the block
+        uses `import *` or a call like `globals()` which makes static analysis impossible.
+    """
+    tree = parse_source(source)
+    bound: set[str] = set()
+    used: set[str] = set()
+    deferred: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                used.add(node.id)
+                if node.id in _dynamic_scope_calls:
+                    return None
+            else:
+                bound.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == '*':
+                    return None
+                bound.add(alias.asname or alias.name.partition('.')[0])
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            used.add(node.target.id)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar, ast.ExceptHandler)) and node.name is not None:
+            bound.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest is not None:
+            bound.add(node.rest)
+
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        if isinstance(node, _deferred_scopes):
+            deferred.update(n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load))
+    return bound, used, deferred
+
+
+def split_chains(examples: Sequence[CodeExample]) -> list[list[CodeExample]]:
+    """Split the examples from one document into independent chains.
+
+    Each block depends on the nearest earlier block which binds a name it uses. A name read inside a function,
+    class or generator body is looked up when that's called, which may be after any later block has rebound it,
+    so the block also depends on every later block binding it.
+    Blocks connected by dependencies form a chain which must be run in order in one namespace, but separate chains
+    can run concurrently.
+    Blocks which can't be parsed are put in a chain of their own.
+    Chains are returned ordered by their first block, and each chain is in document order.
+    """
+    parent = list(range(len(examples)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        parent[find(j)] = find(i)
+
+    last_binder: dict[str, int] = {}
+    deferred_users: dict[str, list[int]] = {}
+    for i, example in enumerate(examples):
+        try:
+            names = block_names(example.source)
+        except SyntaxError:
+            # a chain of its own, so the error is reported when the block is run without stopping any others
+            continue
+        if names is None:
+            # give up on splitting, run everything in one chain
+            return [list(examples)] if examples else []
+        bound, used, deferred = names
+        for name in used:
+            binder = last_binder.get(name)
+            if binder is not None:
+                union(binder, i)
+        for name in bound:
+            last_binder[name] = i
+            users = deferred_users.get(name)
+            if users:
+                for user in users:
+                    union(user, i)
+                # the users are now in one chain, so linking the first is enough for later binders
+                del users[1:]
+        for name in deferred:
+            deferred_users.setdefault(name, []).append(i)
+
+    chains: dict[int, list[CodeExample]] = {}
+    for i, example in enumerate(examples):
+        chains.setdefault(find(i), []).append(example)
+    return list(chains.values())
+
+
+@dataclass
+class BlockResult:
+    """The outcome of running one block of a chain."""
+
+    statements: list[PrintStatement] | None = None
+    """Print statements captured while running the block, `None` if print wasn't mocked or the block didn't run."""
+    error: str | None = None
+    """Formatted traceback if the block raised an exception."""
+    skipped: bool = False
+    """True if the block wasn't run because an earlier block in its chain failed."""
+    from_checkpoint: bool = False
+    """True if the block wasn't run because the chain was resumed from a checkpoint after it."""
+    globals_summary: dict[str, str] | None = None
+    """Abbreviated reprs of the namespace's globals after the block ran, only set when run in a sub-interpreter."""
+
+
+RunBlock = Callable[['CodeExample', ModuleType], 'list[PrintStatement] | None']
+
+
+def run_chains(
+    chains: list[list[CodeExample]],
+    run_block: RunBlock,
+    *,
+    module_globals: dict[str, Any] | None = None,
+    resolve_lazy: ResolveLazy | None = None,
+    max_workers: int | None = None,
+    limits: Callable[[CodeExample], Limits] | None = None,
+) -> list[BlockResult]:
+    """Run each chain in its own namespace, concurrently in forked worker processes where possible.
+
+    Workers are forked so they inherit `run_block` and the namespaces, which can't be pickled. That's only done while
+    no other threads are running, see `fork_is_safe`. Otherwise, or with one worker, the blocks are run in this process
+    in a single namespace, in document order as if they were run one by one.
+
+    Args:
+        chains: Chains of examples as returned by `split_chains`.
+        run_block: Function to run one example in the namespace of the given module.
+        module_globals: Globals to add to each chain's namespace before running its first block.
+        resolve_lazy: If not None, used to get the value of `LazyGlobal`s from `module_globals`.
+        max_workers: Maximum number of worker processes, defaults to the number of CPUs.
+        limits: If not None, gives the limits for each example. Worker processes are started with the total
+            limits of their chain as rlimits, so the kernel stops a worker whose example can't be interrupted.
+
+    Returns:
+        Results for every example, in the order of the examples in `chains`.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if len(chains) < 2 or max_workers < 2 or not fork_is_safe():
+        # the chains gain nothing from being isolated, so run them in one namespace like blocks run one by one
+        return _run_in_document_order(chains, run_block, new_namespace(module_globals, resolve_lazy))
+
+    ctx = multiprocessing.get_context('fork')
+    results: dict[int, list[BlockResult]] = {}
+    pending = list(enumerate(chains))
+    running: dict[Connection, tuple[int, BaseProcess]] = {}
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index, chain = pending.pop(0)
+            recv_conn, send_conn = ctx.Pipe(duplex=False)
+            apply_rlimits = chain_rlimits([limits(example) for example in chain]) if limits else None
+            process = ctx.Process(
+                target=_chain_worker,
+                args=(chain, run_block, new_namespace(module_globals, resolve_lazy), send_conn, apply_rlimits),
+                daemon=True,
+            )
+            process.start()
+            send_conn.close()
+            running[recv_conn] = index, process
+            results[index] = []
+
+        for conn in wait(list(running)):
+            assert isinstance(conn, Connection)
+            index, process = running[conn]
+            chain, chain_results = chains[index], results[index]
+            # results are sent as each block finishes, so a worker dying only loses the block it was running
+            try:
+                chain_results.append(conn.recv())
+            except EOFError:
+                process.join()
+                example = chain[len(chain_results)]
+                chain_results.append(BlockResult(error=worker_died_error(process.exitcode, example, limits)))
+                chain_results.extend(BlockResult(skipped=True) for _ in chain[len(chain_results) :])
+            if len(chain_results) == len(chain):
+                del running[conn]
+                conn.close()
+                process.join()
+
+    return [r for index in range(len(chains)) for r in results[index]]
+
+
+def _run_in_document_order(
+    chains: list[list[CodeExample]], run_block: RunBlock, module: ModuleType
+) -> list[BlockResult]:
+    """Run the blocks of all `chains` in `module` in document order, so a block can't see changes from later ones.
+
+    As with `run_chain`, the blocks after one which fails in the same chain are skipped.
+    """
+    paths: dict[Path, int] = {}
+    for chain in chains:
+        for example in chain:
+            paths.setdefault(example.path, len(paths))
+    blocks = [(index, example) for index, chain in enumerate(chains) for example in chain]
+    # the sort is stable and each chain is in document order, so each chain's blocks stay in order
+    blocks.sort(key=lambda block: (paths[block[1].path], block[1].start_line))
+    results: list[list[BlockResult]] = [[] for _ in chains]
+    for index, example in blocks:
+        chain_results = results[index]
+        if chain_results and (chain_results[-1].error is not None or chain_results[-1].skipped):
+            # later blocks depend on the failed one, don't run them
+            chain_results.append(BlockResult(skipped=True))
+        else:
+            chain_results.append(run_block_result(example, module, run_block))
+    return [r for chain_results in results for r in chain_results]
+
+
+def chain_rlimits(limits: Sequence[Limits]) -> Callable[[], None] | None:
+    """Function to apply the total of the `limits` of a chain's blocks as rlimits in the process running it.
+
+    Returns `None` if there are no limits, or rlimits aren't supported, in which case the limits enforced while
+    running each block report the problem.
+    """
+    chain_limits = Limits.for_chain(limits)
+    if not chain_limits:
+        return None
+    try:
+        return child_rlimits(chain_limits)
+    except RuntimeError:
+        return None
+
+
+def worker_died_error(
+    exitcode: int | None, example: CodeExample, limits: Callable[[CodeExample], Limits] | None
+) -> str:
+    """Error for a worker process which died while running `example`, naming the limit it breached if possible."""
+    if exitcode is not None and limits is not None:
+        message = describe_child_exit(exitcode, limits(example), example)
+        if message is not None:
+            return f'{message}\n'
+    return f'worker process running this example died with exit code {exitcode}\n'
+
+
+def _chain_worker(
+    chain: list[CodeExample],
+    run_block: RunBlock,
+    module: ModuleType,
+    conn: Connection,
+    apply_rlimits: Callable[[], None] | None,
+) -> None:
+    try:
+        run_chain(chain, run_block, module, on_result=conn.send, apply_rlimits=apply_rlimits)
+    finally:
+        conn.close()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # skip pytest's and atexit cleanup, which belongs to the parent process
+        os._exit(0)
+
+
+def run_chain(
+    chain: Sequence[CodeExample],
+    run_block: RunBlock,
+    module: ModuleType,
+    *,
+    on_result: Callable[[BlockResult], None] | None = None,
+    apply_rlimits: Callable[[], None] | None = None,
+) -> list[BlockResult]:
+    """Run the blocks of a chain in order in `module`, skipping the blocks after one which fails.
+
+    Args:
+        chain: The examples to run.
+        run_block: Function to run one example in the namespace of the given module.
+        module: The module whose namespace the blocks share.
+        on_result: If not None, called with the result of each block as soon as it's known.
+        apply_rlimits: If not None, called before running the first block, as returned by `chain_rlimits`.
+
+    Returns:
+        Results for every example in `chain`.
+    """
+    if apply_rlimits is not None:
+        apply_rlimits()
+    results: list[BlockResult] = []
+    for example in chain:
+        if results and (results[-1].error is not None or results[-1].skipped):
+            # later blocks depend on the failed one, don't run them
+            results.append(BlockResult(skipped=True))
+        else:
+            results.append(run_block_result(example, module, run_block))
+        if on_result is not None:
+            on_result(results[-1])
+    return results
+
+
+def new_namespace(module_globals: dict[str, Any] | None, resolve_lazy: ResolveLazy | None = None) -> ModuleType:
+    """Create the module whose namespace is shared by the blocks of a chain."""
+    module = ModuleType('__main__')
+    apply_module_globals(module.__dict__, module_globals, resolve_lazy)
+    return module
+
+
+def run_block_result(example: CodeExample, module: ModuleType, run_block: RunBlock) -> BlockResult:
+    """Run one block, converting any error into a `BlockResult`."""
+    try:
+        statements = run_block(example, module)
+    except PytestFailed as exc:
+        return BlockResult(error=f'{exc.msg or str(exc)}\n')
+    except Exception as exc:
+        return BlockResult(error=format_example_exception(exc, example))
+    else:
+        return BlockResult(statements=statements)
@@ -1,36 +1,100 @@
 from __future__ import annotations as _annotations
 
-from collections.abc import Callable
+import asyncio
+import pickle
+import warnings
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import TYPE_CHECKING, Any
+from textwrap import indent
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, TypeVar, cast
+from uuid import uuid4
 
 import pytest
 from _pytest.assertion.rewrite import AssertionRewritingHook
 from _pytest.outcomes import Failed as PytestFailed
 
-from .config import DEFAULT_LINE_LENGTH, ExamplesConfig
-from .lint import FormatError, black_check, black_format, ruff_check, ruff_format
-from .run_code import IncludePrint, InsertPrintStatements, run_code
+from .async_runner import AsyncRunner
+from .checkpoint import CheckpointStore, globals_key
+from .config import DEFAULT_LINE_LENGTH, ExamplesConfig, fork_is_safe, pool_context
+from .document import BlockResult, new_namespace, run_block_result, run_chains, split_chains
+from .lazy_globals import LazyGlobal, ResolveLazy
+from .limits import Limits, parse_size
+from .lint import (
+    FormatError,
+    black_check,
+    black_format,
+    format_example,
+    prefetch_format,
+    ruff_format,
+    ruff_message,
+)
+from .run_code import IncludePrint, InsertPrintStatements, PrintStatement, arun_code, run_code
+from .session import ExamplesSession
+from .subinterpreters import InterpreterPool, decode_results, encode_chain
+from .traceback import format_example_exception
+from .typecheck import mypy_message
+from .virtual_time import VirtualTimeEventLoop, uses_virtual_time
 
 if TYPE_CHECKING:
     from typing import Literal
 
+    from .async_runner import LoopFactory
     from .find_examples import CodeExample
 
-__all__ = ('EvalExample',)
+__all__ = 'EvalExample', 'ExampleResult', 'UpdateNotStableWarning'
+
+T = TypeVar('T')
+
+
+class UpdateNotStableWarning(UserWarning):
+    """Emitted when `--update-examples-fixpoint` gives up on examples which still change after every pass."""
+
+
+@dataclass
+class ExampleResult:
+    """The outcome of running one example with `EvalExample.run_many`."""
+
+    example: CodeExample
+    error: str | None = None
+    """Why the example failed, from linting or running it, `None` if it passed."""
+    updated: bool = False
+    """True if the example's source was changed, only in `'update'` mode."""
+    module_dict: dict[str, Any] | None = None
+    """The example's globals after it ran, `None` if it failed."""
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None
 
 
 class EvalExample:
     """Class to run and lint examples."""
 
-    def __init__(self, *, tmp_path: Path, pytest_request: pytest.FixtureRequest):
+    def __init__(
+        self, *, tmp_path: Path, pytest_request: pytest.FixtureRequest, session: ExamplesSession | None = None
+    ):
         self.tmp_path = tmp_path
         self._pytest_config = pytest_request.config
         self._test_id = pytest_request.node.nodeid
+        if session is None:
+            # a session of our own, which only lasts as long as the test
+            session = ExamplesSession()
+            pytest_request.addfinalizer(session.close)
+        self._session = session
         self.to_update: list[CodeExample] = []
-        self.config: ExamplesConfig = ExamplesConfig()
+        self.config: ExamplesConfig = ExamplesConfig(formatter=self._default_formatter)
         self.print_callback: Callable[[str], str] | None = None
         self.include_print: IncludePrint | None = None
+        self.async_mode: bool = False
+        """If True, allow top-level `await` in examples and run coroutines on an event loop shared by the session."""
+        self.loop_factory: LoopFactory | None = None
+        """Used to create the shared event loop when `async_mode` is True, defaults to `asyncio.new_event_loop`."""
+        self.fixpoint_max_passes: int = 5
+        """With `--update-examples-fixpoint`, the maximum number of times `run_print_update` runs an example."""
+        self._formatted: set[tuple[str, str]] = set()
 
     def set_config(
         self,
@@ -44,8 +108,17 @@ class EvalExample:
         ruff_line_length: int | None = None,
         ruff_select: list[str] | None = None,
         ruff_ignore: list[str] | None = None,
+        formatter: Literal['black', 'ruff'] | None = None,
+        white_space_dot: bool = False,
+        timeout: float | None = None,
+        cpu_limit: float | None = None,
+        memory_limit: int | str | None = None,
+        virtual_time: bool = False,
+        print_max_per_line: int | None = None,
+        print_max_arg_bytes: int | str | None = None,
+        print_max_bytes: int | str | None = None,
     ):
-        """Set the config for lints.
+        """Set the config for lints and running examples.
 
         Args:
             line_length: The line length to use when wrapping print statements, defaults to 88.
@@ -57,6 +130,24 @@ class EvalExample:
             ruff_line_length: In general, we disable line-length checks in ruff, to let black take care of them.
             ruff_select: Ruff rules to select
             ruff_ignore: Ruff rules to ignore
+            formatter: The backend used to format examples and print output, `'black'` or `'ruff'`,
+                defaults to the `--examples-formatter` command line option, which defaults to `'black'`.
+            white_space_dot: If True, replace spaces with `·` in example diffs, defaults to False.
+            timeout: Wall-clock time limit in seconds for running each example,
+                can be overridden per example with the `timeout="..."` prefix setting.
+            cpu_limit: CPU time limit in seconds for running each example, Linux only,
+                can be overridden per example with the `cpu_limit="..."` prefix setting.
+            memory_limit: Limit on the extra memory each example may allocate, in bytes or as a string like `"512M"`,
+                Linux only, can be overridden per example with the `memory_limit="..."` prefix setting.
+            virtual_time: If True, replace `time.sleep`, `time.time`, `time.monotonic` etc. and the clock of event loops
+                with a virtual clock which jumps forward instead of waiting, can be overridden per example with the
+                `virtual_time="true"` or `virtual_time="false"` prefix setting.
+            print_max_per_line: Maximum number of prints recorded from each line of an example, further prints
+                from the line are replaced by a count in the print output.
+            print_max_arg_bytes: Maximum size of each recorded print argument, in bytes or as a string like `"1K"`,
+                longer arguments are truncated.
+            print_max_bytes: Maximum total size of the print arguments recorded for an example, in bytes or as
+                a string like `"1M"`, further prints are replaced by a count in the print output.
         """
         self.config = ExamplesConfig(
             line_length=line_length,
@@ -68,8 +159,21 @@ class EvalExample:
             ruff_line_length=ruff_line_length,
             ruff_select=ruff_select,
             ruff_ignore=ruff_ignore,
+            formatter=formatter or self._default_formatter,
+            white_space_dot=white_space_dot,
+            timeout=timeout,
+            cpu_limit=cpu_limit,
+            memory_limit=parse_size(memory_limit) if memory_limit is not None else None,
+            virtual_time=virtual_time,
+            print_max_per_line=print_max_per_line,
+            print_max_arg_bytes=parse_size(print_max_arg_bytes) if print_max_arg_bytes is not None else None,
+            print_max_bytes=parse_size(print_max_bytes) if print_max_bytes is not None else None,
         )
 
+    @property
+    def _default_formatter(self) -> Literal['black', 'ruff']:
+        return cast("Literal['black', 'ruff']", self._pytest_config.getoption('examples_formatter'))
+
     @property
     def update_examples(self) -> bool:
         return bool(self._pytest_config.getoption('update_examples'))
@@ -127,6 +231,11 @@ class EvalExample:
     ) -> dict[str, Any]:
         """Run the example and update print statements, requires `--update-examples`.
 
+        With `--update-examples-fixpoint`, the example is then formatted again, with the same formatters already
+        used on it in this test, and run again, until updating doesn't change the formatted code or it has been run
+        `fixpoint_max_passes` times. If it doesn't stabilise it's left formatted and an `UpdateNotStableWarning`
+        is emitted.
+
         Args:
             example: The example to run.
             module_globals: The globals to use when running the example.
@@ -135,14 +244,542 @@ class EvalExample:
         """
         __tracebackhide__ = True
         self._check_update(example)
-        insert_print, module_dict = self._run(example, 'update', module_globals, rewrite_assertions, call)
 
-        new_code = insert_print.updated_print_statements(example)
-        if new_code:
-            example.source = new_code
-            self._mark_for_update(example)
+        def update() -> dict[str, Any]:
+            __tracebackhide__ = True
+            insert_print, module_dict = self._run(example, 'update', module_globals, rewrite_assertions, call)
+            new_code = insert_print.updated_print_statements(example)
+            if new_code:
+                example.source = new_code
+                self._mark_for_update(example)
+            return module_dict
+
+        return self._update_until_stable([example], update)
+
+    def _update_until_stable(self, examples: Sequence[CodeExample], update: Callable[[], T]) -> T:
+        """Call `update`, then with `--update-examples-fixpoint` format and update until `examples` are stable.
+
+        Examples are formatted again with the formatters already used on them in this test, they're stable once
+        updating doesn't change the formatted code. Examples which aren't stable within `fixpoint_max_passes` updates
+        are formatted one last time and reported with an `UpdateNotStableWarning`.
+        """
+        __tracebackhide__ = True
+        result = update()
+        if self._pytest_config.getoption('update_examples_fixpoint'):
+            changed = list(examples)
+            for _ in range(self.fixpoint_max_passes - 1):
+                formatted = self._reformat(examples)
+                result = update()
+                changed = [example for example, source in zip(examples, formatted) if example.source != source]
+                if not changed:
+                    break
+            self._not_stable(changed)
+        return result
+
+    async def _aupdate_until_stable(self, examples: Sequence[CodeExample], update: Callable[[], Awaitable[T]]) -> T:
+        """Like `_update_until_stable` for a coroutine function."""
+        __tracebackhide__ = True
+        result = await update()
+        if self._pytest_config.getoption('update_examples_fixpoint'):
+            changed = list(examples)
+            for _ in range(self.fixpoint_max_passes - 1):
+                formatted = self._reformat(examples)
+                result = await update()
+                changed = [example for example, source in zip(examples, formatted) if example.source != source]
+                if not changed:
+                    break
+            self._not_stable(changed)
+        return result
+
+    def _reformat(self, examples: Sequence[CodeExample]) -> list[str]:
+        """Format examples again with the formatters already used on them in this test, returning their sources."""
+        for example in examples:
+            if (str(example), 'ruff') in self._formatted:
+                self.format_ruff(example)
+            if (str(example), 'black') in self._formatted:
+                self.format_black(example)
+        return [example.source for example in examples]
+
+    def _not_stable(self, examples: list[CodeExample]) -> None:
+        if examples:
+            # the last update may have left the code unformatted
+            self._reformat(examples)
+            warnings.warn(
+                f'code still changed after {self.fixpoint_max_passes} passes of --update-examples-fixpoint: '
+                + ', '.join(map(str, examples)),
+                UpdateNotStableWarning,
+                stacklevel=4,
+            )
+
+    async def arun(
+        self,
+        example: CodeExample,
+        *,
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        call: str | None = None,
+    ) -> dict[str, Any]:
+        """Run the example in the running event loop, like `run` but allowing top-level `await`.
+
+        Args:
+            example: The example to run.
+            module_globals: The globals to use when running the example.
+            rewrite_assertions: If True, rewrite assertions in the example using pytest's assertion rewriting.
+            call: If not None, (coroutine) function to check for and call if it exists.
+        """
+        __tracebackhide__ = True
+        example.test_id = self._test_id
+        _, module_dict = await self._arun(example, None, module_globals, rewrite_assertions, call)
         return module_dict
 
+    async def arun_print_check(
+        self,
+        example: CodeExample,
+        *,
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        call: str | None = None,
+    ) -> dict[str, Any]:
+        """Run the example in the running event loop and check print statements, like `run_print_check`.
+
+        Print calls are captured for the current task, so examples can be run concurrently,
+        e.g. with `asyncio.gather()` or `arun_many`.
+
+        Args:
+            example: The example to run.
+            module_globals: The globals to use when running the example.
+            rewrite_assertions: If True, rewrite assertions in the example using pytest's assertion rewriting.
+            call: If not None, (coroutine) function to check for and call if it exists.
+        """
+        __tracebackhide__ = True
+        example.test_id = self._test_id
+        insert_print, module_dict = await self._arun(example, 'check', module_globals, rewrite_assertions, call)
+        insert_print.check_print_statements(example)
+        return module_dict
+
+    async def arun_print_update(
+        self,
+        example: CodeExample,
+        *,
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        call: str | None = None,
+    ) -> dict[str, Any]:
+        """Run the example in the running event loop and update print statements, requires `--update-examples`.
+
+        With `--update-examples-fixpoint`, the example is formatted and updated again until it's stable,
+        like `run_print_update`.
+
+        Args:
+            example: The example to run.
+            module_globals: The globals to use when running the example.
+            rewrite_assertions: If True, rewrite assertions in the example using pytest's assertion rewriting.
+            call: If not None, (coroutine) function to check for and call if it exists.
+        """
+        __tracebackhide__ = True
+        self._check_update(example)
+
+        async def update() -> dict[str, Any]:
+            __tracebackhide__ = True
+            insert_print, module_dict = await self._arun(example, 'update', module_globals, rewrite_assertions, call)
+            new_code = insert_print.updated_print_statements(example)
+            if new_code:
+                example.source = new_code
+                self._mark_for_update(example)
+            return module_dict
+
+        return await self._aupdate_until_stable([example], update)
+
+    def run_group(
+        self,
+        examples: Sequence[CodeExample],
+        *,
+        mode: Literal['run', 'check', 'update'] = 'run',
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        max_workers: int | None = None,
+        checkpoints: bool = False,
+        workers: Literal['processes', 'interpreters'] = 'processes',
+    ) -> None:
+        """Run examples from one document in order in a shared namespace, so each can use names defined before it.
+
+        The examples are split into independent chains using static analysis of the names each example binds
+        and uses, chains are run concurrently in separate worker processes where possible.
+
+        Args:
+            examples: The examples to run, generally all examples from one file in document order.
+            mode: `'run'` to just run the examples, `'check'` to also check print statements
+                like `run_print_check`, or `'update'` to update them like `run_print_update`.
+            module_globals: The globals to use when running the examples.
+            rewrite_assertions: If True, rewrite assertions in the examples using pytest's assertion rewriting.
+            max_workers: Maximum number of worker processes, defaults to the number of CPUs, 1 disables workers.
+            checkpoints: If True, park a forked process after each block so later calls whose leading blocks
+                are unchanged resume from there instead of running those blocks again. Blocks restored from a
+                checkpoint are not run, so their print statements are not checked or updated. Checkpoints are kept
+                for the test session, so only later calls in the same session can resume from them.
+                Chains are run one after another in this mode. It's only used where `os.fork` is available and while
+                no other threads are running, since forking then isn't safe, and when the values of `module_globals`
+                can be pickled so checkpoints holding other values aren't reused, otherwise chains are run without it.
+            workers: `'processes'` to run chains in forked worker processes, which are only forked while no other
+                threads are running, otherwise chains are run one after another in this process, or `'interpreters'`
+                to run them in a pool of sub-interpreters kept for the session, which are isolated like processes but
+                much cheaper to start. Sub-interpreters need Python 3.14, on older versions processes are used instead.
+                With `'interpreters'`, `module_globals` must be picklable, and `include_print`, `loop_factory`,
+                limits, virtual time and lazy globals aren't supported.
+        """
+        __tracebackhide__ = True
+        if workers == 'interpreters':
+            self._check_interpreter_options(examples, module_globals)
+        for example in examples:
+            if mode == 'update':
+                self._check_update(example)
+            else:
+                example.test_id = self._test_id
+        insert_print_statements = None if mode == 'run' else mode
+
+        def run_block(example: CodeExample, module: ModuleType) -> list[PrintStatement] | None:
+            insert_print, _ = self._run(example, insert_print_statements, None, rewrite_assertions, None, module=module)
+            return insert_print.print_statements() if insert_print_statements else None
+
+        def run() -> None:
+            __tracebackhide__ = True
+            resolve_lazy = self._lazy_resolver(examples[0] if examples else None)
+            chains = split_chains(examples)
+            # `None` if a value of `module_globals` can't be keyed, so a checkpoint could hold stale values
+            globals_context = globals_key(module_globals) if checkpoints else None
+            if globals_context is not None and CheckpointStore.supported() and fork_is_safe():
+                # everything apart from the examples' sources which affects how they're run
+                context = repr(
+                    (
+                        mode,
+                        self.config,
+                        rewrite_assertions,
+                        self.include_print,
+                        self.print_callback,
+                        self.async_mode,
+                        self.loop_factory,
+                        globals_context,
+                    )
+                )
+
+                def run_checkpoint_block(
+                    example: CodeExample, module: ModuleType, tmp_path: Path
+                ) -> list[PrintStatement] | None:
+                    # this may run in a checkpoint parked by an earlier test, so use this test's temporary directory
+                    self.tmp_path = tmp_path
+                    return run_block(example, module)
+
+                results = [
+                    result
+                    for chain in chains
+                    for result in self._session.checkpoints.run_chain(
+                        chain,
+                        run_checkpoint_block,
+                        context=context,
+                        module_globals=module_globals,
+                        resolve_lazy=resolve_lazy,
+                        limits=self._limits,
+                        run_state=self.tmp_path,
+                    )
+                ]
+            elif workers == 'interpreters' and InterpreterPool.supported():
+                payloads = [
+                    encode_chain(
+                        chain,
+                        module_globals,
+                        capture_prints=insert_print_statements is not None,
+                        pytest_config=self._pytest_config if rewrite_assertions else None,
+                        async_mode=self.async_mode,
+                    )
+                    for chain in chains
+                ]
+                results = [
+                    r
+                    for data in self._session.interpreters.run_chains(payloads, max_workers)
+                    for r in decode_results(data)
+                ]
+            else:
+                results = run_chains(
+                    chains,
+                    run_block,
+                    module_globals=module_globals,
+                    resolve_lazy=resolve_lazy,
+                    max_workers=max_workers,
+                    limits=self._limits,
+                )
+
+            self._report_results([ex for chain in chains for ex in chain], results, mode)
+
+        if mode == 'update':
+            self._update_until_stable(examples, run)
+        else:
+            run()
+
+    def run_threaded(
+        self,
+        examples: Sequence[CodeExample],
+        *,
+        mode: Literal['run', 'check', 'update'] = 'run',
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        max_workers: int | None = None,
+    ) -> None:
+        """Run independent examples concurrently in a pool of threads in this process.
+
+        Each example gets its own module and its own print capture, calls to `print` are routed to the example
+        running in the calling thread, so print statements are checked or updated exactly as if the examples
+        were run one at a time. This is most useful on free-threaded builds of Python, where CPU-bound examples
+        can then use every core.
+
+        Print calls from threads started by an example are only captured where new threads inherit the context
+        of the thread starting them, as they do by default on free-threaded builds. Memory limits and virtual time
+        aren't supported in this mode since they apply to the whole process.
+
+        Args:
+            examples: The examples to run, each is run in a fresh namespace.
+            mode: `'run'` to just run the examples, `'check'` to also check print statements
+                like `run_print_check`, or `'update'` to update them like `run_print_update`.
+            module_globals: The globals to use when running the examples.
+            rewrite_assertions: If True, rewrite assertions in the examples using pytest's assertion rewriting.
+            max_workers: Maximum number of threads, defaults to `ThreadPoolExecutor`'s default.
+        """
+        __tracebackhide__ = True
+        for example in examples:
+            if Limits.for_example(example, self.config).memory is not None:
+                raise ValueError(f'{example}: memory limits are not supported when running examples in threads')
+            if uses_virtual_time(example, self.config):
+                raise ValueError(f'{example}: virtual time is not supported when running examples in threads')
+            if mode == 'update':
+                self._check_update(example)
+            else:
+                example.test_id = self._test_id
+        insert_print_statements = None if mode == 'run' else mode
+
+        def run_block(example: CodeExample, module: ModuleType) -> list[PrintStatement] | None:
+            insert_print, _ = self._run(
+                example, insert_print_statements, None, rewrite_assertions, None, module=module, concurrent=True
+            )
+            return insert_print.print_statements() if insert_print_statements else None
+
+        def run_one(example: CodeExample) -> BlockResult:
+            module = new_namespace(module_globals, self._lazy_resolver(example))
+            return run_block_result(example, module, run_block)
+
+        def run() -> None:
+            __tracebackhide__ = True
+            with ThreadPoolExecutor(max_workers, thread_name_prefix='pytest-examples') as executor:
+                results = list(executor.map(run_one, examples))
+            self._report_results(list(examples), results, mode)
+
+        if mode == 'update':
+            self._update_until_stable(examples, run)
+        else:
+            run()
+
+    def run_many(
+        self,
+        examples: Sequence[CodeExample],
+        *,
+        mode: Literal['run', 'check', 'update'] = 'check',
+        lint: bool = True,
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        call: str | None = None,
+        raise_errors: bool = True,
+    ) -> list[ExampleResult]:
+        """Lint and run many examples in one test, avoiding pytest's overhead for each item.
+
+        Each example is run in its own namespace as with `run_print_check`, failures don't stop later examples
+        from running, and are reported together with the location of each example.
+
+        Args:
+            examples: The examples to run.
+            mode: `'run'` to just run the examples, `'check'` to also check print statements
+                like `run_print_check`, or `'update'` to update them like `run_print_update`,
+                which requires `--update-examples`.
+            lint: If True, lint examples with black and ruff before running them, or format them in `'update'` mode.
+            module_globals: The globals to use when running the examples.
+            rewrite_assertions: If True, rewrite assertions in the examples using pytest's assertion rewriting.
+            call: If not None, method to check for and call if it exists.
+            raise_errors: If True, fail the test with one report of every failure after running all examples.
+
+        Returns:
+            A result for each example, in order.
+        """
+        __tracebackhide__ = True
+        format_errors: list[str | None] | None = None
+        if lint and mode != 'update':
+            # so ruff lints all the examples in one process, and formats them in one too with the ruff formatter
+            self._session.ruff.add(examples)
+            prefetch_format(examples, self.config)
+        elif lint:
+            format_errors = self._format_many(examples)
+        results: list[ExampleResult] = []
+        for index, example in enumerate(examples):
+            if mode == 'update':
+                self._check_update(example)
+            else:
+                example.test_id = self._test_id
+            result = ExampleResult(example)
+            original_source = example.source
+            errors: list[str] = []
+            lint_error = format_errors[index] if format_errors is not None else self._lint_one(example, lint, mode)
+            if lint_error is not None:
+                errors.append(lint_error)
+
+            try:
+                if mode == 'run':
+                    result.module_dict = self.run(
+                        example, module_globals=module_globals, rewrite_assertions=rewrite_assertions, call=call
+                    )
+                elif mode == 'check':
+                    result.module_dict = self.run_print_check(
+                        example, module_globals=module_globals, rewrite_assertions=rewrite_assertions, call=call
+                    )
+                else:
+                    result.module_dict = self.run_print_update(
+                        example, module_globals=module_globals, rewrite_assertions=rewrite_assertions, call=call
+                    )
+            except PytestFailed as exc:
+                errors.append(exc.msg or str(exc))
+            except Exception as exc:
+                errors.append(format_example_exception(exc, example).rstrip('\n'))
+
+            if errors:
+                result.error = '\n'.join(errors)
+                result.module_dict = None
+            result.updated = example.source != original_source
+            results.append(result)
+
+        if raise_errors:
+            self._raise_errors([(r.example, r.error) for r in results if r.error is not None])
+        return results
+
+    async def arun_many(
+        self,
+        examples: Sequence[CodeExample],
+        *,
+        mode: Literal['run', 'check', 'update'] = 'check',
+        concurrency: int = 10,
+        module_globals: dict[str, Any] | None = None,
+        rewrite_assertions: bool = True,
+        call: str | None = None,
+        raise_errors: bool = True,
+    ) -> list[ExampleResult]:
+        """Run many examples concurrently in the running event loop, like `run_many` without linting.
+
+        This is useful for I/O-bound examples, e.g. ones calling local HTTP servers or databases. Print calls are
+        captured separately for each example's task. Requires asyncio, including anyio's asyncio backend.
+
+        Args:
+            examples: The examples to run.
+            mode: `'run'` to just run the examples, `'check'` to also check print statements
+                like `run_print_check`, or `'update'` to update them like `run_print_update`.
+            concurrency: Maximum number of examples to run at once.
+            module_globals: The globals to use when running the examples.
+            rewrite_assertions: If True, rewrite assertions in the examples using pytest's assertion rewriting.
+            call: If not None, (coroutine) function to check for and call if it exists.
+            raise_errors: If True, fail the test with one report of every failure after running all examples.
+
+        Returns:
+            A result for each example, in order.
+        """
+        __tracebackhide__ = True
+        if mode == 'run':
+            method = self.arun
+        elif mode == 'check':
+            method = self.arun_print_check
+        else:
+            method = self.arun_print_update
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(example: CodeExample) -> ExampleResult:
+            result = ExampleResult(example)
+            original_source = example.source
+            async with semaphore:
+                try:
+                    result.module_dict = await method(
+                        example, module_globals=module_globals, rewrite_assertions=rewrite_assertions, call=call
+                    )
+                except PytestFailed as exc:
+                    result.error = exc.msg or str(exc)
+                except Exception as exc:
+                    result.error = format_example_exception(exc, example).rstrip('\n')
+            result.updated = example.source != original_source
+            return result
+
+        results = await asyncio.gather(*(run_one(example) for example in examples))
+        if raise_errors:
+            self._raise_errors([(r.example, r.error) for r in results if r.error is not None])
+        return results
+
+    def _limits(self, example: CodeExample) -> Limits:
+        return Limits.for_example(example, self.config)
+
+    def _check_interpreter_options(
+        self, examples: Sequence[CodeExample], module_globals: dict[str, Any] | None
+    ) -> None:
+        """Check the examples can be run in sub-interpreters.
+
+        This is checked even when falling back to processes, so tests behave the same on every version of Python.
+        """
+        if self.include_print is not None:
+            raise ValueError('`include_print` is not supported when running examples in sub-interpreters')
+        if self.loop_factory is not None:
+            raise ValueError('`loop_factory` is not supported when running examples in sub-interpreters')
+        config = self.config
+        if (config.print_max_per_line, config.print_max_arg_bytes, config.print_max_bytes) != (None, None, None):
+            raise ValueError('print capture limits are not supported when running examples in sub-interpreters')
+        for example in examples:
+            if Limits.for_example(example, self.config):
+                raise ValueError(f'{example}: limits are not supported when running examples in sub-interpreters')
+            if uses_virtual_time(example, self.config):
+                raise ValueError(f'{example}: virtual time is not supported when running examples in sub-interpreters')
+        if module_globals:
+            if any(isinstance(v, LazyGlobal) for v in module_globals.values()):
+                raise ValueError('lazy globals are not supported when running examples in sub-interpreters')
+            try:
+                pickle.dumps(module_globals)
+            except Exception as exc:
+                raise TypeError(
+                    f'`module_globals` must be picklable to run examples in sub-interpreters: {exc}'
+                ) from exc
+
+    def _report_results(
+        self, examples: list[CodeExample], results: list[BlockResult], mode: Literal['run', 'check', 'update']
+    ) -> None:
+        """Check or update print statements from `results`, then raise one failure listing every error."""
+        __tracebackhide__ = True
+        errors: list[tuple[CodeExample, str]] = []
+        for example, result in zip(examples, results):
+            if result.error is not None:
+                errors.append((example, result.error))
+            elif result.statements is not None:
+                python_file = self.tmp_path / f'{example.module_name}.py'
+                insert_print = InsertPrintStatements.from_statements(
+                    python_file, self.config, result.statements, self.print_callback
+                )
+                if mode == 'check':
+                    try:
+                        insert_print.check_print_statements(example)
+                    except PytestFailed as exc:
+                        errors.append((example, exc.msg or str(exc)))
+                else:
+                    new_code = insert_print.updated_print_statements(example)
+                    if new_code:
+                        example.source = new_code
+                        self._mark_for_update(example)
+        self._raise_errors(errors)
+
+    @staticmethod
+    def _raise_errors(errors: list[tuple[CodeExample, str]]) -> None:
+        """Fail with one report listing every error, each under the location of its example."""
+        __tracebackhide__ = True
+        if errors:
+            raise PytestFailed(
+                '\n'.join(f'{example}:\n{indent(error, "  ")}' for example, error in errors), pytrace=False
+            )
+
     def _run(
         self,
         example: CodeExample,
@@ -150,6 +787,9 @@ class EvalExample:
         module_globals: dict[str, Any] | None,
         rewrite_assertions: bool,
         call: str | None,
+        *,
+        module: ModuleType | None = None,
+        concurrent: bool = False,
     ) -> tuple[InsertPrintStatements, dict[str, Any]]:
         __tracebackhide__ = True
 
@@ -166,19 +806,82 @@ class EvalExample:
         else:
             enable_print_mock = False
 
+        virtual_time = uses_virtual_time(example, self.config)
+        if not self.async_mode:
+            async_runner = None
+        elif virtual_time:
+            if self.loop_factory is not None:
+                raise ValueError(f"{example}: virtual time can't be used with a custom `loop_factory`")
+            async_runner = self._session.async_runner(VirtualTimeEventLoop)
+        elif concurrent:
+            # the session's event loop can only be used from one thread at a time
+            async_runner = AsyncRunner(self.loop_factory)
+        else:
+            async_runner = self._session.async_runner(self.loop_factory)
+
+        python_file = self._write_file(example, unique=concurrent)
+        try:
+            return run_code(
+                example=example,
+                python_file=python_file,
+                loader=loader,
+                config=self.config,
+                enable_print_mock=enable_print_mock,
+                print_callback=self.print_callback,
+                include_print=self.include_print,
+                module_globals=module_globals,
+                call=call,
+                async_runner=async_runner,
+                limits=Limits.for_example(example, self.config),
+                module=module,
+                resolve_lazy=self._lazy_resolver(example),
+                concurrent=concurrent,
+                virtual_time=virtual_time,
+            )
+        finally:
+            if concurrent and async_runner is not None:
+                async_runner.close()
+
+    async def _arun(
+        self,
+        example: CodeExample,
+        insert_print_statements: Literal['check', 'update', None],
+        module_globals: dict[str, Any] | None,
+        rewrite_assertions: bool,
+        call: str | None,
+    ) -> tuple[InsertPrintStatements, dict[str, Any]]:
+        __tracebackhide__ = True
+        limits = Limits.for_example(example, self.config)
+        if limits.cpu_time is not None or limits.memory is not None:
+            raise ValueError(f'{example}: only timeouts are supported when running examples in the event loop')
+        if uses_virtual_time(example, self.config):
+            raise ValueError(f'{example}: virtual time is not supported when running examples in the event loop')
+
+        if rewrite_assertions:
+            loader = AssertionRewritingHook(config=self._pytest_config)
+            loader.mark_rewrite(example.module_name)
+        else:
+            loader = None
+
         python_file = self._write_file(example)
-        return run_code(
+        return await arun_code(
             example=example,
             python_file=python_file,
             loader=loader,
             config=self.config,
-            enable_print_mock=enable_print_mock,
+            enable_print_mock=insert_print_statements is not None,
             print_callback=self.print_callback,
             include_print=self.include_print,
             module_globals=module_globals,
             call=call,
+            timeout=limits.timeout,
+            resolve_lazy=self._lazy_resolver(example),
         )
 
+    def _lazy_resolver(self, example: CodeExample | None) -> ResolveLazy:
+        group = example.group if example is not None else None
+        return lambda lazy: self._session.lazy_globals.resolve(lazy, group)
+
     def lint(self, example: CodeExample) -> None:
         """Lint the example with black and ruff.
 
@@ -195,6 +898,7 @@ class EvalExample:
             example: The example to lint.
         """
         example.test_id = self._test_id
+        self._session.format_prefetch.prefetch(self.config)
         try:
             black_check(example, self.config)
         except FormatError as exc:
@@ -210,10 +914,24 @@ class EvalExample:
             example: The example to lint.
         """
         example.test_id = self._test_id
-        try:
-            ruff_check(example, self.config)
-        except FormatError as exc:
-            raise PytestFailed(str(exc), pytrace=False) from None
+        diagnostics = self._session.ruff.check(example, self.config)
+        if diagnostics:
+            raise PytestFailed(ruff_message(diagnostics), pytrace=False)
+
+    def typecheck(self, example: CodeExample) -> None:
+        """Type check the example with mypy, which must be installed.
+
+        A `dmypy` daemon is started for the session, and checks all the examples tests are parametrized with
+        in one pass, so later calls are usually just lookups. Examples are checked as modules of a package
+        using the project's mypy config, found from the current directory.
+
+        Args:
+            example: The example to type check.
+        """
+        example.test_id = self._test_id
+        diagnostics = self._session.mypy.check(example)
+        if any(d.severity == 'error' for d in diagnostics):
+            raise PytestFailed(mypy_message(diagnostics), pytrace=False)
 
     def format(self, example: CodeExample) -> None:
         """Format the example with black and ruff, requires `--update-examples`.
@@ -231,7 +949,9 @@ class EvalExample:
             example: The example to lint.
         """
         self._check_update(example)
+        self._formatted.add((str(example), 'black'))
 
+        self._session.format_prefetch.prefetch(self.config)
         new_content = black_format(example.source, self.config, remove_double_blank=example.in_py_file())
         if new_content != example.source:
             example.source = new_content
@@ -247,9 +967,10 @@ class EvalExample:
             example: The example to lint.
         """
         self._check_update(example)
+        self._formatted.add((str(example), 'ruff'))
 
         try:
-            new_content = ruff_format(example, self.config)
+            new_content = ruff_format(example, self.config, server=self._session.ruff_servers)
         except FormatError as exc:
             raise PytestFailed(str(exc), pytrace=False) from None
         else:
@@ -257,6 +978,47 @@ class EvalExample:
                 example.source = new_content
                 self._mark_for_update(example)
 
+    def _lint_one(self, example: CodeExample, lint: bool, mode: Literal['run', 'check', 'update']) -> str | None:
+        """Lint the example, or format it in `'update'` mode, returning the error if it fails."""
+        if not lint:
+            return None
+        try:
+            if mode == 'update':
+                self.format(example)
+            else:
+                self.lint(example)
+        except PytestFailed as exc:
+            return exc.msg or str(exc)
+        return None
+
+    def _format_many(self, examples: Sequence[CodeExample]) -> list[str | None] | None:
+        """Format examples like `format` in worker processes, returning the error for each example.
+
+        Returns `None` without formatting anything if there's only one example or worker,
+        so the examples are formatted one at a time instead.
+        """
+        max_workers = cast(int, self._pytest_config.getoption('update_examples_workers'))
+        if len(examples) < 2 or max_workers < 2:
+            return None
+        for example in examples:
+            self._check_update(example)
+            self._formatted.update({(str(example), 'ruff'), (str(example), 'black')})
+        errors: list[str | None] = []
+        # the pool is shut down after each batch, its manager thread would otherwise stop `fork_is_safe` forking
+        with ProcessPoolExecutor(min(max_workers, len(examples)), mp_context=pool_context()) as pool:
+            futures = [pool.submit(format_example, example, self.config) for example in examples]
+            for example, future in zip(examples, futures):
+                try:
+                    new_content = future.result()
+                except FormatError as exc:
+                    errors.append(str(exc))
+                else:
+                    errors.append(None)
+                    if new_content != example.source:
+                        example.source = new_content
+                        self._mark_for_update(example)
+        return errors
+
     def _check_update(self, example: CodeExample) -> None:
         if not self.update_examples:
             raise RuntimeError('Cannot update examples without --update-examples')
@@ -268,7 +1030,9 @@ class EvalExample:
         if not any(s == str(ex) for ex in self.to_update):
             self.to_update.append(example)
 
-    def _write_file(self, example: CodeExample) -> Path:
-        python_file = self.tmp_path / f'{example.module_name}.py'
+    def _write_file(self, example: CodeExample, *, unique: bool = False) -> Path:
+        # examples with the same path and lines share a module name, running concurrently they need separate files
+        suffix = f'_{uuid4().hex}' if unique else ''
+        python_file = self.tmp_path / f'{example.module_name}{suffix}.py'
         python_file.write_text(example.source)
         return python_file
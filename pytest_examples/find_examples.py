@@ -1,9 +1,11 @@
 from __future__ import annotations as _annotations
 
+import ast
 import re
 import shlex
 from collections.abc import Iterable
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from textwrap import dedent
 from uuid import UUID, uuid4
@@ -106,6 +108,16 @@ class CodeExample:
         return f'{path}:{self.start_line}-{self.end_line}'
 
 
+@lru_cache(maxsize=1024)
+def parse_source(source: str) -> ast.Module:
+    """Parse source code, caching the result.
+
+    This lets the analysis done before running an example and updating its print output share one tree,
+    so the tree returned must not be modified.
+    """
+    return ast.parse(source)
+
+
 def find_examples(*paths: str | Path, skip: bool = False) -> Iterable[CodeExample]:
     """Find Python code examples in markdown files and python file docstrings.
 
@@ -0,0 +1,122 @@
+"""Runs chains of examples inside a sub-interpreter.
+
+This module is executed directly in each sub-interpreter's `__main__` rather than imported, so it must only use the
+standard library: importing `pytest_examples` would import pytest and black, which are slow to import and may
+not support sub-interpreters.
+
+Everything crossing the interpreter boundary is pickled to bytes and only contains builtin types.
+"""
+
+from __future__ import annotations as _annotations
+
+import builtins
+import marshal
+import pickle
+import re
+import reprlib
+import sys
+import traceback
+from typing import Any
+
+__all__ = 'run_chain', 'print_arg', 'eval_async', 'format_exception'
+
+# Each block is `(filename, line offset, marshalled code, is async, error if the block couldn't be compiled)`,
+# each result is `(print statements, error, skipped, reprs of the namespace's globals)`,
+# and each print statement is `(line number, sep, [(data, is_str), ...])`.
+
+
+def print_arg(value: Any) -> tuple[str, bool]:
+    """Convert an argument to `print` to the text used in print statements, and whether it was a string."""
+    if isinstance(value, str):
+        return value, True
+    elif isinstance(value, set):
+        # NOTE! this is not recursive
+        ordered = ', '.join(repr(x) for x in sorted(value))
+        return f'{{{ordered}}}', False
+    else:
+        return re.sub('0x[a-f0-9]{8,12}>', '0x0123456789ab>', str(value)), False
+
+
+def run_chain(payload: bytes) -> bytes:
+    """Run each block of a chain in one namespace, stopping at the first error.
+
+    Args:
+        payload: pickled `(blocks, module_globals, capture_prints)`.
+
+    Returns:
+        The pickled list of results, one per block.
+    """
+    blocks, module_globals, capture_prints = pickle.loads(payload)
+    namespace: dict[str, Any] = {'__name__': '__main__', '__builtins__': builtins}
+    namespace.update(module_globals)
+    results: list[Any] = []
+    for filename, line_offset, code_bytes, is_async, compile_error in blocks:
+        if results and (results[-1][1] is not None or results[-1][2]):
+            # later blocks depend on the failed one, don't run them
+            results.append((None, None, True, None))
+            continue
+        elif compile_error is not None:
+            results.append((None, compile_error, False, None))
+            continue
+        namespace['__file__'] = filename
+        code = marshal.loads(code_bytes)
+        statements: list[Any] | None = [] if capture_prints else None
+        try:
+            _run_block(code, namespace, is_async, filename, line_offset, statements)
+        except Exception as exc:
+            results.append((None, format_exception(exc, filename), False, None))
+        else:
+            results.append((statements, None, False, _summarise(namespace)))
+    return pickle.dumps(results)
+
+
+def _run_block(
+    code: Any, namespace: dict[str, Any], is_async: bool, filename: str, line_offset: int, statements: list[Any] | None
+) -> None:
+    original_print = builtins.print
+    if statements is not None:
+
+        def record_print(*args: Any, sep: str | None = ' ', **kwargs: Any) -> None:
+            caller = sys._getframe(1)
+            # like the default `include_print`, only print calls made directly by the example are recorded
+            if caller.f_code.co_filename == filename:
+                statements.append(
+                    (caller.f_lineno - line_offset, ' ' if sep is None else sep, list(map(print_arg, args)))
+                )
+
+        # this interpreter only runs one chain at a time, so replacing print globally is safe
+        builtins.print = record_print
+    try:
+        import inspect
+
+        # only code using top-level `await` runs in an event loop, so other blocks can call `asyncio.run()`
+        if is_async and code.co_flags & inspect.CO_COROUTINE:
+            import asyncio
+
+            asyncio.run(eval_async(code, namespace))
+        else:
+            exec(code, namespace)
+    finally:
+        builtins.print = original_print
+
+
+async def eval_async(code: Any, namespace: dict[str, Any]) -> None:
+    """Run a module's code compiled with `PyCF_ALLOW_TOP_LEVEL_AWAIT`, awaiting it if it used `await`."""
+    __tracebackhide__ = True
+    import inspect
+
+    result = eval(code, namespace)
+    if code.co_flags & inspect.CO_COROUTINE:
+        await result
+
+
+def format_exception(exc: BaseException, filename: str) -> str:
+    """Format an exception as `traceback.format_exception` would, but only showing the frames from `filename`."""
+    frames = [(f, lineno) for f, lineno in traceback.walk_tb(exc.__traceback__) if f.f_code.co_filename == filename]
+    stack = traceback.StackSummary.extract(frames)
+    lines = ['Traceback (most recent call last):\n', *stack.format(), *traceback.format_exception_only(type(exc), exc)]
+    return ''.join(lines)
+
+
+def _summarise(namespace: dict[str, Any]) -> dict[str, str]:
+    return {k: reprlib.repr(v) for k, v in namespace.items() if not k.startswith(('__', '@'))}
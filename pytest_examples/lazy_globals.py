@@ -0,0 +1,110 @@
+from __future__ import annotations as _annotations
+
+import builtins
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, Literal
+from uuid import UUID
+
+__all__ = 'LazyGlobal', 'LazyGlobalsCache', 'apply_module_globals'
+
+Scope = Literal['example', 'group', 'session']
+ResolveLazy = Callable[['LazyGlobal'], Any]
+
+
+@dataclass(frozen=True, eq=False)
+class LazyGlobal:
+    """A value for `module_globals` which is only built when an example first uses its name.
+
+    Names of lazy globals aren't in the module's namespace until they're used, so e.g. `globals()` won't include them.
+    """
+
+    factory: Callable[[], Any]
+    """Called with no arguments to build the value."""
+    scope: Scope = 'example'
+    """How long the value is reused for: `'example'` builds it for each example that uses it,
+    `'group'` shares it between examples from the same file, and `'session'` for the whole test session."""
+
+
+class LazyGlobalsCache:
+    """Cache of `LazyGlobal` values with `'group'` and `'session'` scope.
+
+    Values may be resolved from several threads at once, e.g. by `EvalExample.run_threaded`, a lock makes sure
+    each value is only built once for its scope.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._session_values: dict[LazyGlobal, Any] = {}
+        self._group: UUID | None = None
+        self._group_values: dict[LazyGlobal, Any] = {}
+
+    def resolve(self, lazy: LazyGlobal, group: UUID | None) -> Any:
+        if lazy.scope == 'example':
+            return lazy.factory()
+
+        # reentrant since a factory may itself use another lazy global
+        with self._lock:
+            if lazy.scope == 'session':
+                values = self._session_values
+            else:
+                if group != self._group:
+                    # examples from a file are run together, so drop values for the previous file
+                    self._group = group
+                    self._group_values = {}
+                values = self._group_values
+
+            try:
+                return values[lazy]
+            except KeyError:
+                value = values[lazy] = lazy.factory()
+                return value
+
+
+def apply_module_globals(
+    module_dict: dict[str, Any], module_globals: dict[str, Any] | None, resolve: ResolveLazy | None = None
+) -> None:
+    """Add `module_globals` to a module's namespace, deferring `LazyGlobal` values until they're used.
+
+    Lazy values are resolved via a `__builtins__` mapping whose `__missing__` is called when a name isn't found
+    in the module's globals or in builtins, the value is then stored in the module's globals so later lookups
+    are as fast as any other global.
+    """
+    if not module_globals:
+        return
+    lazy: dict[str, LazyGlobal] = {}
+    for name, value in module_globals.items():
+        if isinstance(value, LazyGlobal):
+            lazy[name] = value
+        else:
+            module_dict[name] = value
+    if lazy:
+        module_dict['__builtins__'] = _LazyBuiltins(module_dict, lazy, resolve or _call_factory)
+
+
+class _LazyBuiltins(dict):
+    """Builtins for an example's module which also resolves lazy globals."""
+
+    def __init__(self, module_dict: dict[str, Any], lazy: dict[str, LazyGlobal], resolve: ResolveLazy):
+        # the interpreter looks `__import__` up directly without calling `__missing__`
+        super().__init__(__import__=builtins.__import__)
+        self._module_dict = module_dict
+        self._lazy = lazy
+        self._resolve = resolve
+
+    def __missing__(self, name: str) -> Any:
+        lazy = self._lazy.get(name)
+        if lazy is not None:
+            value = self._module_dict[name] = self._resolve(lazy)
+            return value
+
+        value = builtins.__dict__[name]
+        # `print` is patched while examples run so must always be looked up, other builtins can be cached
+        if name != 'print':
+            self[name] = value
+        return value
+
+
+def _call_factory(lazy: LazyGlobal) -> Any:
+    return lazy.factory()
@@ -0,0 +1,331 @@
+from __future__ import annotations as _annotations
+
+import ctypes
+import math
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+if TYPE_CHECKING:
+    from .config import ExamplesConfig
+    from .find_examples import CodeExample
+
+__all__ = 'Limits', 'LimitExceeded', 'enforce_limits', 'child_rlimits', 'describe_child_exit', 'parse_size'
+
+
+class LimitExceeded(BaseException):
+    """Raised inside an example when it breaches one of its limits.
+
+    This inherits from `BaseException` so `except Exception` blocks in the example can't swallow it.
+    """
+
+
+# bound now so virtual time, which replaces `time.monotonic`, doesn't affect wall-clock limits
+_monotonic = time.monotonic
+
+
+@dataclass(frozen=True)
+class Limits:
+    """Resource limits for running a single example."""
+
+    timeout: float | None = None
+    """Wall-clock time in seconds."""
+    cpu_time: float | None = None
+    """CPU time in seconds."""
+    memory: int | None = None
+    """Extra address space in bytes the example may allocate."""
+
+    @classmethod
+    def for_example(cls, example: CodeExample, config: ExamplesConfig) -> Limits:
+        """Build limits from `config`, overridden by the `timeout`, `cpu_limit` and `memory_limit` prefix settings."""
+        settings = example.prefix_settings()
+        timeout = settings.get('timeout')
+        cpu_limit = settings.get('cpu_limit')
+        memory_limit = settings.get('memory_limit')
+        return cls(
+            timeout=float(timeout) if timeout is not None else config.timeout,
+            cpu_time=float(cpu_limit) if cpu_limit is not None else config.cpu_limit,
+            memory=parse_size(memory_limit) if memory_limit is not None else config.memory_limit,
+        )
+
+    @classmethod
+    def for_chain(cls, limits: Sequence[Limits]) -> Limits:
+        """Limits for a worker process running several examples one after another.
+
+        Each limit is the total for the examples, with a second to spare for the timeout and CPU time so the limits
+        enforced while running each example are breached first, or no limit if any example doesn't have one.
+        """
+        timeout = _total([lim.timeout for lim in limits])
+        cpu_time = _total([lim.cpu_time for lim in limits])
+        memory = _total([lim.memory for lim in limits])
+        return cls(
+            timeout=None if timeout is None else timeout + 1,
+            cpu_time=None if cpu_time is None else cpu_time + 1,
+            memory=None if memory is None else int(memory),
+        )
+
+    def __bool__(self) -> bool:
+        return self.timeout is not None or self.cpu_time is not None or self.memory is not None
+
+    def describe(self, kind: str) -> str:
+        if kind == 'timeout':
+            return f'wall-clock timeout of {self.timeout:g}s'
+        elif kind == 'cpu_time':
+            return f'CPU time limit of {self.cpu_time:g}s'
+        else:
+            return f'memory limit of {format_size(self.memory or 0)}'
+
+
+def parse_size(value: str | int) -> int:
+    """Parse a size like `512M` or `2G` (binary units) into bytes."""
+    if isinstance(value, int):
+        return value
+    m = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*', value, flags=re.I)
+    if not m:
+        raise ValueError(f'Invalid size {value!r}, expected something like "512M" or "2G"')
+    power = ' kmgt'.index(m.group(2).lower() or ' ')
+    return int(float(m.group(1)) * 1024**power)
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'K', 'M', 'G'):
+        if size < 1024 or unit == 'G':
+            return f'{size:g}{unit}' if unit == 'B' else f'{size:.4g}{unit}'
+        size /= 1024  # type: ignore[assignment]
+    raise AssertionError('unreachable')  # pragma: no cover
+
+
+@contextmanager
+def enforce_limits(limits: Limits, example: CodeExample) -> Iterator[None]:
+    """Enforce `limits` on the code run inside the context in this process.
+
+    On the main thread, the wall-clock and CPU limits use `SIGALRM` and `SIGXCPU`, so they interrupt blocking calls
+    like `time.sleep()`. On other threads a watchdog thread injects the exception asynchronously instead.
+    The memory limit is enforced for the whole process with `RLIMIT_AS`.
+
+    Raises:
+        LimitExceeded: with a message naming the example, if a limit was breached.
+    """
+    __tracebackhide__ = True
+    if not limits:
+        yield
+        return
+
+    breached: list[str] = []
+    with _memory_limit(limits.memory):
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+            cm = _signal_limits(limits, breached)
+        else:
+            cm = _watchdog_limits(limits, breached)
+        try:
+            with cm:
+                yield
+        except MemoryError as exc:
+            if limits.memory is None:
+                raise
+            raise LimitExceeded(f'{example}: example exceeded its {limits.describe("memory")}') from exc
+        except LimitExceeded as exc:
+            kind = breached[0] if breached else 'timeout'
+            raise LimitExceeded(f'{example}: example exceeded its {limits.describe(kind)}') from exc
+
+
+@contextmanager
+def _signal_limits(limits: Limits, breached: list[str]) -> Iterator[None]:
+    """Enforce the wall-clock and CPU limits with signals, on the main thread.
+
+    A timer which is already running, e.g. pytest-timeout's, is kept: if it's due before the example's timeout
+    its handler is called when it fires, otherwise it's re-armed with the time it had left once the example finishes.
+    """
+    outer_first = False
+
+    def on_alarm(signum: int, frame: Any) -> None:
+        if outer_first:
+            old_alarm(signum, frame)
+            return
+        breached.append('timeout')
+        raise LimitExceeded()
+
+    def on_xcpu(signum: int, frame: object) -> None:
+        breached.append('cpu_time')
+        raise LimitExceeded()
+
+    old_alarm: Any = None
+    old_xcpu = old_cpu_limit = None
+    old_delay = old_interval = 0.0
+    start = _monotonic()
+    if limits.timeout is not None:
+        old_alarm = signal.signal(signal.SIGALRM, on_alarm)
+        old_delay, old_interval = signal.setitimer(signal.ITIMER_REAL, limits.timeout)
+        if 0 < old_delay < limits.timeout and callable(old_alarm):
+            outer_first = True
+            signal.setitimer(signal.ITIMER_REAL, old_delay)
+    if limits.cpu_time is not None:
+        res = _resource('CPU time')
+        old_xcpu = signal.signal(signal.SIGXCPU, on_xcpu)
+        old_cpu_limit = res.getrlimit(res.RLIMIT_CPU)
+        used = res.getrusage(res.RUSAGE_SELF)
+        soft = math.ceil(used.ru_utime + used.ru_stime + limits.cpu_time)
+        res.setrlimit(res.RLIMIT_CPU, (_clamp(soft, old_cpu_limit[1]), old_cpu_limit[1]))
+    try:
+        yield
+    finally:
+        if old_alarm is not None:
+            remaining, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_alarm)
+            if outer_first:
+                # the outer timer is still running unless it fired, in which case its handler has been called
+                if remaining > 0:
+                    signal.setitimer(signal.ITIMER_REAL, remaining, old_interval)
+                elif old_interval > 0:
+                    signal.setitimer(signal.ITIMER_REAL, old_interval, old_interval)
+            elif old_delay > 0:
+                # fire as soon as possible if the outer timer was due while the example ran
+                delay = max(old_delay - (_monotonic() - start), 1e-6)
+                signal.setitimer(signal.ITIMER_REAL, delay, old_interval)
+        if old_cpu_limit is not None:
+            res = _resource('CPU time')
+            res.setrlimit(res.RLIMIT_CPU, old_cpu_limit)
+            signal.signal(signal.SIGXCPU, old_xcpu)
+
+
+@contextmanager
+def _watchdog_limits(limits: Limits, breached: list[str]) -> Iterator[None]:
+    if limits.timeout is None and limits.cpu_time is None:
+        yield
+        return
+
+    ident = threading.get_ident()
+    cpu_clock, cpu_deadline = 0, math.inf
+    if limits.cpu_time is not None:
+        if not hasattr(time, 'pthread_getcpuclockid'):  # pragma: no cover
+            raise RuntimeError('CPU time limits outside the main thread are not supported on this platform')
+        cpu_clock = time.pthread_getcpuclockid(ident)
+        cpu_deadline = time.clock_gettime(cpu_clock) + limits.cpu_time
+    wall_deadline = _monotonic() + limits.timeout if limits.timeout is not None else math.inf
+    done = threading.Event()
+
+    def watch() -> None:
+        while not done.wait(0.01):
+            if _monotonic() > wall_deadline:
+                breached.append('timeout')
+            elif limits.cpu_time is not None and time.clock_gettime(cpu_clock) > cpu_deadline:
+                breached.append('cpu_time')
+            else:
+                continue
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(ident), ctypes.py_object(LimitExceeded))
+            return
+
+    watchdog = threading.Thread(target=watch, name=f'pytest-examples-watchdog-{ident}', daemon=True)
+    watchdog.start()
+    try:
+        yield
+    finally:
+        done.set()
+        watchdog.join()
+        if breached:
+            # make sure an exception injected after the example finished doesn't escape elsewhere
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(ident), None)
+
+
+@contextmanager
+def _memory_limit(memory: int | None) -> Iterator[None]:
+    if memory is None:
+        yield
+        return
+
+    res = _resource('memory')
+    old_limit = res.getrlimit(res.RLIMIT_AS)
+    res.setrlimit(res.RLIMIT_AS, (_clamp(_address_space() + memory, old_limit[1]), old_limit[1]))
+    try:
+        yield
+    finally:
+        res.setrlimit(res.RLIMIT_AS, old_limit)
+
+
+def child_rlimits(limits: Limits) -> Callable[[], None]:
+    """Return a function which applies `limits` as rlimits, for use in a freshly started worker process.
+
+    Use it as the `preexec_fn` of a subprocess, or call it straight after `os.fork()`. The kernel then stops
+    the worker if it breaches a limit, use `describe_child_exit` to build the failure message.
+    Limits are capped at the hard limits the process already has, e.g. those of the process it was forked from.
+    """
+
+    def apply() -> None:
+        if limits.cpu_time is not None:
+            res = _resource('CPU time')
+            _, hard = res.getrlimit(res.RLIMIT_CPU)
+            soft = math.ceil(limits.cpu_time)
+            res.setrlimit(res.RLIMIT_CPU, (_clamp(soft, hard), _clamp(soft + 1, hard)))
+        if limits.memory is not None:
+            res = _resource('memory')
+            _, hard = res.getrlimit(res.RLIMIT_AS)
+            limit = _clamp(_address_space() + limits.memory, hard)
+            res.setrlimit(res.RLIMIT_AS, (limit, limit))
+        if limits.timeout is not None:
+            # the default action for SIGALRM terminates the process, a forked process inherits its parent's handler
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+            signal.setitimer(signal.ITIMER_REAL, limits.timeout)
+
+    if limits.cpu_time is not None or limits.memory is not None:
+        _resource('CPU time and memory')
+    return apply
+
+
+def describe_child_exit(returncode: int, limits: Limits, example: CodeExample) -> str | None:
+    """Describe why a worker process started with `child_rlimits` died, or `None` if it wasn't due to a limit.
+
+    Args:
+        returncode: The return code of the process, negative if it was killed by a signal
+            as with `subprocess.Popen.returncode`.
+        limits: The limits the worker was started with.
+        example: The example the worker was running.
+    """
+    if returncode >= 0:
+        return None
+    signum = -returncode
+    if signum == signal.SIGALRM and limits.timeout is not None:
+        kind = 'timeout'
+    elif signum in (signal.SIGXCPU, signal.SIGKILL) and limits.cpu_time is not None:
+        kind = 'cpu_time'
+    else:
+        return None
+    return f'{example}: example exceeded its {limits.describe(kind)}'
+
+
+def _total(values: Sequence[float | None]) -> float | None:
+    if not values or any(v is None for v in values):
+        return None
+    return sum(v for v in values if v is not None)
+
+
+def _address_space() -> int:
+    """Current size of this process's virtual address space in bytes."""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[0])
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def _clamp(soft: int, hard: int) -> int:
+    if hard == _resource('CPU time and memory').RLIM_INFINITY:
+        return soft
+    return min(soft, hard)
+
+
+def _resource(what: str) -> ModuleType:
+    """Get the `resource` module, raising an error naming the `what` limits if rlimits aren't supported."""
+    if resource is None or not sys.platform.startswith('linux'):
+        raise RuntimeError(f'{what} limits are only supported on Linux')
+    return resource
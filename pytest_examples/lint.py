@@ -1,45 +1,142 @@
 from __future__ import annotations as _annotations
 
+import json
 import re
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from functools import cache
+from pathlib import Path
 from subprocess import PIPE, Popen
 from textwrap import indent
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
 from black import format_str as black_format_str
 from black.output import diff as black_diff
+from black.parsing import InvalidInput
 from ruff.__main__ import find_ruff_bin
 
 from .config import ExamplesConfig
 
 if TYPE_CHECKING:
     from .find_examples import CodeExample
+    from .ruff_server import RuffServerPool
 
-__all__ = 'ruff_check', 'ruff_format', 'black_check', 'black_format', 'code_diff', 'FormatError'
+__all__ = (
+    'ruff_check',
+    'ruff_check_batch',
+    'ruff_message',
+    'RuffDiagnostic',
+    'RuffError',
+    'RuffResults',
+    'ruff_format',
+    'black_check',
+    'Formatter',
+    'BlackFormatter',
+    'RuffFormatter',
+    'FORMATTERS',
+    'get_formatter',
+    'prefetch_format',
+    'prefetch_black_format',
+    'FormatPrefetch',
+    'format_example',
+    'black_format',
+    'code_diff',
+    'FormatError',
+)
 
 
 class FormatError(ValueError):
     pass
 
 
+@dataclass(frozen=True)
+class RuffDiagnostic:
+    """A problem found by ruff, located in the file the example came from."""
+
+    path: Path
+    line: int
+    """Line number in the file, starting from 1."""
+    column: int
+    """Column in the file, starting from 1, including the example's indent."""
+    code: str | None
+    """The rule code, `None` for syntax errors."""
+    message: str
+    applicability: str | None = None
+    """How safe ruff's fix is, `'safe'`, `'unsafe'` or `'display-only'`, or `None` if there's no fix."""
+
+    @classmethod
+    def from_json(
+        cls, example: CodeExample, diagnostic: dict[str, Any], original_line: Callable[[int], int] | None = None
+    ) -> RuffDiagnostic:
+        """Build from a diagnostic in the format of `ruff check --output-format=json`.
+
+        `original_line` maps line numbers in the linted code back to the example's source, e.g. after fixes.
+        """
+        location = diagnostic['location']
+        row = location['row'] if original_line is None else original_line(location['row'])
+        fix = diagnostic['fix']
+        return cls(
+            path=example.path,
+            line=row + example.start_line,
+            column=location['column'] + example.indent,
+            code=diagnostic['code'],
+            message=diagnostic['message'],
+            applicability=fix and fix['applicability'],
+        )
+
+    def __str__(self) -> str:
+        """In the format of ruff's "concise" output."""
+        marker = ' [*]' if self.applicability == 'safe' else ''
+        code = f'{self.code}{marker} ' if self.code else ''
+        return f'{self.path}:{self.line}:{self.column}: {code}{self.message}'
+
+
+class RuffError(FormatError):
+    """Ruff found problems it couldn't fix."""
+
+    def __init__(self, diagnostics: Sequence[RuffDiagnostic]) -> None:
+        self.diagnostics = list(diagnostics)
+        super().__init__(ruff_message(self.diagnostics))
+
+    def __reduce__(self) -> tuple[type[RuffError], tuple[list[RuffDiagnostic]]]:
+        # so errors can be returned from worker processes
+        return RuffError, (self.diagnostics,)
+
+
+def ruff_message(diagnostics: Sequence[RuffDiagnostic]) -> str:
+    """Build an error message like ruff's "concise" output, with the summary of errors and fixes."""
+    lines = [str(d) for d in diagnostics]
+    fixable = sum(d.applicability == 'safe' for d in diagnostics)
+    hidden = sum(d.applicability is not None for d in diagnostics) - fixable
+
+    count = len(diagnostics)
+    lines.append(f'Found {count} error{"" if count == 1 else "s"}.')
+    hidden_fixes = f'{hidden} hidden fix{"" if hidden == 1 else "es"} can be enabled with the `--unsafe-fixes` option'
+    if fixable:
+        lines.append(f'[*] {fixable} fixable with the `--fix` option' + (f' ({hidden_fixes}).' if hidden else '.'))
+    elif hidden:
+        lines.append(f'No fixes available ({hidden_fixes}).')
+    output = '\n'.join(lines)
+    return f'ruff failed:\n{indent(output, "  ")}'
+
+
 def ruff_format(
     example: CodeExample,
     config: ExamplesConfig,
     *,
     ignore_errors: bool = False,
+    server: RuffServerPool | None = None,
 ) -> str:
     args = ('--fix',)
     if ignore_errors:
         args += ('--exit-zero',)
-    try:
-        return ruff_check(example, config, extra_ruff_args=args)
-    except FormatError:
-        # this is a workaround for https://github.com/charliermarsh/ruff/issues/3694#issuecomment-1483388856
-        try:
-            ruff_check(example, config)
-        except FormatError as e2:
-            raise e2 from None
-        else:
-            raise Exception('ruff failed in Fix mode but not in Check mode, please report this')
+    return ruff_check(example, config, extra_ruff_args=args, server=server)
 
 
 def ruff_check(
@@ -47,42 +144,405 @@ def ruff_check(
     config: ExamplesConfig,
     *,
     extra_ruff_args: tuple[str, ...] = (),
+    server: RuffServerPool | None = None,
 ) -> str:
-    ruff = find_ruff_bin()
-    args = ruff, 'check', '-', *config.ruff_config(), *extra_ruff_args
+    """Lint the example with ruff, raising `RuffError` if there are problems.
 
-    p = Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=True)
-    stdout, stderr = p.communicate(example.source, timeout=10)
-    if p.returncode == 1 and stdout:
+    With `--fix` in `extra_ruff_args`, the fixed source is returned and only the problems which remain
+    after fixing are reported, all from a single ruff run. Otherwise an empty string is returned.
+    """
+    fix = '--fix' in extra_ruff_args
+    exit_zero = '--exit-zero' in extra_ruff_args
+    if server is not None and set(extra_ruff_args) <= {'--fix', '--exit-zero'}:
+        source, diagnostics = server.check(example.source, config.ruff_config(), fix=fix, diagnostics=not exit_zero)
+        failed = bool(diagnostics)
+    else:
+        args = ruff_bin(), 'check', '-', '--output-format=json', *config.ruff_config(), *extra_ruff_args
+        p = Popen(args, stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        stdout, stderr = p.communicate(example.source, timeout=10)
+        if p.returncode not in (0, 1):
+            raise RuntimeError(f'Error running ruff, return code {p.returncode}:\n{stderr or stdout}')
+        # with `--fix`, the fixed code is written to stdout and the diagnostics to stderr
+        source, report = (stdout, stderr) if fix else ('', stdout)
+        failed = p.returncode == 1
+        diagnostics = _json_report(report) if failed else []
+        if failed and not diagnostics:
+            raise RuntimeError(f'Error running ruff, no diagnostics in output:\n{stderr or stdout}')
 
-        def replace_offset(m: re.Match[str]):
-            line_number = int(m.group(1))
-            return f'{example.path}:{line_number + example.start_line}'
+    if failed:
+        # diagnostics are for the fixed code, but the error is reported against the unchanged example
+        original_line = _original_line_map(example.source, source) if fix else None
+        raise RuffError([RuffDiagnostic.from_json(example, d, original_line) for d in diagnostics])
+    return source if fix else ''
 
-        output = re.sub(r'^-:(\d+)', replace_offset, stdout, flags=re.M)
-        raise FormatError(f'ruff failed:\n{indent(output, "  ")}')
-    elif p.returncode != 0:
-        raise RuntimeError(f'Error running ruff, return code {p.returncode}:\n{stderr or stdout}')
-    else:
-        return stdout
+
+def _json_report(output: str) -> list[dict[str, Any]]:
+    """Parse ruff's JSON diagnostics, skipping any warnings printed before them."""
+    m = re.search(r'^\[', output, flags=re.M)
+    if m is None:
+        return []
+    diagnostics, _ = json.JSONDecoder().raw_decode(output, m.start())
+    return diagnostics
+
+
+def _original_line_map(source: str, fixed: str) -> Callable[[int], int]:
+    """Map line numbers in `fixed` back to the corresponding lines in `source`.
+
+    Lines which fixes changed map to the nearest line of the code they replaced.
+    """
+    if fixed == source:
+        return lambda row: row
+    source_lines = source.splitlines()
+    fixed_lines = fixed.splitlines()
+    opcodes = SequenceMatcher(None, source_lines, fixed_lines, autojunk=False).get_opcodes()
+
+    def original_line(row: int) -> int:
+        index = row - 1
+        for _, i1, i2, j1, j2 in opcodes:
+            if j1 <= index < j2:
+                return i1 + min(index - j1, max(i2 - i1 - 1, 0)) + 1
+        # past the end of the code, e.g. syntax errors at the end of the file
+        return row + len(source_lines) - len(fixed_lines)
+
+    return original_line
+
+
+@cache
+def ruff_bin() -> str:
+    """Path to the ruff executable, cached since finding it means searching the filesystem."""
+    return find_ruff_bin()
+
+
+def ruff_check_batch(examples: Sequence[CodeExample], config: ExamplesConfig) -> list[list[RuffDiagnostic]]:
+    """Lint many examples with a single ruff process.
+
+    Each example is written to its own file in a temporary directory, the files are checked with
+    `--output-format=json` and the diagnostics are mapped back to the examples.
+
+    Returns:
+        For each example, the diagnostics `ruff_check` would raise, an empty list if the example passed.
+    """
+    if not examples:
+        return []
+    with tempfile.TemporaryDirectory(prefix='pytest-examples-ruff-') as tmp_dir:
+        # make the directory a package, so path based rules like INP001 give the same result as linting stdin
+        (Path(tmp_dir) / '__init__.py').touch()
+        files: list[str] = []
+        for index, example in enumerate(examples):
+            file = Path(tmp_dir) / f'example_{index}.py'
+            file.write_text(example.source)
+            files.append(str(file))
+
+        # files are passed explicitly, since checking the directory would apply the project's `include` setting
+        args = ruff_bin(), 'check', '--output-format=json', '--no-cache', *config.ruff_config(), *files
+        p = Popen(args, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        stdout, stderr = p.communicate(timeout=60)
+        if p.returncode not in (0, 1):
+            raise RuntimeError(f'Error running ruff, return code {p.returncode}:\n{stderr or stdout}')
+
+    diagnostics: list[list[dict[str, Any]]] = [[] for _ in examples]
+    for diagnostic in json.loads(stdout):
+        index = int(Path(diagnostic['filename']).stem.removeprefix('example_'))
+        diagnostics[index].append(diagnostic)
+    return [[RuffDiagnostic.from_json(example, d) for d in ds] for example, ds in zip(examples, diagnostics)]
+
+
+class RuffResults:
+    """Cache of ruff lint results, filled by linting every known example with one ruff process.
+
+    Examples are registered with `add`, e.g. when tests are collected, then the first `check` with a given config
+    lints all of them at once, so later checks are just lookups.
+
+    With `prefetch` set, examples are instead linted a few at a time in background threads: each `check` starts
+    linting the next `prefetch` known examples, so their results are usually ready by the time they're checked.
+    """
+
+    def __init__(self, server: RuffServerPool | None = None, prefetch: int = 0) -> None:
+        self.server = server
+        """If not None, used to lint examples which aren't linted along with any others."""
+        self.prefetch = prefetch
+        """Maximum number of examples being linted in the background, 0 to lint every known example at once."""
+        self._known: dict[tuple[str, int, str], CodeExample] = {}
+        self._order: list[tuple[str, int, str]] = []
+        self._positions: dict[tuple[str, int, str], int] = {}
+        self._results: dict[tuple[tuple[str, ...], tuple[str, int, str]], list[RuffDiagnostic]] = {}
+        self._pending: dict[tuple[tuple[str, ...], tuple[str, int, str]], Future[None]] = {}
+        self._executor = ThreadPoolExecutor(2, thread_name_prefix='pytest-examples-ruff') if prefetch else None
+        self._lock = threading.Lock()
+
+    def add(self, examples: Sequence[CodeExample]) -> None:
+        with self._lock:
+            for example in examples:
+                key = _example_key(example)
+                if key not in self._known:
+                    self._known[key] = example
+                    self._positions[key] = len(self._order)
+                    self._order.append(key)
+
+    def check(self, example: CodeExample, config: ExamplesConfig) -> list[RuffDiagnostic]:
+        """Get the problems ruff finds in `example`, an empty list if it passed."""
+        ruff_args = config.ruff_config()
+        key = ruff_args, _example_key(example)
+        if self._executor is not None:
+            return self._check_prefetched(example, config, key)
+        with self._lock:
+            try:
+                return self._results[key]
+            except KeyError:
+                pass
+            # the example itself first, since its source may have changed since it was added
+            batch = [example] + [
+                e for k, e in self._known.items() if (ruff_args, k) not in self._results and k != key[1]
+            ]
+            self._store(batch, config, self._lint(batch, config))
+            return self._results[key]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def _check_prefetched(
+        self, example: CodeExample, config: ExamplesConfig, key: tuple[tuple[str, ...], tuple[str, int, str]]
+    ) -> list[RuffDiagnostic]:
+        # start on the next examples first, so they're linted while this one is checked and run
+        self._prefetch_after(key, config)
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            # if linting in the background failed, the example is linted again below to raise the error here,
+            # in the test it belongs to
+            wait([future])
+        with self._lock:
+            try:
+                return self._results[key]
+            except KeyError:
+                pass
+        diagnostics = self._lint([example], config)
+        with self._lock:
+            self._store([example], config, diagnostics)
+        return diagnostics[0]
+
+    def _prefetch_after(self, key: tuple[tuple[str, ...], tuple[str, int, str]], config: ExamplesConfig) -> None:
+        """Start linting the known examples after `key` in the background, up to `prefetch` at a time."""
+        assert self._executor is not None
+        ruff_args, example_key = key
+        with self._lock:
+            position = self._positions.get(example_key)
+            if position is None:
+                return
+            room = self.prefetch - len(self._pending)
+            batch: list[CodeExample] = []
+            for k in self._order[position + 1 : position + 1 + self.prefetch]:
+                if len(batch) >= room:
+                    break
+                if (ruff_args, k) not in self._results and (ruff_args, k) not in self._pending:
+                    batch.append(self._known[k])
+            if not batch:
+                return
+            future = self._executor.submit(self._lint_in_background, batch, config)
+            for e in batch:
+                self._pending[ruff_args, _example_key(e)] = future
+
+    def _lint_in_background(self, batch: list[CodeExample], config: ExamplesConfig) -> None:
+        results: list[list[RuffDiagnostic]] | None = None
+        try:
+            results = self._lint(batch, config)
+        finally:
+            # in the same step as storing the results, so a check never finds neither
+            with self._lock:
+                if results is not None:
+                    self._store(batch, config, results)
+                for e in batch:
+                    self._pending.pop((config.ruff_config(), _example_key(e)), None)
+
+    def _lint(self, batch: list[CodeExample], config: ExamplesConfig) -> list[list[RuffDiagnostic]]:
+        if len(batch) == 1 and self.server is not None:
+            try:
+                ruff_check(batch[0], config, server=self.server)
+            except RuffError as exc:
+                return [exc.diagnostics]
+            else:
+                return [[]]
+        else:
+            return ruff_check_batch(batch, config)
+
+    def _store(self, batch: list[CodeExample], config: ExamplesConfig, results: list[list[RuffDiagnostic]]) -> None:
+        ruff_args = config.ruff_config()
+        for e, diagnostics in zip(batch, results):
+            self._results[ruff_args, _example_key(e)] = diagnostics
+
+
+def _example_key(example: CodeExample) -> tuple[str, int, str]:
+    return str(example.path), example.start_line, example.source
+
+
+class Formatter(ABC):
+    """A backend which formats Python code, selected with `ExamplesConfig.formatter`."""
+
+    name: str
+
+    @abstractmethod
+    def format(self, source: str, config: ExamplesConfig) -> str:
+        """Format `source`, raising black's `InvalidInput` if it can't be parsed."""
+
+    def prefetch(self, sources: Sequence[str], config: ExamplesConfig) -> None:
+        """Format many sources before `format` is called for each, if the backend can do that more cheaply."""
+
+
+class BlackFormatter(Formatter):
+    """Format with black, in this process."""
+
+    name = 'black'
+
+    def format(self, source: str, config: ExamplesConfig) -> str:
+        return black_format_str(source, mode=config.black_mode())
+
+
+class RuffFormatter(Formatter):
+    """Format with `ruff format`, which produces the same code as black in almost all cases.
+
+    `prefetch` formats many sources with one ruff process, each result is kept until `format` is called
+    with that source, or until `max_results` newer results have been prefetched.
+    """
+
+    name = 'ruff format'
+    max_results = 16384
+
+    def __init__(self) -> None:
+        # results for sources which may never be formatted are dropped oldest first
+        self._results: OrderedDict[tuple[tuple[str, ...], str], str | InvalidInput] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def format(self, source: str, config: ExamplesConfig) -> str:
+        ruff_args = config.ruff_format_config()
+        with self._lock:
+            result = self._results.pop((ruff_args, source), None)
+        if result is None:
+            p = Popen(
+                (ruff_bin(), 'format', '-', *ruff_args), stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=True
+            )
+            stdout, stderr = p.communicate(source, timeout=10)
+            m = re.search(r'^error: Failed to parse at (\d+:\d+: .*)$', stderr, flags=re.M)
+            if p.returncode == 2 and m:
+                result = InvalidInput(f'Cannot parse: {m.group(1)}')
+            elif p.returncode != 0:
+                raise RuntimeError(f'Error running ruff format, return code {p.returncode}:\n{stderr or stdout}')
+            else:
+                result = stdout
+        if isinstance(result, InvalidInput):
+            raise result
+        return result
+
+    def prefetch(self, sources: Sequence[str], config: ExamplesConfig) -> None:
+        ruff_args = config.ruff_format_config()
+        with self._lock:
+            sources = list(dict.fromkeys(s for s in sources if (ruff_args, s) not in self._results))
+        if len(sources) < 2:
+            return
+        with tempfile.TemporaryDirectory(prefix='pytest-examples-ruff-format-') as tmp_dir:
+            files = [Path(tmp_dir) / f'example_{index}.py' for index in range(len(sources))]
+            for file, source in zip(files, sources):
+                file.write_text(source)
+            args = ruff_bin(), 'format', '--no-cache', *ruff_args, *map(str, files)
+            p = Popen(args, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+            stdout, stderr = p.communicate(timeout=60)
+            if p.returncode not in (0, 2):
+                raise RuntimeError(f'Error running ruff format, return code {p.returncode}:\n{stderr or stdout}')
+            parse_errors = {
+                Path(m.group(1)).name: f'Cannot parse: {m.group(2)}'
+                for m in re.finditer(r'^error: Failed to parse (.+?\.py):(\d+:\d+: .*)$', stderr, flags=re.M)
+            }
+            results = {
+                (ruff_args, source): InvalidInput(parse_errors[file.name])
+                if file.name in parse_errors
+                else file.read_text()
+                for file, source in zip(files, sources)
+            }
+        with self._lock:
+            self._results.update(results)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+
+
+FORMATTERS: dict[str, Formatter] = {'black': BlackFormatter(), 'ruff': RuffFormatter()}
+
+
+def get_formatter(config: ExamplesConfig) -> Formatter:
+    try:
+        return FORMATTERS[config.formatter]
+    except KeyError:
+        raise ValueError(
+            f'Unknown formatter {config.formatter!r}, expected one of {", ".join(map(repr, FORMATTERS))}'
+        ) from None
 
 
 def black_format(source: str, config: ExamplesConfig, *, remove_double_blank: bool = False) -> str:
-    # hack to avoid black complaining about our print output format
-    before_black = re.sub(r'^( *#)> ', r'\1 > ', source, flags=re.M)
-    after_black = black_format_str(before_black, mode=config.black_mode())
-    # then revert it back
+    """Format `source` with the backend from `config`, black by default."""
+    after_black = get_formatter(config).format(_hide_print_output(source), config)
+    # undo `_hide_print_output`
     after_black = re.sub(r'^( *#) > ', r'\1> ', after_black, flags=re.M)
     if remove_double_blank:
         after_black = re.sub(r'\n{3}', '\n\n', after_black)
     return after_black
 
 
+def prefetch_format(examples: Sequence[CodeExample], config: ExamplesConfig) -> None:
+    """Let the formatter from `config` format many examples at once, before each is checked."""
+    prefetch_black_format([e.source for e in examples], config)
+
+
+def prefetch_black_format(sources: Sequence[str], config: ExamplesConfig) -> None:
+    """Let the formatter from `config` format many sources at once, before `black_format` is called for each."""
+    get_formatter(config).prefetch([_hide_print_output(source) for source in sources], config)
+
+
+class FormatPrefetch:
+    """Examples known to the session, formatted together the first time any example is formatted with a config.
+
+    Examples are registered with `add`, e.g. when tests are collected, so like `RuffResults` the ruff formatter
+    formats all of them with one process rather than starting a process for each.
+    """
+
+    def __init__(self) -> None:
+        self._known: dict[tuple[str, int, str], CodeExample] = {}
+        self._done: set[tuple[str, tuple[str, ...]]] = set()
+        self._lock = threading.Lock()
+
+    def add(self, examples: Sequence[CodeExample]) -> None:
+        with self._lock:
+            for example in examples:
+                self._known.setdefault(_example_key(example), example)
+
+    def prefetch(self, config: ExamplesConfig) -> None:
+        """Format every known example with `config`, unless that's already been done."""
+        key = config.formatter, config.ruff_format_config()
+        with self._lock:
+            if key in self._done:
+                return
+            self._done.add(key)
+            examples = list(self._known.values())
+        prefetch_format(examples, config)
+
+
+def _hide_print_output(source: str) -> str:
+    # hack to avoid black complaining about our print output format
+    return re.sub(r'^( *#)> ', r'\1 > ', source, flags=re.M)
+
+
+def format_example(example: CodeExample, config: ExamplesConfig) -> str:
+    """Fix the example with ruff then format it, like `EvalExample.format`, returning the new source.
+
+    This is run in worker processes by `EvalExample.run_many` in `'update'` mode.
+    """
+    source = ruff_format(example, config)
+    return black_format(source, config, remove_double_blank=example.in_py_file())
+
+
 def black_check(example: CodeExample, config: ExamplesConfig) -> None:
     after_black = black_format(example.source, config, remove_double_blank=example.in_py_file())
     if example.source != after_black:
         diff = code_diff(example, after_black, config)
-        raise FormatError(f'black failed:\n{indent(diff, "  ")}')
+        raise FormatError(f'{get_formatter(config).name} failed:\n{indent(diff, "  ")}')
 
 
 def code_diff(example: CodeExample, after: str, config: ExamplesConfig) -> str:
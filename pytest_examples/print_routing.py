@@ -0,0 +1,67 @@
+from __future__ import annotations as _annotations
+
+import builtins
+import sys
+import threading
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import FrameType
+from typing import Any
+
+__all__ = 'PrintTarget', 'route_print'
+
+PrintTarget = Callable[[FrameType, 'tuple[Any, ...]', 'dict[str, Any]'], None]
+"""Called with the frame which called `print`, and the positional and keyword arguments."""
+
+_context_target: ContextVar[PrintTarget | None] = ContextVar('pytest_examples_print_target', default=None)
+# used when no target is set for the current context, e.g. for threads started by an example
+_process_target: PrintTarget | None = None
+_lock = threading.Lock()
+_active = 0
+_original_print: Callable[..., None] = builtins.print
+
+
+def _routed_print(*args: Any, **kwargs: Any) -> None:
+    target = _context_target.get() or _process_target
+    if target is None:
+        _original_print(*args, **kwargs)
+    else:
+        target(sys._getframe(1), args, kwargs)
+
+
+@contextmanager
+def route_print(target: PrintTarget, *, context_local: bool = False) -> Iterator[None]:
+    """Send calls to `print` made in the current context to `target`.
+
+    `builtins.print` is replaced once while any routes are active, and each call is dispatched using a context
+    variable, so examples running concurrently in different threads or tasks each capture only their own output.
+
+    Args:
+        target: Called instead of `print`.
+        context_local: If False, `target` also receives calls from contexts without their own target, e.g. threads
+            started by the example, like the global patch of `print` used previously. This should only be used when
+            a single example is running.
+    """
+    global _active, _original_print, _process_target
+
+    with _lock:
+        if _active == 0:
+            _original_print = builtins.print
+            builtins.print = _routed_print
+        _active += 1
+        previous_process_target = _process_target
+        if not context_local:
+            _process_target = target
+
+    token = _context_target.set(target)
+    try:
+        yield
+    finally:
+        _context_target.reset(token)
+        with _lock:
+            if not context_local:
+                _process_target = previous_process_target
+            _active -= 1
+            if _active == 0:
+                builtins.print = _original_print
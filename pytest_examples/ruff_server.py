@@ -0,0 +1,359 @@
+from __future__ import annotations as _annotations
+
+import itertools
+import json
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from pathlib import Path
+from typing import IO, Any
+
+from .config import write_config_file
+
+__all__ = 'RuffServer', 'RuffServerPool', 'RuffServerError'
+
+
+class RuffServerError(RuntimeError):
+    """The `ruff server` process exited or returned an error."""
+
+
+class RuffServer:
+    """A long-lived `ruff server` process, driven over stdin and stdout with the language server protocol.
+
+    Requests from any number of threads are written as they're made and matched to responses by a reader thread,
+    so several can be in flight at once.
+    """
+
+    def __init__(self, ruff_bin: str, config_file: Path) -> None:
+        self._process = subprocess.Popen(
+            (ruff_bin, 'server'), stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self._ids = itertools.count(1)
+        self._pending: dict[int, Future[Any]] = {}
+        self._write_lock = threading.Lock()
+        self._documents = itertools.count()
+        self._document_dir = Path(tempfile.gettempdir()) / 'pytest-examples-ruff-server'
+        # documents are never written, but path based rules like INP001 look for a package on disk
+        self._document_dir.mkdir(exist_ok=True)
+        (self._document_dir / '__init__.py').touch()
+        self._reader = threading.Thread(target=self._read, name='pytest-examples-ruff-server', daemon=True)
+        self._reader.start()
+        self._result(
+            'initialize',
+            {
+                'processId': os.getpid(),
+                'rootUri': None,
+                'capabilities': {},
+                'initializationOptions': {
+                    'settings': {'configuration': str(config_file), 'configurationPreference': 'editorOnly'}
+                },
+            },
+        )
+        self.notify('initialized', {})
+
+    @property
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    def check(self, source: str, *, fix: bool, diagnostics: bool = True) -> tuple[str, list[dict[str, Any]]]:
+        """Lint `source`, optionally applying ruff's safe fixes first, like `ruff check --fix`.
+
+        Returns:
+            The source after fixes, and the problems which remain in it in the format of
+            `ruff check --output-format=json`, or an empty list if `diagnostics` is False.
+        """
+        document = {'uri': (self._document_dir / f'example_{next(self._documents)}.py').as_uri()}
+        self.notify(
+            'textDocument/didOpen', {'textDocument': {**document, 'languageId': 'python', 'version': 1, 'text': source}}
+        )
+        try:
+            fixed = self._fix_all(document, source) if fix else source
+            if not diagnostics:
+                return fixed, []
+            items = self._diagnostics(document)
+            # with `fix`, every safe fix has been applied, so any fix still offered isn't safe
+            safe: set[int] = set() if fix else self._safe_fixes(document, source, items)
+        finally:
+            self.notify('textDocument/didClose', {'textDocument': document})
+        cli_diagnostics = [_cli_diagnostic(fixed, d, i in safe) for i, d in enumerate(items)]
+        return fixed, sorted(cli_diagnostics, key=_diagnostic_order)
+
+    def _fix_all(self, document: dict[str, str], source: str) -> str:
+        """Apply ruff's safe fixes to the open document, returning the fixed source."""
+        actions = self._result(
+            'textDocument/codeAction',
+            {
+                'textDocument': document,
+                'range': {'start': {'line': 0, 'character': 0}, 'end': {'line': 0, 'character': 0}},
+                'context': {'diagnostics': [], 'only': ['source.fixAll.ruff']},
+            },
+        )
+        edits = [e for action in actions or () for e in action['edit']['changes'].get(document['uri'], ())]
+        if not edits:
+            return source
+        fixed = _apply_edits(source, edits)
+        self._change(document, 2, fixed)
+        return fixed
+
+    def _diagnostics(self, document: dict[str, str]) -> list[dict[str, Any]]:
+        return self._result('textDocument/diagnostic', {'textDocument': document})['items']
+
+    def _safe_fixes(self, document: dict[str, str], source: str, items: list[dict[str, Any]]) -> set[int]:
+        """Find which of the diagnostics `items` have safe fixes.
+
+        The server offers the edits of safe and unsafe fixes without saying which is which, so the safe fixes
+        are applied, and a fix is safe if its diagnostic doesn't remain afterwards.
+        """
+        fixable = [i for i, d in enumerate(items) if _edits(d)]
+        if not fixable:
+            return set()
+        if self._fix_all(document, source) == source:
+            return set()
+        # line numbers change with the fixes, but the messages name what they're about
+        remaining = Counter((d.get('code'), d['message']) for d in self._diagnostics(document) if _edits(d))
+        safe: set[int] = set()
+        for i in fixable:
+            key = items[i].get('code'), items[i]['message']
+            if remaining[key]:
+                remaining[key] -= 1
+            else:
+                safe.add(i)
+        return safe
+
+    def _change(self, document: dict[str, str], version: int, text: str) -> None:
+        self.notify(
+            'textDocument/didChange',
+            {'textDocument': {**document, 'version': version}, 'contentChanges': [{'text': text}]},
+        )
+
+    def request(self, method: str, params: Any) -> Future[Any]:
+        """Send a request, the future is resolved with its result by the reader thread."""
+        future: Future[Any] = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = future
+        try:
+            if not self._reader.is_alive():
+                raise RuffServerError('ruff server exited')
+            self._send({'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params})
+        except RuffServerError:
+            self._pending.pop(request_id, None)
+            raise
+        return future
+
+    def _result(self, method: str, params: Any, timeout: float = 60) -> Any:
+        try:
+            return self.request(method, params).result(timeout)
+        except FutureTimeoutError as exc:
+            raise RuffServerError(f'ruff server did not respond to {method!r} within {timeout}s') from exc
+
+    def notify(self, method: str, params: Any) -> None:
+        self._send({'jsonrpc': '2.0', 'method': method, 'params': params})
+
+    def close(self, timeout: float = 2) -> None:
+        if self.alive:
+            try:
+                self.request('shutdown', None).result(timeout)
+                self.notify('exit', None)
+                self._process.wait(timeout)
+            except Exception:
+                self._process.kill()
+                self._process.wait()
+        self._reader.join(timeout)
+        for stream in self._process.stdin, self._process.stdout:
+            if stream is not None:
+                stream.close()
+
+    def _send(self, message: dict[str, Any]) -> None:
+        body = json.dumps(message).encode()
+        stdin = self._process.stdin
+        assert stdin is not None
+        with self._write_lock:
+            try:
+                stdin.write(b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+                stdin.flush()
+            except (BrokenPipeError, ValueError) as exc:
+                raise RuffServerError('ruff server exited') from exc
+
+    def _read(self) -> None:
+        stdout = self._process.stdout
+        assert stdout is not None
+        try:
+            while (message := _read_message(stdout)) is not None:
+                if 'method' in message:
+                    # notifications like `textDocument/publishDiagnostics`, and requests from the server which
+                    # don't happen with the capabilities we declare
+                    continue
+                future = self._pending.pop(message['id'], None)
+                if future is None:
+                    continue
+                if 'error' in message:
+                    future.set_exception(RuffServerError(f'ruff server error: {message["error"].get("message")}'))
+                else:
+                    future.set_result(message.get('result'))
+        finally:
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(RuffServerError('ruff server exited'))
+
+
+def _read_message(stream: IO[bytes]) -> dict[str, Any] | None:
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        if line == b'\r\n':
+            break
+        name, _, value = line.decode('ascii').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    if length is None:
+        raise RuffServerError('message from ruff server has no Content-Length header')
+    return json.loads(stream.read(length))
+
+
+class RuffServerPool:
+    """`ruff server` processes shared by a test session, so lints and fixes don't each start a new ruff process.
+
+    Servers are started when first needed, up to `size` for each set of ruff arguments from
+    `ExamplesConfig.ruff_config()`, and requests are spread between them. A server which exits is replaced,
+    and the request retried once.
+    """
+
+    def __init__(self, ruff_bin: str, size: int = 1) -> None:
+        self.ruff_bin = ruff_bin
+        self.size = size
+        self._servers: dict[tuple[str, ...], list[RuffServer]] = {}
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def check(
+        self, source: str, ruff_args: tuple[str, ...], *, fix: bool, diagnostics: bool = True
+    ) -> tuple[str, list[dict[str, Any]]]:
+        """Lint and optionally fix `source` with the settings from `ruff_args`, see `RuffServer.check`."""
+        index = next(self._next) % self.size
+        try:
+            return self._server(ruff_args, index).check(source, fix=fix, diagnostics=diagnostics)
+        except RuffServerError:
+            return self._server(ruff_args, index, restart=True).check(source, fix=fix, diagnostics=diagnostics)
+
+    def close(self) -> None:
+        with self._lock:
+            servers = [server for group in self._servers.values() for server in group]
+            self._servers.clear()
+        for server in servers:
+            server.close()
+
+    def __len__(self) -> int:
+        return sum(len(group) for group in self._servers.values())
+
+    def _server(self, ruff_args: tuple[str, ...], index: int, *, restart: bool = False) -> RuffServer:
+        with self._lock:
+            group = self._servers.setdefault(ruff_args, [])
+            if index < len(group) and group[index].alive and not restart:
+                return group[index]
+            server = RuffServer(self.ruff_bin, server_config_file(ruff_args))
+            if index < len(group):
+                old, group[index] = group[index], server
+                old.close()
+            else:
+                group.append(server)
+            return server
+
+
+def server_config_file(ruff_args: tuple[str, ...]) -> Path:
+    """Write a config file for `ruff server` equivalent to the command line arguments from `ruff_config()`.
+
+    As with `ruff check`, the config extends the project's config, found from the current directory,
+    unless the arguments include `--config`.
+    """
+    extend: str | None = None
+    lines: list[str] = []
+    lint_lines: list[str] = []
+    for arg in ruff_args:
+        name, _, value = arg.removeprefix('--').partition('=')
+        if name == 'config':
+            extend = value
+        elif name in ('line-length', 'target-version'):
+            lines.append(f'{name} = {value if value.isdigit() else json.dumps(value)}')
+        elif name in ('extend-select', 'ignore'):
+            lint_lines.append(f'{name} = {json.dumps(value.split(","))}')
+        else:
+            raise ValueError(f'Unsupported ruff argument for ruff server: {arg!r}')
+    if extend is None:
+        extend = _find_project_config(Path.cwd())
+    if extend is not None:
+        lines.insert(0, f'extend = {json.dumps(extend)}')
+    config_toml = '\n'.join([*lines, '', '[lint]', *lint_lines, ''])
+
+    return write_config_file('pytest-examples-ruff-server', config_toml)
+
+
+def _find_project_config(directory: Path) -> str | None:
+    """Find the config `ruff check -` would use in `directory`, in the same order ruff looks for it."""
+    for path in (directory, *directory.parents):
+        for name in ('.ruff.toml', 'ruff.toml', 'pyproject.toml'):
+            file = path / name
+            if file.is_file() and (name != 'pyproject.toml' or re.search(r'^\[tool\.ruff', file.read_text(), re.M)):
+                return str(file)
+    return None
+
+
+def _apply_edits(source: str, edits: list[dict[str, Any]]) -> str:
+    """Apply LSP text edits to `source`."""
+    lines = source.splitlines(keepends=True)
+    starts = list(itertools.accumulate((len(line) for line in lines), initial=0))
+
+    def offset(position: dict[str, int]) -> int:
+        line = position['line']
+        if line >= len(lines):
+            return len(source)
+        return starts[line] + _utf16_to_index(lines[line], position['character'])
+
+    ranges = sorted(
+        ((offset(e['range']['start']), offset(e['range']['end']), e['newText']) for e in edits), reverse=True
+    )
+    for start, end, text in ranges:
+        source = source[:start] + text + source[end:]
+    return source
+
+
+def _cli_diagnostic(source: str, diagnostic: dict[str, Any], safe_fix: bool) -> dict[str, Any]:
+    """Convert an LSP diagnostic to the format of `ruff check --output-format=json`.
+
+    The server only offers the edits of safe and unsafe fixes, so display-only fixes are left out.
+    """
+    start = diagnostic['range']['start']
+    lines = source.splitlines()
+    line = lines[start['line']] if start['line'] < len(lines) else ''
+    if _edits(diagnostic):
+        fix = {'applicability': 'safe' if safe_fix else 'unsafe'}
+    else:
+        fix = None
+    return {
+        'code': diagnostic.get('code'),
+        'message': diagnostic['message'],
+        'location': {'row': start['line'] + 1, 'column': _utf16_to_index(line, start['character']) + 1},
+        'fix': fix,
+    }
+
+
+def _edits(diagnostic: dict[str, Any]) -> list[dict[str, Any]]:
+    """The edits of the diagnostic's fix, empty if it has none."""
+    return (diagnostic.get('data') or {}).get('edits') or []
+
+
+def _diagnostic_order(diagnostic: dict[str, Any]) -> tuple[int, int, str]:
+    location = diagnostic['location']
+    return location['row'], location['column'], diagnostic['code'] or ''
+
+
+def _utf16_to_index(line: str, character: int) -> int:
+    """Convert an LSP character offset, in UTF-16 code units, to an index into `line`."""
+    if line.isascii():
+        return character
+    return len(line.encode('utf-16-le')[: character * 2].decode('utf-16-le', errors='ignore'))
@@ -7,27 +7,40 @@ import importlib.util
 import inspect
 import re
 import sys
-from collections.abc import Callable, Sequence
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Coroutine, Iterable, Iterator, Sequence
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
+from functools import lru_cache
 from importlib.abc import Loader
+from importlib.machinery import ModuleSpec
 from pathlib import Path
 from textwrap import indent
+from types import CodeType, FrameType, ModuleType
 from typing import TYPE_CHECKING, Any
-from unittest.mock import patch
 
 import pytest
+from _pytest.assertion.rewrite import AssertionRewritingHook, rewrite_asserts
+from _pytest.outcomes import Failed as PytestFailed
 from black.parsing import InvalidInput
 
-from .lint import black_format, code_diff
+from .config import ExamplesConfig
+from .find_examples import parse_source
+from .interpreter_worker import eval_async, print_arg
+from .lazy_globals import ResolveLazy, apply_module_globals
+from .limits import LimitExceeded, Limits, enforce_limits
+from .lint import black_format, code_diff, prefetch_black_format
+from .print_routing import route_print
 from .traceback import create_example_traceback
+from .virtual_time import virtual_time as use_virtual_time
 
 if TYPE_CHECKING:
-    from .config import ExamplesConfig
+    from .async_runner import AsyncRunner
     from .find_examples import CodeExample
 
-__all__ = 'run_code', 'InsertPrintStatements', 'IncludePrint'
+__all__ = 'run_code', 'arun_code', 'InsertPrintStatements', 'IncludePrint'
 
-parent_frame_id = 4
 IncludePrint = Callable[[Path, inspect.FrameInfo, Sequence[Any]], bool]
 
 
@@ -42,6 +55,12 @@ def run_code(
     include_print: IncludePrint | None,
     module_globals: dict[str, Any] | None,
     call: str | None,
+    async_runner: AsyncRunner | None = None,
+    limits: Limits | None = None,
+    module: ModuleType | None = None,
+    resolve_lazy: ResolveLazy | None = None,
+    concurrent: bool = False,
+    virtual_time: bool = False,
 ) -> tuple[InsertPrintStatements, dict[str, Any]]:
     """Run the code example.
 
@@ -53,38 +72,58 @@ def run_code(
         enable_print_mock: If True, mock the `print` function.
         print_callback: If not None, a callback to call on `print`.
         include_print: If not None, a function to call to determine if the print statement should be included.
-        module_globals: The extra globals to add before calling the module.
+        module_globals: The extra globals to add before calling the module, `LazyGlobal` values are only built
+            when the example first uses them.
         call: If not None, a (coroutine) function to call in the module.
+        async_runner: If not None, compile the example allowing top-level `await` and run coroutines
+            on this runner's event loop instead of with `asyncio.run()`, the module body is only run in the loop
+            if it uses top-level `await`.
+        limits: If not None, the wall-clock, CPU and memory limits to enforce while running the example.
+        module: If not None, run the example in this module's namespace instead of a fresh one,
+            so it can use names defined by examples run before it.
+        resolve_lazy: If not None, used to get the value of `LazyGlobal`s from `module_globals`, e.g. from a cache.
+        concurrent: If True, other examples may be running at the same time in other threads, so only `print` calls
+            from this thread are captured and `sys.modules['__main__']` is left alone.
+        virtual_time: If True, run the example with a virtual clock so sleeps return immediately, `async_runner`
+            must then use a `VirtualTimeEventLoop`.
 
     Returns:
         A tuple of the `InsertPrintStatements` instance and the module's globals.
     """
     __tracebackhide__ = True
 
-    spec = importlib.util.spec_from_file_location('__main__', str(python_file), loader=loader)
-    assert spec is not None, f'Could not load {python_file}'
-    assert spec.loader is not None, f'Loader is None for {python_file}'
-    module = importlib.util.module_from_spec(spec)
+    spec, module = _prepare_module(python_file, loader, module, module_globals, resolve_lazy)
+    assert spec.loader is not None
 
     # does nothing if insert_print_statements is False
-    insert_print = InsertPrintStatements(python_file, config, enable_print_mock, print_callback, include_print)
-
-    if module_globals:
-        module.__dict__.update(module_globals)
+    insert_print = InsertPrintStatements(
+        python_file, config, enable_print_mock, print_callback, include_print, context_local=concurrent
+    )
 
     try:
-        with insert_print:
-            sys.modules[spec.name] = module
-            spec.loader.exec_module(module)
+        clock = use_virtual_time() if virtual_time else nullcontext()
+        with insert_print, enforce_limits(limits or Limits(), example), clock:
+            if not concurrent:
+                sys.modules[spec.name] = module
+            code = compile_example(python_file, loader) if async_runner is not None else None
+            if async_runner is not None and code is not None and code.co_flags & inspect.CO_COROUTINE:
+                async_runner.run(eval_async(code, module.__dict__), label=str(example))
+            else:
+                # without top-level `await` the body runs outside the loop, so it can call `asyncio.run()` itself
+                spec.loader.exec_module(module)
             if call:
                 to_call = getattr(module, call, None)
                 if to_call is not None:
-                    if inspect.iscoroutinefunction(to_call):
+                    if not inspect.iscoroutinefunction(to_call):
+                        to_call()
+                    elif async_runner is None:
                         asyncio.run(to_call())
                     else:
-                        to_call()
+                        async_runner.run(to_call(), label=str(example))
     except KeyboardInterrupt:
         print('KeyboardInterrupt in example')
+    except LimitExceeded as exc:
+        raise PytestFailed(str(exc), pytrace=False) from None
     except Exception as exc:
         example_tb = create_example_traceback(exc, str(python_file), example)
         if example_tb:
@@ -92,7 +131,131 @@ def run_code(
         else:
             raise exc
 
-    return insert_print, {k: v for k, v in module.__dict__.items() if not k.startswith(('__', '@'))}
+    return insert_print, _module_dict(module)
+
+
+async def arun_code(
+    *,
+    example: CodeExample,
+    python_file: Path,
+    loader: Loader | None,
+    config: ExamplesConfig,
+    enable_print_mock: bool,
+    print_callback: Callable[[str], str] | None,
+    include_print: IncludePrint | None,
+    module_globals: dict[str, Any] | None,
+    call: str | None,
+    timeout: float | None = None,
+    resolve_lazy: ResolveLazy | None = None,
+) -> tuple[InsertPrintStatements, dict[str, Any]]:
+    """Run the code example in the running event loop, allowing top-level `await`.
+
+    Print calls are captured for the current task only, so many examples can be run concurrently,
+    e.g. with `asyncio.gather()`. Arguments are as for `run_code`.
+
+    Args:
+        example: The `CodeExample` to run.
+        python_file: The path to the python file.
+        loader: optional loader to use to load the module.
+        config: The `ExamplesConfig` to use.
+        enable_print_mock: If True, mock the `print` function.
+        print_callback: If not None, a callback to call on `print`.
+        include_print: If not None, a function to call to determine if the print statement should be included.
+        module_globals: The extra globals to add before calling the module.
+        call: If not None, a (coroutine) function to call in the module.
+        timeout: If not None, the example is cancelled and fails if it takes longer than this many seconds.
+        resolve_lazy: If not None, used to get the value of `LazyGlobal`s from `module_globals`.
+
+    Returns:
+        A tuple of the `InsertPrintStatements` instance and the module's globals.
+    """
+    __tracebackhide__ = True
+
+    _, module = _prepare_module(python_file, loader, None, module_globals, resolve_lazy)
+    insert_print = InsertPrintStatements(
+        python_file, config, enable_print_mock, print_callback, include_print, context_local=True
+    )
+
+    try:
+        with insert_print:
+            await _with_timeout(_call_async(compile_example(python_file, loader), module, call), timeout)
+    except LimitExceeded:
+        limit = Limits(timeout=timeout).describe('timeout')
+        raise PytestFailed(f'{example}: example exceeded its {limit}', pytrace=False) from None
+    except Exception as exc:
+        example_tb = create_example_traceback(exc, str(python_file), example)
+        if example_tb:
+            raise exc.with_traceback(example_tb)
+        else:
+            raise exc
+
+    return insert_print, _module_dict(module)
+
+
+def _prepare_module(
+    python_file: Path,
+    loader: Loader | None,
+    module: ModuleType | None,
+    module_globals: dict[str, Any] | None,
+    resolve_lazy: ResolveLazy | None,
+) -> tuple[ModuleSpec, ModuleType]:
+    spec = importlib.util.spec_from_file_location('__main__', str(python_file), loader=loader)
+    assert spec is not None, f'Could not load {python_file}'
+    assert spec.loader is not None, f'Loader is None for {python_file}'
+    if module is None:
+        module = importlib.util.module_from_spec(spec)
+    else:
+        module.__spec__ = spec
+        module.__loader__ = spec.loader
+        module.__file__ = spec.origin
+
+    apply_module_globals(module.__dict__, module_globals, resolve_lazy)
+    return spec, module
+
+
+def _module_dict(module: ModuleType) -> dict[str, Any]:
+    return {k: v for k, v in module.__dict__.items() if not k.startswith(('__', '@'))}
+
+
+async def _call_async(code: CodeType, module: ModuleType, call: str | None) -> None:
+    __tracebackhide__ = True
+    await eval_async(code, module.__dict__)
+    if call:
+        to_call = getattr(module, call, None)
+        if to_call is not None:
+            result = to_call()
+            if inspect.iscoroutine(result):
+                await result
+
+
+async def _with_timeout(coro: Coroutine[Any, Any, None], timeout: float | None) -> None:
+    __tracebackhide__ = True
+    if timeout is None:
+        await coro
+    elif sys.version_info >= (3, 11):
+        # unlike `wait_for` on 3.11, this runs `coro` in the current task, so print routing still applies
+        cm = asyncio.timeout(timeout)
+        try:
+            async with cm:
+                await coro
+        except TimeoutError:
+            if cm.expired():
+                raise LimitExceeded from None
+            raise
+    else:
+        try:
+            await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise LimitExceeded from None
+
+
+def compile_example(python_file: Path, loader: Loader | None) -> CodeType:
+    """Compile the example allowing top-level `await`, rewriting assertions if `loader` would have done so."""
+    source = python_file.read_bytes()
+    tree = ast.parse(source, filename=str(python_file))
+    if isinstance(loader, AssertionRewritingHook):
+        rewrite_asserts(tree, source, str(python_file), loader.config)
+    return compile(tree, str(python_file), 'exec', flags=ast.PyCF_ALLOW_TOP_LEVEL_AWAIT, dont_inherit=True)
 
 
 @dataclass(init=False)
@@ -103,15 +266,15 @@ class Arg:
     is_str: bool = False
 
     def __init__(self, v: Any):
-        if isinstance(v, str):
-            self.data = v
-            self.is_str = True
-        elif isinstance(v, set):
-            # NOTE! this is not recursive
-            ordered = ', '.join(repr(x) for x in sorted(v))
-            self.data = f'{{{ordered}}}'
-        else:
-            self.data = re.sub('0x[a-f0-9]{8,12}>', '0x0123456789ab>', str(v))
+        self.data, self.is_str = print_arg(v)
+
+    @classmethod
+    def from_data(cls, data: str, is_str: bool) -> Arg:
+        """Create an argument from data already converted by `print_arg`, e.g. in a sub-interpreter."""
+        arg = cls.__new__(cls)
+        arg.data = data
+        arg.is_str = is_str
+        return arg
 
     def __str__(self) -> str:
         return self.data
@@ -120,10 +283,69 @@ class Arg:
         if self.is_str:
             return self.data
         else:
-            try:
-                return black_format(self.data, config)
-            except InvalidInput:
-                return self.data
+            return _format_repr(self.data, config)
+
+
+_ReprKey = tuple[str, int, str, bool, str, str]
+# formatted reprs by `_repr_key`, least recently used first
+_repr_cache: OrderedDict[_ReprKey, str] = OrderedDict()
+_repr_cache_lock = threading.Lock()
+_REPR_CACHE_SIZE = 4096
+
+
+def _repr_key(data: str, config: ExamplesConfig) -> _ReprKey:
+    """Key for the formatted repr `data`, made from the settings the formatter uses."""
+    return data, config.line_length, config.quotes, config.magic_trailing_comma, config.target_version, config.formatter
+
+
+def _format_repr(data: str, config: ExamplesConfig) -> str:
+    """Format the repr of a printed value.
+
+    This is cached since the same value is often printed by many examples.
+    """
+    key = _repr_key(data, config)
+    with _repr_cache_lock:
+        formatted = _repr_cache.get(key)
+        if formatted is not None:
+            _repr_cache.move_to_end(key)
+            return formatted
+    formatted = _format_repr_uncached(data, config)
+    with _repr_cache_lock:
+        _repr_cache[key] = formatted
+        if len(_repr_cache) > _REPR_CACHE_SIZE:
+            _repr_cache.popitem(last=False)
+    return formatted
+
+
+def _repr_cached(data: str, config: ExamplesConfig) -> bool:
+    with _repr_cache_lock:
+        return _repr_key(data, config) in _repr_cache
+
+
+def _format_repr_uncached(data: str, config: ExamplesConfig) -> str:
+    if not _is_python(data):
+        return data
+    # only the settings in the key may affect the result
+    config = ExamplesConfig(
+        line_length=config.line_length,
+        quotes=config.quotes,
+        magic_trailing_comma=config.magic_trailing_comma,
+        target_version=config.target_version,
+        formatter=config.formatter,
+    )
+    try:
+        return black_format(data, config)
+    except InvalidInput:
+        return data
+
+
+def _is_python(data: str) -> bool:
+    """Check a repr parses, much cheaper than black failing on reprs which aren't Python, e.g. `<Foo at 0x...>`."""
+    try:
+        ast.parse(data)
+    except (SyntaxError, ValueError):
+        return False
+    return True
 
 
 @dataclass
@@ -133,6 +355,8 @@ class PrintStatement:
     line_no: int
     sep: str
     args: list[Arg]
+    omitted: int = 0
+    """Number of later prints from the same line which weren't recorded because of the capture limits."""
 
     def __str__(self):
         return self.sep.join(map(str, self.args))
@@ -145,37 +369,119 @@ def not_print(*args):
 
 
 class MockPrintFunction:
-    __slots__ = 'file', 'statements', 'include_print'
+    """Records calls to `print` as `PrintStatement`s, keeping only the formatted arguments.
 
-    def __init__(self, file: Path, include_print: IncludePrint | None) -> None:
+    If `config` sets capture limits, the memory used is bounded: prints over the limits are counted against
+    the last statement recorded from their line instead of being recorded, and long arguments are truncated.
+    """
+
+    __slots__ = (
+        'file',
+        'statements',
+        'include_print',
+        'max_per_line',
+        'max_arg_bytes',
+        'max_bytes',
+        '_same_file',
+        '_limited',
+        '_line_counts',
+        '_last',
+        '_total_bytes',
+        '_full',
+    )
+
+    def __init__(self, file: Path, include_print: IncludePrint | None, config: ExamplesConfig | None = None) -> None:
         self.file = file
         self.statements: list[PrintStatement] = []
         self.include_print = include_print
-
-    def __call__(self, *args: Any, sep: str = ' ', **kwargs: Any) -> None:
-        frame = inspect.stack()[parent_frame_id]
-
-        if self._include_file(frame, args):
-            lineno = self._find_line_number(frame)
-            s = PrintStatement(lineno, sep, [Arg(arg) for arg in args])
-            self.statements.append(s)
-
-    def _include_file(self, frame: inspect.FrameInfo, args: Sequence[Any]) -> bool:
+        self.max_per_line = config and config.print_max_per_line
+        self.max_arg_bytes = config and config.print_max_arg_bytes
+        self.max_bytes = config and config.print_max_bytes
+        # whether each code filename seen refers to `file`, so the filesystem is only checked once per filename
+        self._same_file: dict[str, bool] = {str(file): True}
+        self._limited = (self.max_per_line, self.max_arg_bytes, self.max_bytes) != (None, None, None)
+        self._line_counts: dict[int, int] = {}
+        self._last: dict[int, PrintStatement] = {}
+        self._total_bytes = 0
+        self._full = False
+
+    def __call__(self, caller: FrameType, args: tuple[Any, ...], kwargs: dict[str, Any]) -> None:
         if self.include_print:
-            return self.include_print(self.file, frame, args)
+            frame_info = inspect.FrameInfo(caller, *inspect.getframeinfo(caller))
+            if not self.include_print(self.file, frame_info, args):
+                return
+            lineno = self._find_line_number(caller)
+        elif self._is_file(caller.f_code.co_filename):
+            lineno = caller.f_lineno
         else:
-            return self.file.samefile(frame.filename)
+            return
 
-    def _find_line_number(self, inspect_frame: inspect.FrameInfo) -> int:
+        sep = kwargs.get('sep')
+        sep = ' ' if sep is None else sep
+        if self._limited:
+            self._record_limited(lineno, sep, args)
+        else:
+            self.statements.append(PrintStatement(lineno, sep, [Arg(arg) for arg in args]))
+
+    def _record_limited(self, lineno: int, sep: str, args: tuple[Any, ...]) -> None:
+        count = self._line_counts.get(lineno, 0)
+        if self._full or (self.max_per_line is not None and count >= self.max_per_line):
+            self._omit(lineno)
+            return
+
+        print_args = [self._truncated_arg(arg) for arg in args]
+        if self.max_bytes is not None:
+            size = sum(len(arg.data.encode()) for arg in print_args)
+            if self._total_bytes + size > self.max_bytes:
+                # stop recording altogether, so the output doesn't depend on the size of each later print
+                self._full = True
+                self._omit(lineno)
+                return
+            self._total_bytes += size
+
+        statement = PrintStatement(lineno, sep, print_args)
+        self.statements.append(statement)
+        self._line_counts[lineno] = count + 1
+        self._last[lineno] = statement
+
+    def _truncated_arg(self, value: Any) -> Arg:
+        arg = Arg(value)
+        if self.max_arg_bytes is not None:
+            data = arg.data.encode()
+            if len(data) > self.max_arg_bytes:
+                head = data[: self.max_arg_bytes].decode(errors='ignore')
+                # not formatted with black, since a truncated repr won't be valid python
+                return Arg.from_data(f'{head}{truncated_marker(len(data) - self.max_arg_bytes)}', True)
+        return arg
+
+    def _omit(self, lineno: int) -> None:
+        statement = self._last.get(lineno)
+        if statement is None:
+            # nothing recorded from this line yet, add a statement with no output to carry the count
+            statement = self._last[lineno] = PrintStatement(lineno, ' ', [])
+            self.statements.append(statement)
+        statement.omitted += 1
+
+    def _is_file(self, filename: str) -> bool:
+        try:
+            return self._same_file[filename]
+        except KeyError:
+            try:
+                same = self.file.samefile(filename)
+            except OSError:
+                # e.g. `<string>` for code compiled from a string
+                same = False
+            self._same_file[filename] = same
+            return same
+
+    def _find_line_number(self, caller: FrameType) -> int:
         """Find the line number of the print statement in the file that is being executed."""
-        frame = inspect_frame.frame
-        while True:
-            if self.file.samefile(frame.f_code.co_filename):
+        frame: FrameType | None = caller
+        while frame is not None:
+            if self._is_file(frame.f_code.co_filename):
                 return frame.f_lineno
-            elif frame.f_back:
-                frame = frame.f_back
-            else:
-                raise RuntimeError(f'Could not find line number of print statement at {inspect_frame}')
+            frame = frame.f_back
+        raise RuntimeError(f'Could not find line number of print statement at {caller}')
 
 
 class InsertPrintStatements:
@@ -186,21 +492,40 @@ class InsertPrintStatements:
         enable: bool,
         print_callback: Callable[[str], str] | None,
         include_print: IncludePrint | None,
+        *,
+        context_local: bool = False,
     ):
         self.file = python_path
         self.config = config
-        self.print_func = MockPrintFunction(python_path, include_print) if enable else None
+        self.print_func = MockPrintFunction(python_path, include_print, config) if enable else None
         self.print_callback = print_callback
-        self.patch = None
+        self.context_local = context_local
+        self._route: AbstractContextManager[None] | None = None
+        self._indent_configs: dict[int, ExamplesConfig] = {}
+
+    @classmethod
+    def from_statements(
+        cls,
+        python_path: Path,
+        config: ExamplesConfig,
+        statements: list[PrintStatement],
+        print_callback: Callable[[str], str] | None,
+    ) -> InsertPrintStatements:
+        """Create an instance from print statements captured elsewhere, e.g. in a worker process."""
+        insert_print = cls(python_path, config, True, print_callback, None)
+        assert insert_print.print_func is not None
+        insert_print.print_func.statements = statements
+        return insert_print
 
     def __enter__(self) -> None:
         if self.print_func:
-            self.patch = patch('builtins.print', side_effect=self.print_func)
-            self.patch.start()
+            self._route = route_print(self.print_func, context_local=self.context_local)
+            self._route.__enter__()
 
     def __exit__(self, *args) -> None:
-        if self.patch is not None:
-            self.patch.stop()
+        if self._route is not None:
+            self._route.__exit__(*args)
+            self._route = None
 
     def check_print_statements(self, example: CodeExample) -> None:
         new_code = self.updated_print_statements(example)
@@ -209,56 +534,112 @@ class InsertPrintStatements:
             pytest.fail(f'Print output changed code:\n{indent(diff, "  ")}', pytrace=False)
 
     def updated_print_statements(self, example: CodeExample) -> str | None:
-        with_prints = self._insert_print_statements(example)
-        # we check against the raw `with_prints` and `with_prints` with trailing whitespace removed
-        # since trailing white space will have already been stripped by pre-commit in `example.source`
-        if example.source not in (with_prints, re.sub(r'[ \t]+\n', '\n', with_prints)):
-            return with_prints
+        source = example.source
+        chunks: list[str] = []
+        # we check against the raw output and the output with trailing whitespace removed
+        # since trailing white space will have already been stripped by pre-commit in `example.source`,
+        # each comparison stops at the first mismatch
+        raw_pos: int | None = 0
+        stripped_pos: int | None = 0
+        for chunk in self._spliced_lines(example):
+            chunks.append(chunk)
+            if raw_pos is not None:
+                raw_pos = _match_at(source, f'{chunk}\n', raw_pos)
+            if stripped_pos is not None:
+                stripped_pos = _match_at(source, re.sub(r'[ \t]+\n', '\n', f'{chunk}\n'), stripped_pos)
+        if len(source) not in (raw_pos, stripped_pos):
+            return '\n'.join(chunks) + '\n'
 
     def print_statements(self) -> list[PrintStatement]:
         return self.print_func.statements if self.print_func else []
 
-    def _insert_print_statements(self, example: CodeExample) -> str:
-        assert self.print_func is not None, 'print statements not being inserted'
+    def _spliced_lines(self, example: CodeExample) -> Iterator[str]:
+        """Generate the lines of the example with the old print output replaced by the new output.
 
-        lines = example.source.splitlines()
-
-        old_line_no = -1
+        The old output after each print is found first, then the example is copied in one pass, so this is linear
+        in the length of the example. A single item may contain several lines for output in triple quotes.
+        """
+        assert self.print_func is not None, 'print statements not being inserted'
 
-        for s in reversed(self.print_func.statements):
+        # new output by the index of the line it goes after, in the order it was printed
+        outputs: dict[int, list[tuple[PrintStatement, int]]] = {}
+        for s in self.print_func.statements:
             line_no, col = find_print_location(example, s.line_no)
-
             # switch from 1-indexed line number to 0-indexed indexes into lines
-            line_index = line_no - 1
-
-            if s.line_no != old_line_no:
-                remove_old_print(lines, line_index)
-            self._insert_print_args(lines, s, example.in_py_file(), line_index, col)
-            old_line_no = s.line_no
+            outputs.setdefault(line_no - 1, []).append((s, col))
 
-        return '\n'.join(lines) + '\n'
+        self._prefetch_reprs(s_col for statements in outputs.values() for s_col in statements)
 
-    def _insert_print_args(
-        self, lines: list[str], statement: PrintStatement, in_python: bool, line_index: int, col: int
-    ) -> None:
-        formatted_args = [self.print_callback(str(arg)) if self.print_callback else str(arg) for arg in statement.args]
-        single_line = statement.sep.join(formatted_args)
+        lines = example.source.splitlines()
+        in_python = example.in_py_file()
+        index = 0
+        for line_index in sorted(outputs):
+            yield from lines[index : line_index + 1]
+            for statement, col in outputs[line_index]:
+                yield from self._format_print_args(statement, in_python, col)
+            index = max(index, old_print_end(lines, line_index + 1))
+        yield from lines[index:]
+
+    def _format_print_args(self, statement: PrintStatement, in_python: bool, col: int) -> Iterator[str]:
         indent_str = ' ' * col
-        max_single_length = self.config.line_length - len(indent_str)
-        if '\n' not in single_line and len(single_line) + len(comment_prefix) < max_single_length:
-            lines.insert(line_index + 1, f'{indent_str}{comment_prefix}{single_line}')
-        else:
-            # if the statement is too long to go on one line, print each arg on its own line formatted with black
-            sep = f'{statement.sep}\n'
-            indent_config = dataclasses.replace(self.config, line_length=max_single_length)
-            output = sep.join(arg.format(indent_config).strip('\n') for arg in statement.args)
-            if self.print_callback:
-                output = self.print_callback(output)
-            # remove trailing whitespace
-            output = re.sub(r' +$', '', output, flags=re.MULTILINE)
-            # have to use triple single quotes in python since we're already in a double quotes docstring
-            quote = "'''" if in_python else '"""'
-            lines.insert(line_index + 1, indent(f'{quote}\n{output}\n{quote}', indent_str))
+        if statement.args:
+            formatted_args = [
+                self.print_callback(str(arg)) if self.print_callback else str(arg) for arg in statement.args
+            ]
+            single_line = statement.sep.join(formatted_args)
+            max_single_length = self.config.line_length - len(indent_str)
+            if '\n' not in single_line and len(single_line) + len(comment_prefix) < max_single_length:
+                yield f'{indent_str}{comment_prefix}{single_line}'
+            else:
+                # if the statement is too long to go on one line, print each arg on its own line formatted with black
+                sep = f'{statement.sep}\n'
+                indent_config = self._indent_config(max_single_length)
+                output = sep.join(arg.format(indent_config).strip('\n') for arg in statement.args)
+                if self.print_callback:
+                    output = self.print_callback(output)
+                # remove trailing whitespace
+                output = re.sub(r' +$', '', output, flags=re.MULTILINE)
+                # have to use triple single quotes in python since we're already in a double quotes docstring
+                quote = "'''" if in_python else '"""'
+                yield indent(f'{quote}\n{output}\n{quote}', indent_str)
+        if statement.omitted:
+            yield f'{indent_str}{comment_prefix}{omitted_marker(statement.omitted)}'
+
+    def _prefetch_reprs(self, statements: Iterable[tuple[PrintStatement, int]]) -> None:
+        """Let the formatter format the reprs of all the values printed on their own lines at once.
+
+        Whether a statement is printed on one line is decided ignoring `print_callback`, which mustn't be called
+        more than once per statement, so this may occasionally format a repr which isn't used.
+        """
+        if self.config.formatter == 'black':
+            # black formats in this process, so there's nothing to gain
+            return
+        reprs: dict[int, list[str]] = {}
+        for statement, col in statements:
+            max_single_length = self.config.line_length - col
+            single_line = statement.sep.join(map(str, statement.args))
+            if '\n' in single_line or len(single_line) + len(comment_prefix) >= max_single_length:
+                indent_config = self._indent_config(max_single_length)
+                reprs.setdefault(max_single_length, []).extend(
+                    arg.data
+                    for arg in statement.args
+                    if not arg.is_str and not _repr_cached(arg.data, indent_config) and _is_python(arg.data)
+                )
+        for line_length, data in reprs.items():
+            prefetch_black_format(data, self._indent_config(line_length))
+
+    def _indent_config(self, line_length: int) -> ExamplesConfig:
+        """The config with a shorter line length for formatting indented print output."""
+        try:
+            return self._indent_configs[line_length]
+        except KeyError:
+            config = self._indent_configs[line_length] = dataclasses.replace(self.config, line_length=line_length)
+            return config
+
+
+def _match_at(source: str, text: str, pos: int) -> int | None:
+    """Position in `source` after `text` if it's found at `pos`, otherwise `None`."""
+    return pos + len(text) if source.startswith(text, pos) else None
 
 
 comment_prefix = '#> '
@@ -266,27 +647,39 @@ comment_prefix_re = re.compile(f'^ *{re.escape(comment_prefix)}', re.MULTILINE)
 triple_quotes_prefix_re = re.compile('^ *(?:"{3}|\'{3})', re.MULTILINE)
 
 
-def remove_old_print(lines: list[str], line_index: int) -> None:
-    """Remove the old print statement."""
-    try:
-        next_line = lines[line_index + 1]
-    except IndexError:
-        # end of file
-        return
-
-    if triple_quotes_prefix_re.search(next_line):
-        for i in range(2, 10_000):
-            if triple_quotes_prefix_re.search(lines[line_index + i]):
-                del lines[line_index + 1 : line_index + i + 1]
-                return
-        raise ValueError('Could not find end of triple quotes')
-    else:
-        try:
-            while comment_prefix_re.search(lines[line_index + 1]):
-                del lines[line_index + 1]
-        except IndexError:
-            # end of file
-            pass
+def truncated_marker(omitted_bytes: int) -> str:
+    return f'...[{omitted_bytes} bytes truncated]'
+
+
+def omitted_marker(omitted: int) -> str:
+    return f'...[{omitted} more print{"" if omitted == 1 else "s"} omitted]'
+
+
+def old_print_end(lines: list[str], index: int) -> int:
+    """Find the end of the old print output starting at `lines[index]`.
+
+    This skips the `#>` comments after the print, and triple quoted blocks which start directly after the print or
+    after another triple quoted block, since a print called several times may have several blocks of output,
+    followed by a `#> ...[N more prints omitted]` marker. A triple quoted string after a `#>` comment is left alone,
+    since it's code rather than output.
+
+    Return: the index of the first line after the output
+    """
+    triple_quotes_allowed = True
+    while index < len(lines):
+        if triple_quotes_allowed and triple_quotes_prefix_re.match(lines[index]):
+            for end in range(index + 1, len(lines)):
+                if triple_quotes_prefix_re.match(lines[end]):
+                    index = end + 1
+                    break
+            else:
+                raise ValueError('Could not find end of triple quotes')
+        elif comment_prefix_re.match(lines[index]):
+            index += 1
+            triple_quotes_allowed = False
+        else:
+            break
+    return index
 
 
 def find_print_location(example: CodeExample, line_no: int) -> tuple[int, int]:
@@ -298,54 +691,28 @@ def find_print_location(example: CodeExample, line_no: int) -> tuple[int, int]:
 
     Return: tuple if `(line, column)` of the print statement
     """
-    m = ast.parse(example.source, filename=example.path.name)
-    return find_print(m, line_no) or (line_no, 0)
-
-
-# ast nodes that have a body
-with_body = (
-    ast.Module,
-    ast.FunctionDef,
-    ast.If,
-    ast.Try,
-    ast.ExceptHandler,
-    ast.With,
-    ast.For,
-    ast.AsyncFor,
-    ast.AsyncFunctionDef,
-    ast.AsyncWith,
-    ast.While,
-    ast.ClassDef,
-)
-
-
-def find_print(node: Any, line: int) -> tuple[int, int] | None:
-    if isinstance(node, with_body):
-        found_loc = find_print_in_body(node.body, line)
-        if found_loc is not None:
-            return found_loc
-        if isinstance(node, ast.If):
-            found_loc = find_print_in_body(node.orelse, line)
-            if found_loc is not None:
-                return found_loc
-        elif isinstance(node, ast.Try):
-            for node in node.handlers:
-                found_loc = find_print(node, line)
-                if found_loc is not None:
-                    return found_loc
-    elif isinstance(node, ast.Expr):
-        return find_print(node.value, line)
-    elif isinstance(node, ast.Call):
-        if isinstance(node.func, ast.Name) and node.func.id == 'print' and node.lineno == line:
-            return expr_last_line(node), node.col_offset
-        return find_print(node.func, line)
-
-
-def find_print_in_body(body: list[ast.stmt], line: int) -> tuple[int, int] | None:
-    for node in body:
-        found_loc = find_print(node, line)
-        if found_loc is not None:
-            return found_loc
+    return print_locations(example.source).get(line_no) or (line_no, 0)
+
+
+@lru_cache(maxsize=1024)
+def print_locations(source: str) -> dict[int, tuple[int, int]]:
+    """Index the `print()` calls in source code.
+
+    Every statement which is just a `print()` call is included, in any body, e.g. `match` cases, `finally` and `else`
+    blocks or nested functions.
+
+    Return: dict mapping the line each print starts on to the `(line, column)` its output goes after,
+        where there are several prints on a line, the first is used.
+    """
+    locations: dict[int, tuple[int, int]] = {}
+    for node in ast.walk(parse_source(source)):
+        if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            call = node.value
+            if isinstance(call.func, ast.Name) and call.func.id == 'print':
+                current = locations.get(call.lineno)
+                if current is None or call.col_offset < current[1]:
+                    locations[call.lineno] = expr_last_line(call), call.col_offset
+    return locations
 
 
 def expr_last_line(c: ast.expr) -> int:
@@ -0,0 +1,50 @@
+from __future__ import annotations as _annotations
+
+from .async_runner import AsyncRunner, LoopFactory
+from .checkpoint import CheckpointStore
+from .lazy_globals import LazyGlobalsCache
+from .lint import FormatPrefetch, RuffResults, ruff_bin
+from .ruff_server import RuffServerPool
+from .subinterpreters import InterpreterPool
+from .typecheck import MypyDaemon
+
+__all__ = ('ExamplesSession',)
+
+
+class ExamplesSession:
+    """Resources shared between all examples run in one pytest session.
+
+    An instance is provided by the session scoped `_examples_session` fixture, and closed when the session ends.
+    """
+
+    def __init__(self, *, max_checkpoints: int = 16, ruff_servers: int = 0, lint_prefetch: int = 0) -> None:
+        self._async_runners: dict[LoopFactory | None, AsyncRunner] = {}
+        self.checkpoints = CheckpointStore(max_checkpoints)
+        self.lazy_globals = LazyGlobalsCache()
+        self.interpreters = InterpreterPool()
+        self.ruff_servers = RuffServerPool(ruff_bin(), ruff_servers) if ruff_servers else None
+        """If not None, long-lived `ruff server` processes used to lint and fix examples."""
+        self.ruff = RuffResults(self.ruff_servers, lint_prefetch)
+        self.format_prefetch = FormatPrefetch()
+        """Lets the ruff formatter format every collected example in one process."""
+        self.mypy = MypyDaemon()
+        """Type checks examples, the daemon is only started when the first example is checked."""
+
+    def async_runner(self, loop_factory: LoopFactory | None = None) -> AsyncRunner:
+        """Get the event loop runner for `loop_factory`, creating it on first use."""
+        runner = self._async_runners.get(loop_factory)
+        if runner is None:
+            runner = self._async_runners[loop_factory] = AsyncRunner(loop_factory)
+        return runner
+
+    def close(self) -> None:
+        runners = list(self._async_runners.values())
+        self._async_runners.clear()
+        for runner in runners:
+            runner.close()
+        self.checkpoints.close()
+        self.interpreters.close()
+        self.ruff.close()
+        self.mypy.close()
+        if self.ruff_servers is not None:
+            self.ruff_servers.close()
@@ -0,0 +1,169 @@
+from __future__ import annotations as _annotations
+
+import ast
+import marshal
+import os
+import pickle
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+from pathlib import Path
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
+
+from _pytest.assertion.rewrite import rewrite_asserts
+
+from . import interpreter_worker
+from .document import BlockResult
+from .run_code import Arg, PrintStatement
+from .traceback import format_example_exception
+
+try:
+    from concurrent import interpreters
+except ImportError:
+    # Python < 3.14
+    interpreters = None
+
+if TYPE_CHECKING:
+    from _pytest.config import Config
+
+    from .find_examples import CodeExample
+
+__all__ = 'InterpreterPool', 'encode_chain', 'decode_results'
+
+
+class InterpreterPool:
+    """Sub-interpreters reused to run chains of examples, each with its own module state and GIL.
+
+    This gives isolation close to running each chain in a subprocess at a fraction of the startup cost.
+    Interpreters are created as needed, up to one per chain running at once, and kept until the pool is closed.
+    """
+
+    def __init__(self) -> None:
+        self._idle: queue.SimpleQueue[_Worker] = queue.SimpleQueue()
+        self._workers: list[_Worker] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supported() -> bool:
+        return interpreters is not None
+
+    def run_chains(self, payloads: list[bytes], max_workers: int | None = None) -> list[bytes]:
+        """Run each payload from `encode_chain` in a sub-interpreter, concurrently where possible.
+
+        Args:
+            payloads: Chains encoded with `encode_chain`.
+            max_workers: Maximum number of chains to run at once, defaults to the number of CPUs.
+
+        Returns:
+            The encoded results for each chain, to be decoded with `decode_results`.
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers, thread_name_prefix='pytest-examples-interpreter') as executor:
+            return list(executor.map(self._run, payloads))
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._idle = queue.SimpleQueue()
+        for worker in workers:
+            worker.close()
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def _run(self, payload: bytes) -> bytes:
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            worker = _Worker()
+            with self._lock:
+                self._workers.append(worker)
+        try:
+            return worker.run(payload)
+        finally:
+            self._idle.put(worker)
+
+
+class _Worker:
+    def __init__(self) -> None:
+        subinterpreters = _interpreters()
+        self.interpreter = subinterpreters.create()
+        self.results = subinterpreters.create_queue()
+        self.interpreter.prepare_main(results=self.results)
+        self.interpreter.exec(_worker_source())
+
+    def run(self, payload: bytes) -> bytes:
+        self.interpreter.prepare_main(payload=payload)
+        self.interpreter.exec('results.put(run_chain(payload))')
+        return self.results.get()
+
+    def close(self) -> None:
+        self.interpreter.close()
+
+
+def _interpreters() -> ModuleType:
+    """Get the `concurrent.interpreters` module, which is only available from Python 3.14."""
+    if interpreters is None:
+        raise RuntimeError('sub-interpreters require Python 3.14')
+    return interpreters
+
+
+@cache
+def _worker_source() -> str:
+    return Path(interpreter_worker.__file__).read_text()
+
+
+def encode_chain(
+    chain: list[CodeExample],
+    module_globals: dict[str, Any] | None,
+    *,
+    capture_prints: bool,
+    pytest_config: Config | None,
+    async_mode: bool,
+) -> bytes:
+    """Compile a chain of examples and encode it with everything needed to run it in a sub-interpreter.
+
+    Args:
+        chain: The examples to run in order in one namespace.
+        module_globals: Globals to add to the namespace, they must be picklable.
+        capture_prints: If True, record print statements instead of printing.
+        pytest_config: If not None, used to rewrite assertions using pytest's assertion rewriting.
+        async_mode: If True, allow top-level `await` and run each example in an event loop.
+    """
+    blocks = [_compile_block(example, pytest_config, async_mode) for example in chain]
+    return pickle.dumps((blocks, module_globals or {}, capture_prints))
+
+
+def _compile_block(
+    example: CodeExample, pytest_config: Config | None, async_mode: bool
+) -> tuple[str, int, bytes | None, bool, str | None]:
+    filename = str(example.path)
+    try:
+        tree = ast.parse(example.source, filename=filename)
+    except SyntaxError as exc:
+        return filename, example.start_line, None, async_mode, format_example_exception(exc, example)
+
+    if pytest_config is not None:
+        rewrite_asserts(tree, example.source.encode(), filename, pytest_config)
+    # compile with the example's location in its file, so tracebacks show the right lines
+    ast.increment_lineno(tree, example.start_line)
+    flags = ast.PyCF_ALLOW_TOP_LEVEL_AWAIT if async_mode else 0
+    code = compile(tree, filename, 'exec', flags=flags, dont_inherit=True)
+    return filename, example.start_line, marshal.dumps(code), async_mode, None
+
+
+def decode_results(data: bytes) -> list[BlockResult]:
+    """Decode the results of a chain run by `InterpreterPool.run_chains`."""
+    results: list[BlockResult] = []
+    for statements, error, skipped, globals_summary in pickle.loads(data):
+        if statements is not None:
+            statements = [
+                PrintStatement(line_no, sep, [Arg.from_data(*arg) for arg in args]) for line_no, sep, args in statements
+            ]
+        results.append(
+            BlockResult(statements=statements, error=error, skipped=skipped, globals_summary=globals_summary)
+        )
+    return results
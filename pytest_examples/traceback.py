@@ -4,6 +4,8 @@ import sys
 from types import CodeType, FrameType, TracebackType
 from typing import TYPE_CHECKING
 
+from .interpreter_worker import format_exception
+
 if TYPE_CHECKING:
     from .find_examples import CodeExample
 
@@ -30,6 +32,15 @@ def create_example_traceback(exc: Exception, module_path: str, example: CodeExam
     return new_tb
 
 
+def format_example_exception(exc: BaseException, example: CodeExample) -> str:
+    """Format an exception raised by `example`, as `traceback.format_exception` would but only showing its frames.
+
+    `traceback.format_exception` can't be used directly since it fails to find column positions for the
+    frames created by `create_example_traceback`, so column markers are omitted.
+    """
+    return format_exception(exc, str(example.path))
+
+
 def create_custom_frame(frame: FrameType, example: CodeExample) -> FrameType:
     """Create a new frame that mostly matches `frame` but with filename and line number faked.
 
@@ -0,0 +1,172 @@
+from __future__ import annotations as _annotations
+
+import hashlib
+import importlib.util
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from textwrap import indent
+from typing import TYPE_CHECKING
+
+from .find_examples import parse_source
+
+if TYPE_CHECKING:
+    from .find_examples import CodeExample
+
+__all__ = 'MypyDaemon', 'MypyDiagnostic', 'mypy_message'
+
+_MYPY_ARGS = '--show-column-numbers', '--show-error-codes', '--no-error-summary', '--hide-error-context', '--no-pretty'
+
+
+@dataclass(frozen=True)
+class MypyDiagnostic:
+    """An error or note from mypy, located in the file the example came from."""
+
+    path: Path
+    line: int
+    """Line number in the file, starting from 1."""
+    column: int
+    """Column in the file, starting from 1, including the example's indent."""
+    severity: str
+    """`'error'` or `'note'`."""
+    message: str
+    code: str | None = None
+    """The error code, e.g. `'assignment'`, `None` for notes."""
+
+    def __str__(self) -> str:
+        """In the format of mypy's output."""
+        code = f'  [{self.code}]' if self.code else ''
+        return f'{self.path}:{self.line}:{self.column}: {self.severity}: {self.message}{code}'
+
+
+def mypy_message(diagnostics: Sequence[MypyDiagnostic]) -> str:
+    """Build an error message like mypy's output, with a summary of the errors."""
+    lines = [str(d) for d in diagnostics]
+    count = sum(d.severity == 'error' for d in diagnostics)
+    lines.append(f'Found {count} error{"" if count == 1 else "s"}.')
+    output = '\n'.join(lines)
+    return f'mypy failed:\n{indent(output, "  ")}'
+
+
+class MypyDaemon:
+    """Type check examples with a `dmypy` daemon kept running for the test session.
+
+    Every known example is written to a module in a package in a temporary directory and the package is checked
+    in one pass, so the library the examples use is only analysed once. Files are only rewritten when an example
+    changes, so later checks are incremental and only re-analyse changed examples and the modules depending on them.
+
+    mypy is an optional dependency, it's only needed when examples are type checked.
+    """
+
+    def __init__(self) -> None:
+        self._dir: Path | None = None
+        self._package: Path | None = None
+        self._files: dict[tuple[str, int], Path] = {}
+        self._known: dict[tuple[str, int], CodeExample] = {}
+        self._results: dict[tuple[str, int, str], list[MypyDiagnostic]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, examples: Sequence[CodeExample]) -> None:
+        with self._lock:
+            for example in examples:
+                self._known.setdefault((str(example.path), example.start_line), example)
+
+    def check(self, example: CodeExample) -> list[MypyDiagnostic]:
+        """Get the problems mypy finds in `example`, an empty list if it passed."""
+        try:
+            parse_source(example.source)
+        except SyntaxError as exc:
+            return [_syntax_diagnostic(example, exc)]
+
+        key = _example_key(example)
+        with self._lock:
+            try:
+                return self._results[key]
+            except KeyError:
+                pass
+            self._known[str(example.path), example.start_line] = example
+            examples = self._write_package()
+            diagnostics_by_file = self._run()
+            for file, e in examples.items():
+                self._results[_example_key(e)] = [
+                    _map_diagnostic(e, *d) for d in diagnostics_by_file.get(file.name, ())
+                ]
+            return self._results[key]
+
+    def close(self) -> None:
+        if self._dir is not None:
+            subprocess.run(self._dmypy_args('stop'), capture_output=True, timeout=30)
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = self._package = None
+
+    def _write_package(self) -> dict[Path, CodeExample]:
+        """Write each known example which parses to its own module, returning the examples by file."""
+        if self._dir is None:
+            if importlib.util.find_spec('mypy') is None:
+                raise ImportError('mypy is required to type check examples, install it with `pip install mypy`')
+            self._dir = Path(tempfile.mkdtemp(prefix='pytest-examples-mypy-'))
+            # a unique name, so it can't clash with a package of the same name on the project's mypy path
+            name = hashlib.md5(str(self._dir).encode()).hexdigest()[:12]
+            self._package = self._dir / f'_pytest_examples_{name}'
+            self._package.mkdir()
+            (self._package / '__init__.py').touch()
+        assert self._package is not None
+        examples: dict[Path, CodeExample] = {}
+        for file_key, example in self._known.items():
+            file = self._files.get(file_key)
+            if file is None:
+                file = self._files[file_key] = self._package / f'example_{len(self._files)}.py'
+            try:
+                parse_source(example.source)
+            except SyntaxError:
+                # mypy stops at syntax errors, so examples which don't parse are left out
+                file.unlink(missing_ok=True)
+                continue
+            # unchanged files are left alone, so dmypy doesn't check them again
+            if not file.exists() or file.read_text() != example.source:
+                file.write_text(example.source)
+            examples[file] = example
+        return examples
+
+    def _run(self) -> dict[str, list[tuple[int, int, str, str, str | None]]]:
+        assert self._package is not None
+        args = self._dmypy_args('run', '--timeout', '3600', '--', *_MYPY_ARGS, str(self._package))
+        p = subprocess.run(args, capture_output=True, text=True, timeout=600)
+        if p.returncode not in (0, 1):
+            raise RuntimeError(f'Error running dmypy, return code {p.returncode}:\n{p.stderr or p.stdout}')
+        diagnostics: dict[str, list[tuple[int, int, str, str, str | None]]] = {}
+        for m in re.finditer(r'^(.+?):(\d+):(\d+): (error|note): (.*?)(?:  \[([\w-]+)\])?$', p.stdout, flags=re.M):
+            file, row, column, severity, message, code = m.groups()
+            diagnostics.setdefault(Path(file).name, []).append((int(row), int(column), severity, message, code))
+        return diagnostics
+
+    def _dmypy_args(self, *args: str) -> tuple[str, ...]:
+        assert self._dir is not None
+        return sys.executable, '-m', 'mypy.dmypy', '--status-file', str(self._dir / 'dmypy.json'), *args
+
+
+def _map_diagnostic(
+    example: CodeExample, row: int, column: int, severity: str, message: str, code: str | None
+) -> MypyDiagnostic:
+    return MypyDiagnostic(
+        path=example.path,
+        line=row + example.start_line,
+        column=column + example.indent,
+        severity=severity,
+        message=message,
+        code=code,
+    )
+
+
+def _syntax_diagnostic(example: CodeExample, exc: SyntaxError) -> MypyDiagnostic:
+    return _map_diagnostic(example, exc.lineno or 1, exc.offset or 1, 'error', exc.msg, 'syntax')
+
+
+def _example_key(example: CodeExample) -> tuple[str, int, str]:
+    return str(example.path), example.start_line, example.source
@@ -0,0 +1,132 @@
+from __future__ import annotations as _annotations
+
+import asyncio
+import selectors
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .config import ExamplesConfig
+    from .find_examples import CodeExample
+
+__all__ = 'VirtualClock', 'virtual_time', 'VirtualTimeEventLoop', 'uses_virtual_time'
+
+
+class VirtualClock:
+    """A clock which only moves forward when something sleeps, and then does so instantly.
+
+    It starts at the real time, so timestamps look plausible, then advances by exactly the duration of each sleep.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._monotonic = time.monotonic()
+        self._perf_counter = time.perf_counter()
+        self._wall = time.time()
+        self.elapsed = 0.0
+        """Seconds the clock has been advanced by."""
+
+    def advance(self, seconds: float) -> None:
+        if seconds > 0:
+            with self._lock:
+                self.elapsed += seconds
+
+    def sleep(self, seconds: float) -> None:
+        if seconds < 0:
+            raise ValueError('sleep length must be non-negative')
+        self.advance(seconds)
+
+    def monotonic(self) -> float:
+        return self._monotonic + self.elapsed
+
+    def monotonic_ns(self) -> int:
+        return int(self.monotonic() * 1e9)
+
+    def perf_counter(self) -> float:
+        return self._perf_counter + self.elapsed
+
+    def perf_counter_ns(self) -> int:
+        return int(self.perf_counter() * 1e9)
+
+    def time(self) -> float:
+        return self._wall + self.elapsed
+
+    def time_ns(self) -> int:
+        return int(self.time() * 1e9)
+
+
+_patched_functions = 'sleep', 'monotonic', 'monotonic_ns', 'perf_counter', 'perf_counter_ns', 'time', 'time_ns'
+_active_clock: VirtualClock | None = None
+
+
+@contextmanager
+def virtual_time() -> Iterator[VirtualClock]:
+    """Replace functions in the `time` module with a `VirtualClock` while the context is active.
+
+    This applies to the whole process, including other threads. Event loops created inside the context,
+    e.g. by `asyncio.run()`, are `VirtualTimeEventLoop`s so their timers fire without waiting.
+    `datetime.now()` and similar functions implemented in C aren't affected.
+    """
+    global _active_clock
+
+    if _active_clock is not None:
+        raise RuntimeError('virtual time is already active')
+    clock = _active_clock = VirtualClock()
+    originals = {name: getattr(time, name) for name in _patched_functions}
+    for name in _patched_functions:
+        setattr(time, name, getattr(clock, name))
+    with _virtual_event_loops():
+        try:
+            yield clock
+        finally:
+            for name, func in originals.items():
+                setattr(time, name, func)
+            _active_clock = None
+
+
+class _VirtualTimeSelector(selectors.DefaultSelector):
+    def select(self, timeout: float | None = None) -> list[tuple[selectors.SelectorKey, int]]:
+        clock = _active_clock
+        if clock is None or timeout is None or timeout <= 0:
+            # waiting for I/O or another thread with no timer due, or not waiting at all
+            return super().select(timeout)
+        events = super().select(0)
+        if not events:
+            # nothing else can happen before the next timer, so jump straight to it
+            clock.advance(timeout)
+        return events
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """Event loop which, while `virtual_time` is active, advances the virtual clock instead of waiting for timers.
+
+    Outside `virtual_time` it behaves like a normal selector event loop.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(_VirtualTimeSelector())
+
+
+@contextmanager
+def _virtual_event_loops() -> Iterator[None]:
+    # `asyncio.run()` and `asyncio.Runner` look up `new_event_loop` in `asyncio.events` when they're called
+    original = asyncio.events.new_event_loop
+    asyncio.events.new_event_loop = asyncio.new_event_loop = VirtualTimeEventLoop
+    try:
+        yield
+    finally:
+        asyncio.events.new_event_loop = asyncio.new_event_loop = original
+
+
+def uses_virtual_time(example: CodeExample, config: ExamplesConfig) -> bool:
+    """Whether to run `example` with a virtual clock, from `config` overridden by the `virtual_time` prefix setting."""
+    setting = example.prefix_settings().get('virtual_time')
+    if setting is None:
+        return config.virtual_time
+    value = setting.lower()
+    if value not in ('true', 'false'):
+        raise ValueError(f'{example}: invalid value for virtual_time {setting!r}, expected "true" or "false"')
+    return value == 'true'
@@ -0,0 +1,244 @@
+import asyncio
+
+import pytest
+
+from pytest_examples import CodeExample, EvalExample
+from pytest_examples.async_runner import AsyncRunner, LeftoverTasksWarning
+
+
+def test_top_level_await(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+# My file
+
+```py
+import asyncio
+
+await asyncio.sleep(0)
+print('first')
+#> first
+```
+
+```py
+import asyncio
+
+print(await asyncio.sleep(0, result=42))
+#> 42
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.async_mode = True
+    eval_example.run_print_check(example)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=2)
+
+
+def test_loop_shared_between_examples(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+import asyncio
+
+await asyncio.sleep(0)
+LOOPS.append(asyncio.get_running_loop())
+```
+
+```py
+import asyncio
+
+async def main():
+    LOOPS.append(asyncio.get_running_loop())
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+LOOPS = []
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.async_mode = True
+    eval_example.run(example, module_globals={'LOOPS': LOOPS}, call='main')
+
+def test_same_loop():
+    assert len(LOOPS) == 2
+    assert LOOPS[0] is LOOPS[1]
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=3)
+
+
+def test_assertion_rewriting(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+import asyncio
+
+x = await asyncio.sleep(0, result=1)
+assert x == 2
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.async_mode = True
+    eval_example.run(example)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(failed=1)
+    assert '>   assert x == 2' in result.outlines
+    assert 'E   assert 1 == 2' in result.outlines
+    assert 'my_file.md:5: AssertionError' in result.outlines
+
+
+def test_leftover_tasks(eval_example: EvalExample):
+    # language=Python
+    code = """\
+import asyncio
+
+async def forever():
+    await asyncio.sleep(3600)
+
+asyncio.create_task(forever(), name='forever-task')
+await asyncio.sleep(0)
+"""
+    eval_example.async_mode = True
+    with pytest.warns(LeftoverTasksWarning, match=r'1 task\(s\) were still running .+: forever-task'):
+        eval_example.run(CodeExample.create(code))
+
+
+def test_loop_factory(eval_example: EvalExample):
+    loops = []
+
+    def loop_factory():
+        loop = asyncio.new_event_loop()
+        loops.append(loop)
+        return loop
+
+    eval_example.async_mode = True
+    eval_example.loop_factory = loop_factory
+    code = 'import asyncio\n\nawait asyncio.sleep(0)\nloop = asyncio.get_running_loop()\n'
+    module_dict = eval_example.run(CodeExample.create(code))
+    assert loops == [module_dict['loop']]
+
+
+def test_asyncio_run_and_top_level_await(tmp_path, eval_example: EvalExample):
+    # language=Python
+    run_main = """\
+import asyncio
+
+async def main():
+    return await asyncio.sleep(0, result='from asyncio.run')
+
+print(asyncio.run(main()))
+#> from asyncio.run
+"""
+    # language=Python
+    top_level = """\
+import asyncio
+
+print(await asyncio.sleep(0, result='from top-level await'))
+#> from top-level await
+"""
+    eval_example.async_mode = True
+    for n, code in enumerate([run_main, top_level, run_main]):
+        eval_example.run_print_check(CodeExample.create(code, path=tmp_path / f'example_{n}.md'))
+
+
+def test_runner_close():
+    runner = AsyncRunner()
+
+    async def get_loop():
+        return asyncio.get_running_loop()
+
+    loop = runner.run(get_loop(), label='example')
+    assert runner.run(get_loop(), label='example') is loop
+    runner.close()
+    assert loop.is_closed()
+
+
+def test_arun_print_check(tmp_path, eval_example: EvalExample):
+    # language=Python
+    code = """
+import asyncio
+
+await asyncio.sleep(0.01)
+print(await asyncio.sleep(0, result='done'))
+#> done
+"""
+    example = CodeExample.create(code, path=tmp_path / 'my_file.md')
+    module_dict = asyncio.run(eval_example.arun_print_check(example))
+    assert module_dict == {'asyncio': asyncio}
+
+
+def make_concurrent_example(tmp_path, n: int) -> CodeExample:
+    # language=Python
+    code = f"""
+import asyncio
+
+state['running'] += 1
+state['max_running'] = max(state['max_running'], state['running'])
+for i in range(3):
+    await asyncio.sleep(0.001 * ({n} % 4))
+    print('example {n}', i)
+    #> example {n} 0
+    #> example {n} 1
+    #> example {n} 2
+state['running'] -= 1
+"""
+    return CodeExample.create(code, path=tmp_path / f'example_{n}.md')
+
+
+def test_arun_many(tmp_path, eval_example: EvalExample):
+    examples = [make_concurrent_example(tmp_path, n) for n in range(50)]
+    state = {'running': 0, 'max_running': 0}
+    results = asyncio.run(eval_example.arun_many(examples, concurrency=8, module_globals={'state': state}))
+    assert all(r.passed for r in results)
+    assert state == {'running': 0, 'max_running': 8}
+
+
+def test_arun_many_failures(tmp_path, eval_example: EvalExample):
+    examples = [
+        CodeExample.create('print(1)\n#> 2\n', path=tmp_path / 'a.md'),
+        CodeExample.create('import asyncio\n\nawait asyncio.sleep(0)\n1 / 0\n', path=tmp_path / 'b.md'),
+        CodeExample.create(
+            'import asyncio\n\nawait asyncio.sleep(1)\n', path=tmp_path / 'c.md', prefix='py timeout="0.05"'
+        ),
+        CodeExample.create('print(3)\n#> 3\n', path=tmp_path / 'd.md'),
+    ]
+    results = asyncio.run(eval_example.arun_many(examples, raise_errors=False))
+    assert [r.passed for r in results] == [False, False, False, True]
+    assert results[0].error.startswith('Print output changed code:\n')
+    assert results[1].error.endswith('ZeroDivisionError: division by zero')
+    assert results[2].error == f'{examples[2]}: example exceeded its wall-clock timeout of 0.05s'
@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import pytest
+
+from pytest_examples import CodeExample
+from pytest_examples.checkpoint import CheckpointStore
+from pytest_examples.config import ExamplesConfig
+from pytest_examples.limits import Limits, enforce_limits
+
+pytestmark = pytest.mark.skipif(not CheckpointStore.supported(), reason='checkpoints require os.fork')
+
+
+@pytest.fixture
+def store():
+    store = CheckpointStore(max_checkpoints=4)
+    yield store
+    store.close()
+
+
+def make_run_block(log_file: Path):
+    def run_block(example, module, run_state):
+        with log_file.open('a') as f:
+            f.write(f'{example.source}\n')
+        exec(example.source, module.__dict__)
+        return [module.__dict__.get('result')]
+
+    return run_block
+
+
+def wait_dead(pid: int) -> bool:
+    for _ in range(200):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_resume(tmp_path: Path, store: CheckpointStore):
+    log_file = tmp_path / 'log.txt'
+    run_block = make_run_block(log_file)
+    b1 = CodeExample.create('a = 1')
+    b2 = CodeExample.create('b = a + 1')
+    b3 = CodeExample.create('result = a + b')
+
+    results = store.run_chain([b1, b2], run_block, context='', module_globals=None)
+    assert [r.statements for r in results] == [[None], [None]]
+    assert log_file.read_text() == 'a = 1\nb = a + 1\n'
+    assert len(store) == 2
+
+    log_file.write_text('')
+    results = store.run_chain([b1, b2, b3], run_block, context='', module_globals=None)
+    assert [r.from_checkpoint for r in results] == [True, True, False]
+    assert results[2].statements == [3]
+    assert log_file.read_text() == 'result = a + b\n'
+    assert len(store) == 3
+
+    # change the second block, only the first can be reused
+    log_file.write_text('')
+    b2_changed = CodeExample.create('b = a + 10')
+    results = store.run_chain([b1, b2_changed, b3], run_block, context='', module_globals=None)
+    assert [r.from_checkpoint for r in results] == [True, False, False]
+    assert results[2].statements == [12]
+    assert log_file.read_text() == 'b = a + 10\nresult = a + b\n'
+
+    # different context, nothing is reused
+    log_file.write_text('')
+    store.run_chain([b1], run_block, context='other', module_globals={'a': 0})
+    assert log_file.read_text() == 'a = 1\n'
+
+
+def test_rerun_last_block(tmp_path: Path, store: CheckpointStore):
+    log_file = tmp_path / 'log.txt'
+    run_block = make_run_block(log_file)
+    chain = [CodeExample.create('x = 2'), CodeExample.create('result = x * 2')]
+    store.run_chain(chain, run_block, context='', module_globals=None)
+    log_file.write_text('')
+
+    # all blocks have a checkpoint, the last is run again to capture its output
+    results = store.run_chain(chain, run_block, context='', module_globals=None)
+    assert [r.from_checkpoint for r in results] == [True, False]
+    assert results[1].statements == [4]
+    assert log_file.read_text() == 'result = x * 2\n'
+
+
+def test_run_state(tmp_path: Path, store: CheckpointStore):
+    def run_block(example, module, log_file: Path):
+        with log_file.open('a') as f:
+            f.write(f'{example.source}\n')
+        exec(example.source, module.__dict__)
+
+    chain = [CodeExample.create('x = 2'), CodeExample.create('y = x * 2')]
+    store.run_chain(chain, run_block, context='', module_globals=None, run_state=tmp_path / 'first.txt')
+    assert (tmp_path / 'first.txt').read_text() == 'x = 2\ny = x * 2\n'
+
+    # the resumed checkpoint was parked by the first run, but uses the state of this one
+    results = store.run_chain(chain, run_block, context='', module_globals=None, run_state=tmp_path / 'second.txt')
+    assert [r.from_checkpoint for r in results] == [True, False]
+    assert (tmp_path / 'second.txt').read_text() == 'y = x * 2\n'
+    assert (tmp_path / 'first.txt').read_text() == 'x = 2\ny = x * 2\n'
+
+
+def test_error(tmp_path: Path, store: CheckpointStore):
+    run_block = make_run_block(tmp_path / 'log.txt')
+    chain = [CodeExample.create('x = 1'), CodeExample.create('1 / 0'), CodeExample.create('y = 2')]
+    results = store.run_chain(chain, run_block, context='', module_globals=None)
+    assert results[0].statements == [None]
+    assert 'ZeroDivisionError: division by zero' in results[1].error
+    assert results[2].skipped
+    assert len(store) == 1
+
+
+def test_eviction(tmp_path: Path):
+    store = CheckpointStore(max_checkpoints=2)
+    run_block = make_run_block(tmp_path / 'log.txt')
+    chain = [CodeExample.create(f'x{i} = {i}') for i in range(4)]
+    store.run_chain(chain[:2], run_block, context='', module_globals=None)
+    first_pids = [cp.pid for cp in store._checkpoints.values()]
+    store.run_chain(chain, run_block, context='', module_globals=None)
+    assert len(store) == 2
+    assert all(wait_dead(pid) for pid in first_pids)
+
+    remaining_pids = [cp.pid for cp in store._checkpoints.values()]
+    store.close()
+    assert len(store) == 0
+    assert all(wait_dead(pid) for pid in remaining_pids)
+
+
+def test_run_group_checkpoints(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        tutorial="""
+```py
+import pathlib
+
+with pathlib.Path('setup.log').open('a') as f:
+    f.write('expensive setup\\n')
+data = [1, 2, 3]
+```
+
+```py
+total = sum(data)
+print(total)
+#> 6
+```
+
+```py
+print(total * 2)
+#> 12
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+import pytest
+
+examples = list(find_examples('tutorial.md'))
+
+@pytest.mark.parametrize('n', range(1, len(examples) + 1))
+def test_tutorial(n: int, eval_example: EvalExample):
+    eval_example.run_group(examples[:n], mode='check', checkpoints=True)
+    # blocks resumed from a checkpoint parked by an earlier test still write their files to this test's tmp_path
+    assert (eval_example.tmp_path / f'{examples[n - 1].module_name}.py').exists()
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=3)
+    assert (pytester.path / 'setup.log').read_text() == 'expensive setup\n'
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='rlimits are only supported on Linux')
+def test_rlimits(store: CheckpointStore):
+    config = ExamplesConfig()
+    b1 = CodeExample.create('a = 1', prefix='py cpu_limit="1"')
+    # summing in C never gives the signal handler a chance to run, so only the kernel can stop the process
+    b2 = CodeExample.create('sum(range(10**12))', prefix='py cpu_limit="1"')
+
+    def run_block(example, module, run_state):
+        with enforce_limits(Limits.for_example(example, config), example):
+            exec(example.source, module.__dict__)
+
+    results = store.run_chain(
+        [b1, b2],
+        run_block,
+        context='',
+        module_globals=None,
+        limits=partial(Limits.for_example, config=config),
+    )
+    assert [r.error for r in results] == [None, 'testing.md:0-0: example exceeded its CPU time limit of 1s\n']
+
+
+def test_run_group_checkpoints_print_callback(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        tutorial="""
+```py
+import pathlib
+
+with pathlib.Path('setup.log').open('a') as f:
+    f.write('setup\\n')
+```
+
+```py
+print(pathlib.Path('setup.log').exists())
+#> True
+```
+        """,
+    )
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+examples = list(find_examples('tutorial.md'))
+
+def test_first(eval_example: EvalExample):
+    eval_example.run_group(examples, mode='check', checkpoints=True)
+
+def test_callback(eval_example: EvalExample):
+    eval_example.print_callback = lambda s: s
+    eval_example.run_group(examples, mode='check', checkpoints=True)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty')
+    result.assert_outcomes(passed=2)
+    # the print callback is part of the context, so the first test's checkpoints aren't reused
+    assert (pytester.path / 'setup.log').read_text() == 'setup\nsetup\n'
+
+
+def test_run_group_checkpoints_module_globals(pytester: pytest.Pytester):
+    pytester.makepyfile(
+        """
+import threading
+from pytest_examples import CodeExample, EvalExample
+
+setup = CodeExample.create('y = x\\n')
+
+def test_one(eval_example: EvalExample):
+    examples = [setup, CodeExample.create('print(y)\\n#> 1\\n')]
+    eval_example.run_group(examples, mode='check', module_globals={'x': 1}, checkpoints=True)
+
+def test_two(eval_example: EvalExample):
+    examples = [setup, CodeExample.create('print(y)\\n#> 2\\n')]
+    eval_example.run_group(examples, mode='check', module_globals={'x': 2}, checkpoints=True)
+
+def test_unpicklable(eval_example: EvalExample):
+    # values which can't be pickled can't be keyed, so checkpoints aren't used
+    examples = [setup, CodeExample.create('assert y is x\\n')]
+    eval_example.run_group(examples, module_globals={'x': threading.Lock()}, checkpoints=True)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty')
+    # the values of module_globals are part of the context, so the first test's checkpoints aren't reused
+    result.assert_outcomes(passed=3)
@@ -0,0 +1,80 @@
+import pytest
+
+from pytest_examples import cli
+from pytest_examples.cli import main
+
+# language=Markdown
+markdown = """
+# Docs
+
+```py
+import os
+x = [1,2]
+print(x)
+#> [1, 2]
+```
+
+```py
+print('hello')
+#> goodbye
+```
+"""
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_lint(tmp_path, capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch, workers: str):
+    prefetched: list[int] = []
+    monkeypatch.setattr(cli, 'prefetch_format', lambda examples, config: prefetched.append(len(examples)))
+    md_file = tmp_path / 'docs.md'
+    md_file.write_text(markdown)
+    assert main(['lint', str(md_file), f'--workers={workers}']) == 1
+    # formatting is only prefetched when it's checked in this process, worker processes don't share the cache
+    assert prefetched == ([2] if workers == '1' else [])
+    out = capsys.readouterr().out
+    assert out.startswith(f'{md_file}:4-9:\n  ruff failed:\n')
+    assert f'\n    {md_file}:5:8: F401 [*] `os` imported but unused\n' in out
+    assert '\n  black failed:\n' in out
+    assert '-x = [1,2]\n' in out
+    assert out.endswith('1 of 2 example(s) failed\n')
+    assert md_file.read_text() == markdown
+
+
+def test_format(tmp_path, capsys: pytest.CaptureFixture[str]):
+    md_file = tmp_path / 'docs.md'
+    md_file.write_text(markdown)
+    assert main(['format', str(md_file), '--workers=2']) == 0
+    assert md_file.read_text() == markdown.replace('import os\nx = [1,2]\n', 'x = [1, 2]\n')
+    assert capsys.readouterr().out.endswith(
+        'examples to update in 1 file(s)...\n' f'  {md_file} 1 examples updated\n2 example(s) passed\n'
+    )
+
+    assert main(['lint', str(md_file)]) == 0
+
+
+@pytest.mark.parametrize('command', ['lint', 'format'])
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_invalid_syntax(tmp_path, capsys: pytest.CaptureFixture[str], command: str, workers: str):
+    md_file = tmp_path / 'docs.md'
+    # language=Markdown
+    content = '```py\nx = (1,\n```\n\n```py\nprint(1)\n```\n'
+    md_file.write_text(content)
+    assert main([command, str(md_file), f'--workers={workers}']) == 1
+    out = capsys.readouterr().out
+    assert f'{md_file}:1-3:\n' in out
+    # ruff reports the syntax error before formatting in `format`, the formatter reports it in `lint`
+    assert ('Cannot parse: ' if command == 'lint' else 'SyntaxError: ') in out
+    assert out.endswith('1 of 2 example(s) failed\n')
+    assert md_file.read_text() == content
+
+
+def test_check_prints(tmp_path, capsys: pytest.CaptureFixture[str]):
+    md_file = tmp_path / 'docs.md'
+    md_file.write_text(markdown)
+    assert main(['check-prints', str(md_file)]) == 1
+    out = capsys.readouterr().out
+    assert f'{md_file}:11-14:\n  Print output changed code:\n' in out
+    assert f'{md_file}:4-9' not in out
+
+    assert main(['check-prints', '--update', str(md_file)]) == 0
+    assert md_file.read_text() == markdown.replace('#> goodbye', '#> hello')
+    assert main(['check-prints', str(tmp_path)]) == 0
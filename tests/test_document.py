@@ -0,0 +1,437 @@
+import os
+import threading
+from types import ModuleType
+
+import pytest
+from _pytest.outcomes import Failed
+
+from pytest_examples import CodeExample
+from pytest_examples.document import block_names, run_block_result, run_chains, split_chains
+
+
+def test_block_names():
+    # language=Python
+    code = """\
+import os.path
+from typing import Any as A
+
+x = y + 1
+z += 1
+
+def foo(a):
+    return bar(a)
+
+class Foo:
+    pass
+"""
+    assert block_names(code) == (
+        {'os', 'A', 'x', 'z', 'foo', 'Foo'},
+        {'y', 'z', 'bar', 'a'},
+        {'bar', 'a'},
+    )
+
+
+def test_block_names_patterns():
+    # language=Python
+    code = """\
+match value:
+    case (a, *rest):
+        pass
+    case {'k': b, **others}:
+        pass
+    case [c] | [_, c] if c:
+        pass
+    case str() as d:
+        pass
+
+try:
+    pass
+except ValueError as e:
+    pass
+"""
+    assert block_names(code) == (
+        {'a', 'rest', 'b', 'others', 'c', 'd', 'e'},
+        {'value', 'c', 'str', 'ValueError'},
+        set(),
+    )
+
+
+def test_split_chains_match():
+    examples = [
+        CodeExample.create('match (1, 2):\n    case (a, b):\n        pass', start_line=1),
+        CodeExample.create('print(a)', start_line=2),
+    ]
+    assert split_chains(examples) == [examples]
+
+
+@pytest.mark.parametrize('code', ['from os import *', 'globals()["x"] = 1', 'exec("x = 1")'])
+def test_block_names_dynamic(code: str):
+    assert block_names(code) is None
+
+
+def test_split_chains():
+    examples = [
+        CodeExample.create('x = 1', start_line=1),
+        CodeExample.create('y = 2', start_line=2),
+        CodeExample.create('print(x)', start_line=3),
+        CodeExample.create('y = 3', start_line=4),
+        CodeExample.create('print(y)', start_line=5),
+        CodeExample.create('print("independent")', start_line=6),
+    ]
+    chains = split_chains(examples)
+    assert [[ex.start_line for ex in chain] for chain in chains] == [[1, 3], [2], [4, 5], [6]]
+
+
+def test_split_chains_late_binding():
+    examples = [
+        CodeExample.create("def greet():\n    return fmt('hi')", start_line=1),
+        CodeExample.create('print("independent")', start_line=2),
+        CodeExample.create('def fmt(s):\n    return s', start_line=3),
+        CodeExample.create('print(greet())', start_line=4),
+    ]
+    chains = split_chains(examples)
+    assert [[ex.start_line for ex in chain] for chain in chains] == [[1, 3, 4], [2]]
+
+
+def test_split_chains_rebound_global():
+    examples = [
+        CodeExample.create('x = 1', start_line=1),
+        CodeExample.create('def g():\n    return x', start_line=2),
+        CodeExample.create('x = 2', start_line=3),
+        CodeExample.create('print(g())', start_line=4),
+        CodeExample.create('x = 3', start_line=5),
+        CodeExample.create('print("independent")', start_line=6),
+    ]
+    chains = split_chains(examples)
+    # `g` looks `x` up when it's called, so any later block binding `x` must run in the same namespace first
+    assert [[ex.start_line for ex in chain] for chain in chains] == [[1, 2, 3, 4, 5], [6]]
+
+
+def test_split_chains_syntax_error():
+    examples = [
+        CodeExample.create('x = 1', start_line=1),
+        CodeExample.create('x = (', start_line=2),
+        CodeExample.create('print(x)', start_line=3),
+    ]
+    chains = split_chains(examples)
+    assert [[ex.start_line for ex in chain] for chain in chains] == [[1, 3], [2]]
+
+
+def test_split_chains_dynamic():
+    examples = [CodeExample.create('x = 1'), CodeExample.create('from os import *'), CodeExample.create('y = 1')]
+    assert split_chains(examples) == [examples]
+
+
+def test_run_chains_workers():
+    examples = [CodeExample.create('a = 1'), CodeExample.create('b = 2'), CodeExample.create('print(a)')]
+
+    def run_block(example, module):
+        exec(example.source, module.__dict__)
+        return [os.getpid()]
+
+    chains = split_chains(examples)
+    results = run_chains(chains, run_block, max_workers=2)
+    pids = [r.statements[0] for r in results]
+    assert pids[0] == pids[1] != pids[2]
+    assert os.getpid() not in pids
+
+    results = run_chains(chains, run_block, max_workers=1)
+    assert [r.statements for r in results] == [[os.getpid()]] * 3
+
+
+def test_run_chains_document_order():
+    examples = [
+        CodeExample.create('x = 1', start_line=1),
+        CodeExample.create('len = None', start_line=2),
+        CodeExample.create('y = x / 0', start_line=3),
+        CodeExample.create('print(y)', start_line=4),
+        CodeExample.create('z = len', start_line=5),
+    ]
+    order: list[int] = []
+
+    def run_block(example, module):
+        order.append(example.start_line)
+        exec(example.source, module.__dict__)
+
+    chains = split_chains(examples)
+    assert [[ex.start_line for ex in chain] for chain in chains] == [[1, 3, 4], [2, 5]]
+    # in one namespace the blocks run in document order, the chains still skip blocks after a failure
+    results = run_chains(chains, run_block, max_workers=1)
+    assert order == [1, 2, 3, 5]
+    assert [(r.error is not None, r.skipped) for r in results] == [
+        (False, False),
+        (True, False),
+        (False, True),
+        (False, False),
+        (False, False),
+    ]
+
+
+def test_run_block_result_failed_without_message():
+    def run_block(example, module):
+        raise Failed(None, pytrace=False)
+
+    # a failure without a message is still reported as an error
+    assert run_block_result(CodeExample.create('x = 1'), ModuleType('__main__'), run_block).error == (
+        '<Failed instance>\n'
+    )
+
+
+def test_run_chains_threads_running():
+    examples = [CodeExample.create('a = 1'), CodeExample.create('b = 2')]
+
+    def run_block(example, module):
+        exec(example.source, module.__dict__)
+        return [os.getpid()]
+
+    # forking while another thread is running isn't safe, so the chains are run in this process
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        results = run_chains(split_chains(examples), run_block, max_workers=2)
+    finally:
+        stop.set()
+        thread.join()
+    assert [r.statements for r in results] == [[os.getpid()]] * 2
+
+
+def test_run_group_check(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+# Tutorial
+
+```py
+import dataclasses
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: int
+```
+
+```py
+origin = Point(0, 0)
+```
+
+```py
+print('independent')
+#> independent
+```
+
+```py
+print(origin)
+#> Point(x=0, y=0)
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='check', max_workers=2)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_run_group_late_binding(pytester: pytest.Pytester, max_workers: int):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+def greet():
+    return fmt('hi')
+```
+
+```py
+def fmt(s):
+    return s
+```
+
+```py
+print(greet())
+#> hi
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        f"""
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='check', max_workers={max_workers})
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_run_group_rebound_global(pytester: pytest.Pytester, max_workers: int):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+x = 1
+```
+
+```py
+def g():
+    return x
+```
+
+```py
+x = 2
+```
+
+```py
+print(g())
+#> 2
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        f"""
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='check', max_workers={max_workers})
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=1)
+
+
+def test_run_group_failure(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+x = 1
+```
+
+```py
+y = x / 0
+```
+
+```py
+print(y)
+```
+
+```py
+print('wrong')
+#> right
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='check')
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(failed=1)
+    output = '\n'.join(result.outlines)
+    assert (
+        'my_file.md:5-7:\n'
+        '  Traceback (most recent call last):\n'
+        '    File "my_file.md", line 6, in <module>\n'
+        '      y = x / 0\n'
+        '  ZeroDivisionError: division by zero\n'
+    ) in output
+    assert 'my_file.md:13-16:\n  Print output changed code:\n' in output
+    assert 'my_file.md:9-12' not in output
+
+
+def test_run_group_syntax_error(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+x = (
+```
+
+```py
+print('still run')
+#> still run
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='check', max_workers=2)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(failed=1)
+    output = '\n'.join(result.outlines)
+    assert 'my_file.md:1-3:\n' in output
+    assert 'SyntaxError' in output
+    assert 'my_file.md:5-8' not in output
+
+
+def test_run_group_update(pytester: pytest.Pytester):
+    md_file = pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+names = ['a', 'b']
+```
+
+```py
+for name in names:
+    print(name)
+```""",
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='update')
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '--update-examples', '--update-examples-disable-summary')
+    result.assert_outcomes(passed=1)
+    assert md_file.read_text() == (
+        """\
+```py
+names = ['a', 'b']
+```
+
+```py
+for name in names:
+    print(name)
+    #> a
+    #> b
+```"""
+    )
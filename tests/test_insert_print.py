@@ -1,12 +1,23 @@
 from __future__ import annotations as _annotations
 
 import sys
+import time
 
 import pytest
 from _pytest.outcomes import Failed
 
-from pytest_examples import CodeExample
-from pytest_examples.run_code import find_print_location
+from pytest_examples import CodeExample, EvalExample, lint
+from pytest_examples.config import ExamplesConfig
+from pytest_examples.run_code import Arg, _repr_cached, find_print_location, run_code
+
+
+@pytest.fixture
+def update_eval_example(eval_example: EvalExample, pytestconfig: pytest.Config, monkeypatch: pytest.MonkeyPatch):
+    """An `EvalExample` in `--update-examples` mode, which doesn't write the updated examples to files."""
+    monkeypatch.setattr(pytestconfig.option, 'update_examples', True)
+    yield eval_example
+    eval_example.to_update.clear()
+
 
 # separate list to hopefully make it easier to read
 print_last_lines = [
@@ -133,6 +144,51 @@ async with foobar():
         (4, 4),
         id='async-function',
     ),
+    pytest.param(
+        """\
+match x:
+    case 1:
+        pass
+    case _:
+        print(
+            1
+        )
+""",
+        5,
+        (7, 8),
+        id='match',
+    ),
+    pytest.param(
+        """\
+try:
+    pass
+finally:
+    print(1)
+""",
+        4,
+        (4, 4),
+        id='try-finally',
+    ),
+    pytest.param(
+        """\
+for x in y:
+    pass
+else:
+    with foo():
+        print(1)
+""",
+        5,
+        (5, 8),
+        id='for-else-with',
+    ),
+    pytest.param(
+        """\
+x = 1; print(2); print(3)
+""",
+        1,
+        (1, 7),
+        id='same-line',
+    ),
 ]
 
 
@@ -351,6 +407,10 @@ for i in range(3):
         """print('foobar ')\n#> foobar \n""",
         id='trailing-spaces',
     ),
+    pytest.param(
+        '''print("hi")\n#> hi\n"""\nnot output\n"""\nx = 1\n''',
+        id='string-after-comment-output',
+    ),
 ]
 
 
@@ -476,3 +536,212 @@ other.does_print()
     other_file.write_text(('\n' * 30) + other_code)
 
     eval_example.run_print_check(example, call='main')
+
+
+def test_many_prints(tmp_path):
+    python_code = """
+for i in range(100_000):
+    print(i, 'x')
+"""
+    python_file = tmp_path / 'test.py'
+    python_file.write_text(python_code)
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    start = time.perf_counter()
+    insert_print, _ = run_code(
+        example=example,
+        python_file=python_file,
+        loader=None,
+        config=ExamplesConfig(),
+        enable_print_mock=True,
+        print_callback=None,
+        include_print=None,
+        module_globals=None,
+        call=None,
+    )
+    # this takes well under a second, the bound is loose so it only fails if recording a print gets much slower,
+    # e.g. walking the whole stack for each call as `inspect.stack()` does
+    assert time.perf_counter() - start < 30
+    statements = insert_print.print_statements()
+    assert len(statements) == 100_000
+    assert str(statements[-1]) == '99999 x'
+    assert statements[-1].line_no == 3
+
+
+def test_print_limits(tmp_path, eval_example):
+    # language=Python
+    python_code = """
+for i in range(1000):
+    print(i)
+    #> 0
+    #> 1
+    #> 2
+    #> ...[997 more prints omitted]
+print('x' * 100)
+#> xxxxxxxxxx...[90 bytes truncated]
+print('multi', 'byte', 'é' * 10)
+#> multi byte ééééé...[10 bytes truncated]
+for i in range(10):
+    print('y' * 5)
+    #> yyyyy
+    #> ...[9 more prints omitted]
+print('never')
+#> ...[1 more print omitted]
+"""
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    eval_example.set_config(print_max_per_line=3, print_max_arg_bytes=10, print_max_bytes=85)
+    eval_example.run_print_check(example)
+
+
+def test_print_limits_update(tmp_path, update_eval_example: EvalExample):
+    # language=Python
+    python_code = """
+for i in range(5):
+    print(['a' * 40, i])
+    #> old
+print('done')
+"""
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    update_eval_example.set_config(line_length=30, print_max_per_line=2)
+    update_eval_example.run_print_update(example)
+    # language=Python
+    assert (
+        example.source
+        == """
+for i in range(5):
+    print(['a' * 40, i])
+    \"\"\"
+    [
+        'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+        0,
+    ]
+    \"\"\"
+    \"\"\"
+    [
+        'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+        1,
+    ]
+    \"\"\"
+    #> ...[3 more prints omitted]
+print('done')
+#> done
+"""
+    )
+    # updating again is stable, the old output and the marker are all replaced
+    update_eval_example.run_print_check(example)
+
+
+def test_print_limits_bounded(tmp_path):
+    python_code = """
+for i in range(100_000):
+    print(i, 'x')
+"""
+    python_file = tmp_path / 'test.py'
+    python_file.write_text(python_code)
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    insert_print, _ = run_code(
+        example=example,
+        python_file=python_file,
+        loader=None,
+        config=ExamplesConfig(print_max_per_line=10),
+        enable_print_mock=True,
+        print_callback=None,
+        include_print=None,
+        module_globals=None,
+        call=None,
+    )
+    statements = insert_print.print_statements()
+    assert [str(s) for s in statements] == [f'{i} x' for i in range(10)]
+    assert statements[-1].omitted == 99_990
+
+
+def test_interleaved_prints(tmp_path, update_eval_example: EvalExample):
+    # language=Python
+    python_code = """
+for i in range(2):
+    print('a', i)
+    #> old
+    print('b', i)
+    \"\"\"
+    old
+    \"\"\"
+    #> old
+"""
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    update_eval_example.run_print_update(example)
+    # language=Python
+    assert example.source == (
+        """
+for i in range(2):
+    print('a', i)
+    #> a 0
+    #> a 1
+    print('b', i)
+    #> b 0
+    #> b 1
+"""
+    )
+
+
+def test_many_print_lines(tmp_path, update_eval_example: EvalExample):
+    python_code = ''.join(f'print({i})\n#> {i}\n' for i in range(5000))
+    update_eval_example.run_print_check(CodeExample.create(python_code, path=tmp_path / 'test.md'))
+
+    example = CodeExample.create(python_code.replace('#> 4999', '#> 5000'), path=tmp_path / 'test.md')
+    update_eval_example.run_print_update(example)
+    assert example.source == python_code
+
+
+def test_update_string_after_output(tmp_path, update_eval_example: EvalExample):
+    python_code = 'print("hi")\n#> old\n"""\nnot output\n"""\nx = 1\n'
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    update_eval_example.run_print_update(example)
+    assert example.source == python_code.replace('#> old', '#> hi')
+
+
+def test_arg_format_cached():
+    class Model:
+        def __repr__(self):
+            return "Model(name='testing', values=[1, 2, 3], nested={'a': 1, 'b': 2})"
+
+    config = ExamplesConfig(line_length=40)
+    formatted = Arg(Model()).format(config)
+    assert formatted == (
+        """\
+Model(
+    name='testing',
+    values=[1, 2, 3],
+    nested={'a': 1, 'b': 2},
+)
+"""
+    )
+    assert _repr_cached(repr(Model()), config)
+    assert Arg(Model()).format(ExamplesConfig(line_length=40)) == formatted
+    # a different line length is formatted separately
+    assert Arg(Model()).format(ExamplesConfig(line_length=100)) == f'{Model()!r}\n'
+
+    assert Arg(object()).format(config) == '<object object at 0x0123456789ab>'
+
+
+def test_ruff_format_reprs_prefetched(tmp_path, update_eval_example: EvalExample, monkeypatch: pytest.MonkeyPatch):
+    processes: list[tuple[str, ...]] = []
+    popen = lint.Popen
+
+    def counting_popen(args, **kwargs):
+        processes.append(args)
+        return popen(args, **kwargs)
+
+    monkeypatch.setattr(lint, 'Popen', counting_popen)
+    update_eval_example.set_config(formatter='ruff', line_length=40)
+    python_code = ''.join(f"print({{'prefetched_key': {i}, 'other_key': [{i}, {i}, {i}]}})\n" for i in range(3))
+    example = CodeExample.create(python_code, path=tmp_path / 'test.md')
+    update_eval_example.run_print_update(example)
+    assert example.source.count("    'prefetched_key': ") == 3
+    # the reprs are all formatted by one ruff process
+    assert len(processes) == 1
+
+    # reprs which are already formatted aren't prefetched again, so no results are left behind
+    update_eval_example.run_print_update(CodeExample.create(python_code, path=tmp_path / 'test.md'))
+    assert len(processes) == 1
+    formatter = lint.FORMATTERS['ruff']
+    assert isinstance(formatter, lint.RuffFormatter)
+    assert not [source for _, source in formatter._results if 'prefetched_key' in source]
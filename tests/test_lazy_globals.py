@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+import pytest
+
+from pytest_examples import LazyGlobal
+from pytest_examples.lazy_globals import LazyGlobalsCache, apply_module_globals
+
+
+def make_factory(calls: list[str], name: str):
+    def factory():
+        calls.append(name)
+        return f'{name} value'
+
+    return factory
+
+
+def test_unused_not_built():
+    calls: list[str] = []
+    module_dict: dict = {}
+    apply_module_globals(
+        module_dict,
+        {'used': LazyGlobal(make_factory(calls, 'used')), 'unused': LazyGlobal(make_factory(calls, 'unused')), 'x': 1},
+    )
+    assert set(module_dict) == {'x', '__builtins__'}
+
+    # language=Python
+    code = """
+def get_used():
+    return used
+
+result = (get_used(), get_used(), len('abc'), x)
+"""
+    exec(code, module_dict)
+    assert module_dict['result'] == ('used value', 'used value', 3, 1)
+    assert calls == ['used']
+    assert module_dict['used'] == 'used value'
+    assert 'unused' not in module_dict
+
+
+def test_missing_name():
+    module_dict: dict = {}
+    apply_module_globals(module_dict, {'foo': LazyGlobal(lambda: 1)})
+    with pytest.raises(NameError, match="name 'bar' is not defined"):
+        exec('bar', module_dict)
+
+
+def test_cache_scopes():
+    calls: list[str] = []
+    cache = LazyGlobalsCache()
+    example = LazyGlobal(make_factory(calls, 'example'))
+    group = LazyGlobal(make_factory(calls, 'group'), scope='group')
+    session = LazyGlobal(make_factory(calls, 'session'), scope='session')
+    group1, group2 = uuid4(), uuid4()
+
+    for g in group1, group1, group2:
+        for lazy in example, group, session:
+            cache.resolve(lazy, g)
+    assert calls == ['example', 'group', 'session', 'example', 'example', 'group']
+
+
+def test_cache_threads():
+    calls: list[str] = []
+    cache = LazyGlobalsCache()
+    barrier = threading.Barrier(8)
+
+    def factory():
+        calls.append('session')
+        time.sleep(0.01)
+        return object()
+
+    session = LazyGlobal(factory, scope='session')
+
+    def resolve(_: int):
+        barrier.wait()
+        return cache.resolve(session, None)
+
+    with ThreadPoolExecutor(8) as executor:
+        values = list(executor.map(resolve, range(8)))
+    assert calls == ['session']
+    assert all(value is values[0] for value in values)
+
+
+def test_eval_example(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+print(client.get('/'))
+#> GET /
+```
+
+```py
+print(client.calls)
+#> 1
+```
+
+```py
+print('no client needed')
+#> no client needed
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+import pathlib
+
+from pytest_examples import find_examples, CodeExample, EvalExample, LazyGlobal
+import pytest
+
+
+class Client:
+    def __init__(self):
+        with pathlib.Path('created.log').open('a') as f:
+            f.write('client\\n')
+        self.calls = 0
+
+    def get(self, url):
+        self.calls += 1
+        return f'GET {url}'
+
+
+client = LazyGlobal(Client, scope='group')
+
+
+@pytest.mark.parametrize('example', find_examples('my_file.md'), ids=str)
+def test_find_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.run_print_check(example, module_globals={'client': client})
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=3)
+    assert (pytester.path / 'created.log').read_text() == 'client\n'
@@ -0,0 +1,192 @@
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from pytest_examples import CodeExample
+from pytest_examples.limits import LimitExceeded, Limits, child_rlimits, describe_child_exit, enforce_limits, parse_size
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='rlimits are only supported on Linux')
+itimer_only = pytest.mark.skipif(not hasattr(signal, 'setitimer'), reason='signal.setitimer is not available')
+
+
+def test_timeout_prefix(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py timeout="0.2"
+import time
+
+while True:
+    try:
+        time.sleep(10)
+    except Exception:
+        pass
+```
+
+```py timeout="10"
+print('fine')
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.run(example)
+"""
+    )
+
+    start = time.perf_counter()
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    assert time.perf_counter() - start < 5
+    result.assert_outcomes(passed=1, failed=1)
+    assert 'my_file.md:1-9: example exceeded its wall-clock timeout of 0.2s' in result.outlines
+
+
+@linux_only
+def test_cpu_limit_config(pytester: pytest.Pytester):
+    pytester.makefile('.md', my_file='```py\nwhile True:\n    pass\n```')
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.set_config(cpu_limit=1)
+    eval_example.run(example)
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(failed=1)
+    assert 'my_file.md:1-4: example exceeded its CPU time limit of 1s' in result.outlines
+
+
+@linux_only
+def test_memory_limit(eval_example):
+    example = CodeExample.create('x = bytearray(500 * 1024 * 1024)\n', prefix='py memory_limit="50M"')
+    with pytest.raises(pytest.fail.Exception, match=r'^testing.md:0-1: example exceeded its memory limit of 50M$'):
+        eval_example.run(example)
+
+    # the limit is removed afterwards
+    eval_example.run(CodeExample.create('x = bytearray(100 * 1024 * 1024)\n'))
+
+
+def test_limits_for_example():
+    from pytest_examples.config import ExamplesConfig
+
+    config = ExamplesConfig(timeout=5, memory_limit=1024)
+    assert Limits.for_example(CodeExample.create(''), config) == Limits(timeout=5, memory=1024)
+    example = CodeExample.create('', prefix='py timeout="0.5" cpu_limit="2" memory_limit="1G"')
+    assert Limits.for_example(example, config) == Limits(timeout=0.5, cpu_time=2, memory=1024**3)
+    assert not Limits()
+
+
+@pytest.mark.parametrize(
+    'value,expected',
+    [('100', 100), ('1k', 1024), ('1.5M', 1536 * 1024), ('2G', 2 * 1024**3), ('2GiB', 2 * 1024**3), (10, 10)],
+)
+def test_parse_size(value, expected):
+    assert parse_size(value) == expected
+
+
+def test_parse_size_invalid():
+    with pytest.raises(ValueError, match='Invalid size'):
+        parse_size('lots')
+
+
+def test_watchdog_thread():
+    errors = []
+
+    def run():
+        try:
+            with enforce_limits(Limits(timeout=0.1), CodeExample.create('')):
+                while True:
+                    pass
+        except LimitExceeded as e:
+            errors.append(str(e))
+
+    t = threading.Thread(target=run)
+    t.start()
+    t.join(5)
+    assert not t.is_alive()
+    assert errors == ['testing.md:0-0: example exceeded its wall-clock timeout of 0.1s']
+
+
+@itimer_only
+def test_outer_timer_kept():
+    fired = []
+    old_handler = signal.signal(signal.SIGALRM, lambda signum, frame: fired.append(signum))
+    try:
+        signal.setitimer(signal.ITIMER_REAL, 0.5)
+        with enforce_limits(Limits(timeout=5), CodeExample.create('')):
+            time.sleep(0.1)
+        remaining, _ = signal.getitimer(signal.ITIMER_REAL)
+        assert 0.2 < remaining <= 0.4
+        time.sleep(0.5)
+        assert fired == [signal.SIGALRM]
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+@itimer_only
+def test_outer_timer_first():
+    class OuterTimeout(Exception):
+        pass
+
+    def on_alarm(signum, frame):
+        raise OuterTimeout()
+
+    old_handler = signal.signal(signal.SIGALRM, on_alarm)
+    try:
+        signal.setitimer(signal.ITIMER_REAL, 0.1)
+        with pytest.raises(OuterTimeout):
+            with enforce_limits(Limits(timeout=5), CodeExample.create('')):
+                time.sleep(2)
+        assert signal.getitimer(signal.ITIMER_REAL) == (0, 0)
+        assert signal.getsignal(signal.SIGALRM) is on_alarm
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+@linux_only
+def test_child_rlimits():
+    limits = Limits(cpu_time=1)
+    p = subprocess.run([sys.executable, '-c', 'while True: pass'], preexec_fn=child_rlimits(limits), timeout=10)
+    msg = describe_child_exit(p.returncode, limits, CodeExample.create(''))
+    assert msg == 'testing.md:0-0: example exceeded its CPU time limit of 1s'
+    assert describe_child_exit(0, limits, CodeExample.create('')) is None
+
+
+@linux_only
+def test_worker_rlimits():
+    from pytest_examples.config import ExamplesConfig
+    from pytest_examples.document import run_chains
+
+    config = ExamplesConfig()
+    # summing in C never gives the signal handler a chance to run, so only the kernel can stop this worker
+    stuck = CodeExample.create('sum(range(10**12))\n', prefix='py cpu_limit="1"')
+    fine = CodeExample.create('x = 1\n', prefix='py cpu_limit="1"')
+
+    def run_block(example, module):
+        with enforce_limits(Limits.for_example(example, config), example):
+            exec(example.source, module.__dict__)
+
+    def limits(example):
+        return Limits.for_example(example, config)
+
+    results = run_chains([[stuck], [fine]], run_block, max_workers=2, limits=limits)
+    assert [r.error for r in results] == ['testing.md:0-1: example exceeded its CPU time limit of 1s\n', None]
@@ -1,8 +1,26 @@
+import dataclasses
+import re
+from pathlib import Path
+
 import pytest
+from black.parsing import InvalidInput
 
-from pytest_examples import CodeExample
+from pytest_examples import CodeExample, lint
 from pytest_examples.config import ExamplesConfig
-from pytest_examples.lint import FormatError, black_check, ruff_check
+from pytest_examples.lint import (
+    FormatError,
+    FormatPrefetch,
+    RuffDiagnostic,
+    RuffError,
+    RuffResults,
+    black_check,
+    black_format,
+    prefetch_format,
+    ruff_check,
+    ruff_check_batch,
+    ruff_format,
+    ruff_message,
+)
 
 long_function = 'def this_is_a_very_long_function_name_to_cause_errors(the_argument): pass\n'
 
@@ -32,7 +50,239 @@ def test_ruff_offset():
         ruff_check(example, ExamplesConfig())
 
 
+def test_ruff_fix_diagnostics():
+    code = 'import os\nimport sys\n\nprint(x)\n'
+    example = CodeExample.create(code, start_line=10, indent=4)
+    with pytest.raises(RuffError) as exc_info:
+        ruff_format(example, ExamplesConfig())
+    # only the problem left after fixing, at its location in the unchanged example
+    assert exc_info.value.diagnostics == [
+        RuffDiagnostic(
+            path=Path('testing.md'), line=14, column=11, code='F821', message='Undefined name `x`', applicability=None
+        )
+    ]
+    assert str(exc_info.value) == 'ruff failed:\n  testing.md:14:11: F821 Undefined name `x`\n  Found 1 error.'
+
+    assert ruff_format(example, ExamplesConfig(), ignore_errors=True) == '\nprint(x)\n'
+
+
 def test_black_line_length():
     example = CodeExample.create(long_function, start_line=4)
     with pytest.raises(FormatError, match='^black failed:\n'):
         black_check(example, ExamplesConfig(line_length=40))
+
+
+def test_ruff_batch():
+    examples = [
+        CodeExample.create('import os\nimport sys\n\nprint(x)\n', start_line=10),
+        CodeExample.create(long_function),
+        CodeExample.create('x = (\n', path=Path('other.md')),
+    ]
+    errors = [ruff_message(d) if d else None for d in ruff_check_batch(examples, ExamplesConfig())]
+    assert errors[:2] == [
+        (
+            'ruff failed:\n'
+            '  testing.md:11:8: F401 [*] `os` imported but unused\n'
+            '  testing.md:12:8: F401 [*] `sys` imported but unused\n'
+            '  testing.md:14:7: F821 Undefined name `x`\n'
+            '  Found 3 errors.\n'
+            '  [*] 2 fixable with the `--fix` option.'
+        ),
+        None,
+    ]
+    assert re.fullmatch(r'ruff failed:\n  other.md:2:1: SyntaxError: .+\n  Found 1 error\.', errors[2])
+    # the same errors as linting each example on its own
+    with pytest.raises(RuffError) as exc_info:
+        ruff_check(examples[0], ExamplesConfig())
+    assert str(exc_info.value) == errors[0]
+
+
+@pytest.mark.parametrize('select', [['INP'], ['ALL']])
+def test_ruff_batch_path_rules(select: list[str]):
+    config = ExamplesConfig(ruff_select=select)
+    example = CodeExample.create('x = 1\n')
+    [diagnostics] = ruff_check_batch([example], config)
+    assert 'INP001' not in {d.code for d in diagnostics}
+    if diagnostics:
+        with pytest.raises(RuffError) as exc_info:
+            ruff_check(example, config)
+        assert exc_info.value.diagnostics == diagnostics
+    else:
+        assert ruff_check(example, config) == ''
+
+
+def test_ruff_results(monkeypatch: pytest.MonkeyPatch):
+    batches: list[int] = []
+
+    def check_batch(examples, config):
+        batches.append(len(examples))
+        return ruff_check_batch(examples, config)
+
+    monkeypatch.setattr(lint, 'ruff_check_batch', check_batch)
+    examples = [CodeExample.create(f'print({i})\n', start_line=i * 10) for i in range(5)]
+    results = RuffResults()
+    results.add(examples)
+    assert [results.check(e, ExamplesConfig()) for e in examples] == [[]] * 5
+    assert batches == [5]
+
+    # a different config lints everything again, and new or changed examples are linted when checked
+    assert [d.code for d in results.check(examples[0], ExamplesConfig(ruff_select=['T20']))] == ['T201']
+    examples[1].source = 'print(x)\n'
+    (diagnostic,) = results.check(examples[1], ExamplesConfig())
+    assert diagnostic.message == 'Undefined name `x`'
+    assert batches == [5, 5, 1]
+
+
+def test_ruff_collected_examples(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+print(1)
+```
+
+```py
+import os
+```
+
+```py
+print(2)
+```
+""",
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+import pytest
+
+from pytest_examples import find_examples, CodeExample, EvalExample, lint
+
+batches = []
+check_batch = lint.ruff_check_batch
+
+
+def counting_check_batch(examples, config):
+    batches.append(len(examples))
+    return check_batch(examples, config)
+
+
+lint.ruff_check_batch = counting_check_batch
+
+
+@pytest.mark.parametrize('example', find_examples('my_file.md'), ids=str)
+def test_lint(example: CodeExample, eval_example: EvalExample):
+    eval_example.lint_ruff(example)
+
+
+def test_batches():
+    assert batches == [3]
+"""
+    )
+    result = pytester.runpytest('-p', 'no:pretty')
+    result.assert_outcomes(passed=3, failed=1)
+    result.stdout.fnmatch_lines(['  my_file.md:6:8: F401 [[]*] `os` imported but unused'])
+
+    # with prefetching, examples are linted in small batches and the failure is still reported in its own test
+    result = pytester.runpytest('-p', 'no:pretty', '-v', '--examples-lint-prefetch=1', '-k', 'test_lint')
+    result.assert_outcomes(passed=2, failed=1)
+    result.stdout.fnmatch_lines(
+        ['*test_lint?my_file.md:5-7? FAILED*', '  my_file.md:6:8: F401 [[]*] `os` imported but unused']
+    )
+
+
+def test_config_frozen():
+    config = ExamplesConfig(quotes='single', ruff_select=['T20'])
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.line_length = 100  # type: ignore[misc]
+
+    same = ExamplesConfig(quotes='single', ruff_select=('T20',))
+    assert same == config and hash(same) == hash(config)
+    assert same.black_mode() is config.black_mode()
+    assert same.ruff_config() is config.ruff_config()
+
+    (config_arg,) = (a for a in config.ruff_config() if a.startswith('--config='))
+    config_file = Path(config_arg.removeprefix('--config='))
+    assert config_file.read_text() == "flake8-quotes = {inline-quotes = 'single', multiline-quotes = 'double'}"
+    # content-addressed, so configs which only differ in other settings share the file
+    assert f'--config={config_file}' in ExamplesConfig(quotes='single', timeout=5).ruff_config()
+    assert [p.name for p in config_file.parent.iterdir()] == ['ruff.toml']
+
+
+def test_formatters(monkeypatch: pytest.MonkeyPatch):
+    sources = [long_function, 'x = {"a":1}\nprint(x)\n#> {"a": 1}\n', 'y = [\n    1,\n]\n']
+    black = ExamplesConfig(line_length=40)
+    ruff = ExamplesConfig(line_length=40, formatter='ruff')
+    expected = [black_format(s, black) for s in sources]
+    assert [black_format(s, ruff) for s in sources] == expected
+
+    # after prefetching, formatting is a lookup
+    prefetch_format([CodeExample.create(s) for s in sources], ruff)
+    monkeypatch.setattr(lint, 'Popen', None)
+    assert [black_format(s, ruff) for s in sources] == expected
+    monkeypatch.undo()
+
+    for config in black, ruff:
+        with pytest.raises(InvalidInput, match='Cannot parse'):
+            black_format('x = (\n', config)
+    prefetch_format([CodeExample.create('x = (\n'), CodeExample.create('y = 1\n')], ruff)
+    with pytest.raises(InvalidInput, match='^Cannot parse: 2:1: '):
+        black_format('x = (\n', ruff)
+
+    with pytest.raises(FormatError, match='^ruff format failed:\n'):
+        black_check(CodeExample.create(long_function), ruff)
+
+
+def test_ruff_formatter_results_bounded(monkeypatch: pytest.MonkeyPatch):
+    config = ExamplesConfig(formatter='ruff')
+    formatter = lint.RuffFormatter()
+    monkeypatch.setattr(formatter, 'max_results', 2)
+    sources = [f'bounded_{i} = {i}\n' for i in range(3)]
+    formatter.prefetch(sources, config)
+    # results which are never used don't build up, the oldest are dropped
+    assert [source for _, source in formatter._results] == sources[1:]
+
+
+def test_format_prefetch(monkeypatch: pytest.MonkeyPatch):
+    config = ExamplesConfig(line_length=40, formatter='ruff')
+    examples = [CodeExample.create(f'prefetched_{i} = {{"a":{i}}}\n', start_line=i) for i in range(3)]
+    prefetch = FormatPrefetch()
+    prefetch.add(examples)
+    prefetch.prefetch(config)
+
+    # every example was formatted by the first prefetch, so checking them doesn't run ruff
+    monkeypatch.setattr(lint, 'Popen', None)
+    prefetch.prefetch(config)
+    for example in examples:
+        with pytest.raises(FormatError, match='^ruff format failed:\n'):
+            black_check(example, config)
+
+
+def test_ruff_results_prefetch(monkeypatch: pytest.MonkeyPatch):
+    batches: list[list[int]] = []
+
+    def check_batch(examples, config):
+        batches.append([e.start_line for e in examples])
+        if any(e.source == 'raise_error\n' for e in examples):
+            raise RuntimeError('ruff crashed')
+        return ruff_check_batch(examples, config)
+
+    monkeypatch.setattr(lint, 'ruff_check_batch', check_batch)
+    examples = [CodeExample.create(f'print({i})\n', start_line=i) for i in range(6)]
+    examples[2].source = 'print(x)\n'
+    examples[4].source = 'raise_error\n'
+    results = RuffResults(prefetch=2)
+    results.add(examples)
+    try:
+        assert [d.code for d in results.check(examples[0], ExamplesConfig())] == []
+        assert [d.code for d in results.check(examples[1], ExamplesConfig())] == []
+        assert [d.code for d in results.check(examples[2], ExamplesConfig())] == ['F821']
+        assert results.check(examples[3], ExamplesConfig()) == []
+        # the error from linting in the background is raised when the example it belongs to is checked
+        with pytest.raises(RuntimeError, match='ruff crashed'):
+            results.check(examples[4], ExamplesConfig())
+        assert results.check(examples[5], ExamplesConfig()) == []
+    finally:
+        results.close()
+    assert all(len(batch) <= 2 for batch in batches)
+    assert {line for batch in batches for line in batch} == set(range(6))
@@ -0,0 +1,178 @@
+import pytest
+
+from pytest_examples import CodeExample
+from pytest_examples.config import ExamplesConfig
+from pytest_examples.lint import (
+    FormatError,
+    RuffError,
+    ruff_bin,
+    ruff_check,
+    ruff_check_batch,
+    ruff_format,
+    ruff_message,
+)
+from pytest_examples.ruff_server import RuffServerPool, server_config_file
+
+
+@pytest.fixture
+def pool():
+    pool = RuffServerPool(ruff_bin())
+    yield pool
+    pool.close()
+
+
+def test_lint(pool: RuffServerPool):
+    config = ExamplesConfig(target_version='py311', upgrade=True)
+    examples = [
+        CodeExample.create('import os\nimport sys\n\nprint(x)\n', start_line=10),
+        CodeExample.create("from typing import Union\n\ns = 'é'; y: Union[int, str] = 1\n"),
+        CodeExample.create('x = 1\n'),
+    ]
+    expected = ruff_check_batch(examples, config)
+    assert [(d.line, d.column, d.code, d.applicability) for d in expected[1]] == [
+        (3, 8, 'E702', None),
+        (3, 13, 'UP007', 'safe'),
+    ]
+    for example, diagnostics in zip(examples, expected):
+        if not diagnostics:
+            assert ruff_check(example, config, server=pool) == ''
+        else:
+            with pytest.raises(RuffError) as exc_info:
+                ruff_check(example, config, server=pool)
+            assert exc_info.value.diagnostics == diagnostics
+    assert len(pool) == 1
+
+
+@pytest.mark.parametrize('select', [['INP'], ['ALL']])
+def test_lint_path_rules(pool: RuffServerPool, select: list[str]):
+    config = ExamplesConfig(ruff_select=select)
+    example = CodeExample.create('x = 1\n')
+    [expected] = ruff_check_batch([example], config)
+    if expected:
+        with pytest.raises(RuffError) as exc_info:
+            ruff_check(example, config, server=pool)
+        assert sorted(map(str, exc_info.value.diagnostics)) == sorted(map(str, expected))
+    else:
+        assert ruff_check(example, config, server=pool) == ''
+
+
+def test_fix(pool: RuffServerPool):
+    config = ExamplesConfig(isort=True, quotes='single')
+    example = CodeExample.create('import sys\nimport os\nimport json\n\nprint(os, "x")\n')
+    assert ruff_format(example, config, server=pool) == ruff_format(example, config)
+
+    example = CodeExample.create('import sys\n\nprint(missing)\n', start_line=5)
+    with pytest.raises(RuffError, match='ruff failed:\n  testing.md:8:7: F821 Undefined name `missing`\n') as exc_info:
+        ruff_format(example, config, server=pool)
+    with pytest.raises(RuffError) as cli_exc_info:
+        ruff_format(example, config)
+    assert exc_info.value.diagnostics == cli_exc_info.value.diagnostics
+    assert ruff_format(example, config, ignore_errors=True, server=pool) == '\nprint(missing)\n'
+
+
+def test_fix_applicability(pool: RuffServerPool):
+    config = ExamplesConfig()
+    example = CodeExample.create('import os\n\n\ndef f():\n    x = 1\n')
+    [expected] = ruff_check_batch([example], config)
+    assert [(d.code, d.applicability) for d in expected] == [('F401', 'safe'), ('F841', 'unsafe')]
+    with pytest.raises(RuffError) as exc_info:
+        ruff_check(example, config, server=pool)
+    assert exc_info.value.diagnostics == expected
+    assert str(exc_info.value) == ruff_message(expected)
+
+    # after fixing, the unsafe fix remains
+    with pytest.raises(RuffError) as exc_info:
+        ruff_format(example, config, server=pool)
+    with pytest.raises(RuffError) as cli_exc_info:
+        ruff_format(example, config)
+    assert exc_info.value.diagnostics == cli_exc_info.value.diagnostics
+    assert [d.applicability for d in exc_info.value.diagnostics] == ['unsafe']
+
+
+def test_restart(pool: RuffServerPool):
+    example = CodeExample.create('import os\n')
+    config = ExamplesConfig()
+    with pytest.raises(FormatError):
+        ruff_check(example, config, server=pool)
+    (server,) = pool._servers[config.ruff_config()]
+    server._process.kill()
+    server._process.wait()
+    with pytest.raises(FormatError, match='F401'):
+        ruff_check(example, config, server=pool)
+    assert len(pool) == 1
+    assert pool._servers[config.ruff_config()][0] is not server
+
+
+def test_server_config_file(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / 'pyproject.toml').write_text('[tool.ruff]\nline-length = 100\n')
+    (tmp_path / 'sub').mkdir()
+    monkeypatch.chdir(tmp_path / 'sub')
+    config_file = server_config_file(('--line-length=80', '--target-version=py39', '--extend-select=UP,I'))
+    assert config_file.read_text() == (
+        f'extend = "{tmp_path / "pyproject.toml"}"\n'
+        'line-length = 80\n'
+        'target-version = "py39"\n'
+        '\n'
+        '[lint]\n'
+        'extend-select = ["UP", "I"]\n'
+    )
+
+    config_file = server_config_file(('--config=/path/to/ruff.toml', '--ignore=E501'))
+    assert config_file.read_text() == 'extend = "/path/to/ruff.toml"\n\n[lint]\nignore = ["E501"]\n'
+
+    with pytest.raises(ValueError, match="Unsupported ruff argument for ruff server: '--fix'"):
+        server_config_file(('--fix',))
+
+
+def test_update_with_servers(pytester: pytest.Pytester):
+    md_file = pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+import sys
+import os
+
+print(os.name)
+```
+
+```py
+print(missing)
+```
+""",
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+import pytest
+from pytest_examples import find_examples, CodeExample, EvalExample
+
+
+@pytest.mark.parametrize('example', find_examples('my_file.md'), ids=str)
+def test_examples(example: CodeExample, eval_example: EvalExample):
+    if eval_example.update_examples:
+        eval_example.format_ruff(example)
+    else:
+        eval_example.lint_ruff(example)
+"""
+    )
+    result = pytester.runpytest(
+        '-p', 'no:pretty', '--examples-ruff-servers=2', '--update-examples', '--update-examples-disable-summary'
+    )
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(['  my_file.md:9:7: F821 Undefined name `missing`'])
+    assert md_file.read_text() == (
+        """\
+```py
+import os
+
+print(os.name)
+```
+
+```py
+print(missing)
+```"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '--examples-ruff-servers=1')
+    result.assert_outcomes(passed=1, failed=1)
@@ -186,7 +186,7 @@ import pytest
 
 @pytest.mark.parametrize('example', find_examples('.'), ids=str)
 def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
-    eval_example.config.white_space_dot = True
+    eval_example.set_config(white_space_dot=True)
     eval_example.lint_black(example)
 """
     )
@@ -367,3 +367,28 @@ def test_find_run_examples(example: CodeExample, eval_example: EvalExample):
 
     result = pytester.runpytest('-p', 'no:pretty', '-v')
     result.assert_outcomes(passed=1)
+
+
+def test_own_session_closed(pytester: pytest.Pytester):
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import CodeExample, EvalExample
+
+sessions = []
+
+
+def test_run(tmp_path, request):
+    eval_example = EvalExample(tmp_path=tmp_path, pytest_request=request)
+    eval_example.async_mode = True
+    eval_example.run(CodeExample.create('import asyncio\\nawait asyncio.sleep(0)\\n'))
+    sessions.append(eval_example._session)
+    assert sessions[0]._async_runners
+
+
+def test_closed():
+    assert sessions[0]._async_runners == {}
+"""
+    )
+    result = pytester.runpytest('-p', 'no:pretty')
+    result.assert_outcomes(passed=2)
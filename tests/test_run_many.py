@@ -0,0 +1,197 @@
+import pytest
+
+from pytest_examples import CodeExample, EvalExample
+
+# language=Markdown
+markdown = """
+```py
+x = 1
+print(x)
+#> 1
+```
+
+```py
+import os
+
+print('unused import')
+#> unused import
+```
+
+```py
+print('wrong')
+#> right
+```
+
+```py
+y = 1 / 0
+```
+
+```py
+print('after the failures')
+#> after the failures
+```
+"""
+
+
+def test_run_many_failures(pytester: pytest.Pytester):
+    pytester.makefile('.md', my_file=markdown)
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_docs(eval_example: EvalExample):
+    eval_example.run_many(list(find_examples('my_file.md')))
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(failed=1)
+    output = '\n'.join(result.outlines)
+    assert 'my_file.md:1-5:' not in output
+    assert 'my_file.md:7-12:\n  ruff failed:\n    my_file.md:8:8: F401 [*] `os` imported but unused\n' in output
+    assert 'my_file.md:14-17:\n  Print output changed code:\n' in output
+    assert (
+        'my_file.md:19-21:\n'
+        '  Traceback (most recent call last):\n'
+        '    File "my_file.md", line 20, in <module>\n'
+        '      y = 1 / 0\n'
+        '  ZeroDivisionError: division by zero\n'
+    ) in output
+    assert 'my_file.md:23-26' not in output
+
+
+def test_run_many_results(tmp_path, eval_example: EvalExample):
+    examples = [
+        CodeExample.create('a = 1\nprint(a)\n#> 1\n', path=tmp_path / 'my_file.md'),
+        CodeExample.create('print(2)\n#> 3\n', path=tmp_path / 'my_file.md', start_line=10),
+    ]
+    results = eval_example.run_many(examples, lint=False, raise_errors=False)
+    assert [r.passed for r in results] == [True, False]
+    assert results[0].module_dict == {'a': 1}
+    assert results[1].module_dict is None
+    assert results[1].error.startswith('Print output changed code:\n')
+    assert not any(r.updated for r in results)
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_run_many_update(pytester: pytest.Pytester, workers: str):
+    md_file = pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+print(  'hello')
+```
+
+```py
+print(1 + 2)
+#> 4
+```""",
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_docs(eval_example: EvalExample):
+    mode = 'update' if eval_example.update_examples else 'check'
+    results = eval_example.run_many(list(find_examples('my_file.md')), mode=mode)
+    assert [r.updated for r in results] == [eval_example.update_examples] * 2
+"""
+    )
+
+    result = pytester.runpytest(
+        '-p',
+        'no:pretty',
+        '--update-examples',
+        '--update-examples-disable-summary',
+        f'--update-examples-workers={workers}',
+    )
+    result.assert_outcomes(passed=1)
+    assert md_file.read_text() == (
+        """\
+```py
+print('hello')
+#> hello
+```
+
+```py
+print(1 + 2)
+#> 3
+```"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty')
+    result.assert_outcomes(passed=1)
+
+
+def test_run_many_update_workers(pytester: pytest.Pytester):
+    # language=Markdown
+    markdown = """
+```py
+import os
+print(missing)
+```
+
+```py
+x = [1,2,
+  3]
+print(x)
+```
+
+```py
+def f(a,b):
+    return {'a':a,  'b':b}
+print(f(1, 2))
+#> {'a': 1, 'b': 2}
+```
+"""
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_docs(eval_example: EvalExample):
+    eval_example.set_config(line_length=20, quotes='single')
+    eval_example.run_many(list(find_examples('my_file.md')), mode='update')
+"""
+    )
+    outputs: list[tuple[str, str]] = []
+    for workers in '1', '2':
+        md_file = pytester.makefile('.md', my_file=markdown)
+        result = pytester.runpytest(
+            '-p',
+            'no:pretty',
+            '--update-examples',
+            '--update-examples-disable-summary',
+            f'--update-examples-workers={workers}',
+        )
+        result.assert_outcomes(failed=1)
+        output = '\n'.join(result.outlines)
+        error = output[output.index('my_file.md:1-4:') : output.index('short test summary info')]
+        outputs.append((md_file.read_text(), error))
+
+    assert outputs[0] == outputs[1]
+    assert 'my_file.md:3:7: F821 Undefined name `missing`' in outputs[0][1]
+    assert "return {\n        'a': a,\n        'b': b,\n    }" in outputs[0][0]
+
+
+def test_run_many_update_workers_fork_safe(pytester: pytest.Pytester):
+    pytester.makefile('.md', my_file='```py\nx = 1\n```\n\n```py\ny = 2\n```\n')
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+from pytest_examples.config import fork_is_safe
+
+def test_docs(eval_example: EvalExample):
+    eval_example.run_many(list(find_examples('my_file.md')), mode='update')
+    # the formatting pool is shut down, so chains can still be run in forked workers
+    assert fork_is_safe()
+"""
+    )
+    result = pytester.runpytest(
+        '-p', 'no:pretty', '--update-examples', '--update-examples-disable-summary', '--update-examples-workers=2'
+    )
+    result.assert_outcomes(passed=1)
@@ -0,0 +1,142 @@
+import queue
+import types
+
+import pytest
+
+from pytest_examples import CodeExample, EvalExample, subinterpreters
+from pytest_examples.interpreter_worker import run_chain
+from pytest_examples.subinterpreters import InterpreterPool, decode_results, encode_chain
+
+
+def test_worker(tmp_path, request):
+    md_file = tmp_path / 'my_file.md'
+    md_file.write_text('\n' * 10 + 'x = 1\nprint(x, [1, 2], sep="-")\n\ny = x / 0\n')
+    chain = [
+        CodeExample.create('x = 1\nprint(x, [1, 2], sep="-")\n', path=md_file, start_line=10),
+        CodeExample.create('y = x / 0\n', path=md_file, start_line=13),
+        CodeExample.create('print(y)\n', path=md_file, start_line=20),
+    ]
+    payload = encode_chain(chain, {'z': 3}, capture_prints=True, pytest_config=request.config, async_mode=False)
+    results = decode_results(run_chain(payload))
+
+    (statement,) = results[0].statements
+    assert (statement.line_no, statement.sep, [str(arg) for arg in statement.args]) == (2, '-', ['1', '[1, 2]'])
+    assert results[0].globals_summary == {'z': '3', 'x': '1'}
+    assert results[1].error.startswith(
+        f'Traceback (most recent call last):\n  File "{md_file}", line 14, in <module>\n    y = x / 0\n'
+    )
+    assert results[1].error.endswith('ZeroDivisionError: division by zero\n')
+    assert results[2].skipped
+
+
+def test_worker_assertions_and_async(request):
+    # language=Python
+    code = """
+import asyncio
+
+await asyncio.sleep(0)
+a = [1, 2]
+assert a == [1, 3]
+"""
+    payload = encode_chain(
+        [CodeExample.create(code)], None, capture_prints=False, pytest_config=request.config, async_mode=True
+    )
+    (result,) = decode_results(run_chain(payload))
+    assert 'AssertionError: assert [1, 2] == [1, 3]' in result.error
+
+
+def test_worker_syntax_error():
+    payload = encode_chain(
+        [CodeExample.create('x = (\n')], None, capture_prints=False, pytest_config=None, async_mode=False
+    )
+    (result,) = decode_results(run_chain(payload))
+    assert 'SyntaxError' in result.error
+
+
+class FakeInterpreter:
+    """Runs code in a namespace in this interpreter, to test the pool on Python versions without sub-interpreters."""
+
+    def __init__(self):
+        self.namespace = {'__name__': '__main__'}
+        self.closed = False
+
+    def prepare_main(self, **kwargs):
+        self.namespace.update(kwargs)
+
+    def exec(self, code):
+        exec(code, self.namespace)
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool(monkeypatch: pytest.MonkeyPatch):
+    created: list[FakeInterpreter] = []
+
+    def create():
+        created.append(FakeInterpreter())
+        return created[-1]
+
+    fake = types.SimpleNamespace(create=create, create_queue=queue.SimpleQueue)
+    monkeypatch.setattr(subinterpreters, 'interpreters', fake)
+
+    pool = InterpreterPool()
+    assert pool.supported()
+    payloads = [
+        encode_chain(
+            [CodeExample.create(f'print({i})')], None, capture_prints=True, pytest_config=None, async_mode=False
+        )
+        for i in range(5)
+    ]
+    # one worker thread, since the fake interpreters share `builtins`
+    results = [decode_results(data) for data in pool.run_chains(payloads, max_workers=1)]
+    assert [str(r.statements[0]) for (r,) in results] == ['0', '1', '2', '3', '4']
+    assert len(pool) == 1
+
+    pool.close()
+    assert len(pool) == 0
+    assert created[0].closed
+
+
+def test_run_group_interpreters(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+data = {'a': 1}
+```
+
+```py
+print('independent')
+#> independent
+```
+
+```py
+print(data)
+#> {'a': 1}
+```
+        """,
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+from pytest_examples import find_examples, EvalExample
+
+def test_tutorial(eval_example: EvalExample):
+    eval_example.run_group(list(find_examples('my_file.md')), mode='check', workers='interpreters')
+"""
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=1)
+
+
+def test_interpreter_options(eval_example: EvalExample):
+    examples = [CodeExample.create('x = 1')]
+    with pytest.raises(TypeError, match='`module_globals` must be picklable'):
+        eval_example.run_group(examples, module_globals={'f': lambda: 1}, workers='interpreters')
+
+    eval_example.include_print = lambda p, f, a: True
+    with pytest.raises(ValueError, match='`include_print` is not supported'):
+        eval_example.run_group(examples, workers='interpreters')
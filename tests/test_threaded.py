@@ -0,0 +1,82 @@
+import builtins
+import threading
+from pathlib import Path
+
+import pytest
+from _pytest.outcomes import Failed
+
+from pytest_examples import CodeExample, EvalExample
+from pytest_examples.print_routing import route_print
+
+
+def make_example(tmp_path: Path, n: int, *, wrong: bool = False) -> CodeExample:
+    # language=Python
+    source = f"""\
+import time
+
+def work(i):
+    time.sleep(0)
+    return sum(range({n} * i))
+
+for i in range(3):
+    print('example {n}', i, work(i))
+    #> example {n} 0 0
+    #> example {n} 1 {sum(range(n))}
+    #> example {n} 2 {sum(range(n * 2)) + wrong}
+print({{'n': {n}}})
+#> {{'n': {n}}}
+"""
+    return CodeExample.create(source, path=tmp_path / f'example_{n}.md')
+
+
+def test_stress(tmp_path: Path, eval_example: EvalExample):
+    examples = [make_example(tmp_path, n) for n in range(300)]
+    eval_example.run_threaded(examples, mode='check', max_workers=16)
+    assert builtins.print.__module__ == 'builtins'
+
+
+def test_failures(tmp_path: Path, eval_example: EvalExample):
+    examples = [make_example(tmp_path, n, wrong=n in (3, 7)) for n in range(50)]
+    examples.append(CodeExample.create('1 / 0', path=tmp_path / 'error.md'))
+    with pytest.raises(Failed) as exc_info:
+        eval_example.run_threaded(examples, mode='check', max_workers=8)
+
+    message = exc_info.value.msg
+    assert message.count('Print output changed code:') == 2
+    for n in 3, 7, 50:
+        assert f'{examples[n]}:\n' in message
+    assert 'ZeroDivisionError: division by zero' in message
+
+
+def test_same_path_and_lines(tmp_path: Path, eval_example: EvalExample):
+    examples = [CodeExample.create(f'print({n})\n#> {n}\n', path=tmp_path / 'same.md') for n in range(40)]
+    assert len({example.module_name for example in examples}) == 1
+    eval_example.run_threaded(examples, mode='check', max_workers=8)
+
+
+def test_run_mode(tmp_path: Path, eval_example: EvalExample):
+    examples = [CodeExample.create(f'print({n} * 2)\n', path=tmp_path / f'example_{n}.md') for n in range(20)]
+    eval_example.run_threaded(examples, mode='run')
+    assert all(example.source == f'print({n} * 2)\n' for n, example in enumerate(examples))
+
+
+def test_route_print_context_local(capsys):
+    captured: dict[str, list[tuple]] = {'a': [], 'b': []}
+    entered = threading.Barrier(2)
+
+    def worker(name: str) -> None:
+        with route_print(lambda frame, args, kwargs: captured[name].append(args), context_local=True):
+            entered.wait()
+            for i in range(100):
+                print(name, i)
+            entered.wait()
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in captured]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert captured == {name: [(name, i) for i in range(100)] for name in captured}
+    print('not captured')
+    assert capsys.readouterr().out == 'not captured\n'
@@ -0,0 +1,93 @@
+import pytest
+
+from pytest_examples import CodeExample
+from pytest_examples.typecheck import MypyDaemon, mypy_message
+
+pytest.importorskip('mypy')
+
+
+@pytest.fixture
+def daemon():
+    daemon = MypyDaemon()
+    yield daemon
+    daemon.close()
+
+
+def test_typecheck(daemon: MypyDaemon):
+    examples = [
+        CodeExample.create('x: int = "a"\n', start_line=3, indent=4),
+        CodeExample.create('import os\n\nprint(os.foo)\n', start_line=10),
+        CodeExample.create('x = (\n'),
+        CodeExample.create('y: int = 1\n'),
+    ]
+    daemon.add(examples)
+    assert mypy_message(daemon.check(examples[0])) == (
+        'mypy failed:\n'
+        '  testing.md:4:14: error: Incompatible types in assignment '
+        '(expression has type "str", variable has type "int")  [assignment]\n'
+        '  Found 1 error.'
+    )
+    assert [str(d) for d in daemon.check(examples[1])] == [
+        'testing.md:13:7: error: Module has no attribute "foo"  [attr-defined]'
+    ]
+    assert [(d.line, d.code) for d in daemon.check(examples[2])] == [(1, 'syntax')]
+    assert daemon.check(examples[3]) == []
+
+    # only the changed example is written again
+    files = sorted(daemon._dir.glob('_pytest_examples_*/example_*.py'))
+    mtimes = [f.stat().st_mtime_ns for f in files]
+    examples[0].source = 'x: int = 1\n'
+    assert daemon.check(examples[0]) == []
+    assert [f.stat().st_mtime_ns != m for f, m in zip(files, mtimes)] == [True, False, False]
+
+
+def test_eval_example_typecheck(pytester: pytest.Pytester):
+    pytester.makefile(
+        '.md',
+        # language=Markdown
+        my_file="""
+```py
+def add(a: int, b: int) -> int:
+    return a + b
+```
+
+```py
+x: str = 1 + 2
+```
+""",
+    )
+    # language=Python
+    pytester.makepyfile(
+        """
+import pytest
+
+from pytest_examples import find_examples, CodeExample, EvalExample
+
+
+@pytest.mark.parametrize('example', find_examples('my_file.md'), ids=str)
+def test_typecheck(example: CodeExample, eval_example: EvalExample):
+    eval_example.typecheck(example)
+"""
+    )
+    result = pytester.runpytest('-p', 'no:pretty', '-v')
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            '*test_typecheck?my_file.md:6-8? FAILED*',
+            '  my_file.md:7:10: error: Incompatible types in assignment*  [[]assignment]',
+            '  Found 1 error.',
+        ]
+    )
+
+
+def test_project_examples_package(tmp_path, monkeypatch: pytest.MonkeyPatch, daemon: MypyDaemon):
+    # the project has its own `examples` package, which examples import
+    (tmp_path / 'examples').mkdir()
+    (tmp_path / 'examples' / '__init__.py').touch()
+    (tmp_path / 'examples' / 'utils.py').write_text('def helper() -> int:\n    return 1\n')
+    (tmp_path / 'mypy.ini').write_text('[mypy]\nmypy_path = .\n')
+    monkeypatch.chdir(tmp_path)
+    example = CodeExample.create('from examples.utils import helper\n\nx: str = helper()\n')
+    assert [d.message for d in daemon.check(example)] == [
+        'Incompatible types in assignment (expression has type "int", variable has type "str")'
+    ]
@@ -169,3 +169,102 @@ def test_b(example: CodeExample, eval_example: EvalExample):
     result = pytester.runpytest('-p', 'no:pretty', '--update-examples')
     result.assert_outcomes(errors=1, passed=4)
     assert 'RuntimeError: Cannot update the same file in separate groups!' in '\n'.join(result.outlines)
+
+
+def test_update_fixpoint(pytester: pytest.Pytester):
+    source = """\
+```py
+with open(__file__) as f:
+    print(len(f.read().splitlines()))
+```"""
+    md_file = pytester.makefile('.md', my_file=source)
+    pytester.makepyfile(
+        # language=Python
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_examples(example: CodeExample, eval_example: EvalExample):
+    if eval_example.update_examples:
+        eval_example.format(example)
+        eval_example.run_print_update(example)
+    else:
+        eval_example.run_print_check(example)
+        """
+    )
+
+    # the output line changes the length of the example, so a single update leaves stale output
+    result = pytester.runpytest('-p', 'no:pretty', '--update-examples', '--update-examples-disable-summary')
+    result.assert_outcomes(passed=1)
+    assert md_file.read_text() == source.replace('\n```', '\n    #> 2\n```')
+    result = pytester.runpytest('-p', 'no:pretty')
+    result.assert_outcomes(failed=1)
+
+    md_file.write_text(source)
+    result = pytester.runpytest('-p', 'no:pretty', '--update-examples-fixpoint', '--update-examples-disable-summary')
+    result.assert_outcomes(passed=1)
+    assert md_file.read_text() == source.replace('\n```', '\n    #> 3\n```')
+    result = pytester.runpytest('-p', 'no:pretty')
+    result.assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize(
+    'update',
+    [
+        'eval_example.run_print_update(example)',
+        'asyncio.run(eval_example.arun_print_update(example))',
+        "eval_example.run_group([example], mode='update')",
+        "eval_example.run_threaded([example], mode='update')",
+    ],
+)
+def test_update_fixpoint_methods(pytester: pytest.Pytester, update: str):
+    source = """\
+```py
+with open(__file__) as f:
+    print(len(f.read().splitlines()))
+```"""
+    md_file = pytester.makefile('.md', my_file=source)
+    pytester.makepyfile(
+        # language=Python
+        f"""
+import asyncio
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.format(example)
+    {update}
+        """
+    )
+
+    result = pytester.runpytest('-p', 'no:pretty', '--update-examples-fixpoint', '--update-examples-disable-summary')
+    result.assert_outcomes(passed=1)
+    assert md_file.read_text() == source.replace('\n```', '\n    #> 3\n```')
+
+
+def test_update_fixpoint_not_stable(pytester: pytest.Pytester):
+    md_file = pytester.makefile('.md', my_file='```py\nimport time\nprint(time.perf_counter_ns())\n```')
+    pytester.makepyfile(
+        # language=Python
+        """
+from pytest_examples import find_examples, CodeExample, EvalExample
+import pytest
+
+@pytest.mark.parametrize('example', find_examples('.'), ids=str)
+def test_find_examples(example: CodeExample, eval_example: EvalExample):
+    eval_example.format(example)
+    eval_example.fixpoint_max_passes = 3
+    eval_example.run_print_update(example)
+        """
+    )
+
+    result = pytester.runpytest(
+        '-p', 'no:pretty', '-W', 'default', '--update-examples-fixpoint', '--update-examples-disable-summary'
+    )
+    result.assert_outcomes(passed=1, warnings=1)
+    result.stdout.fnmatch_lines(
+        ['*UpdateNotStableWarning: code still changed after 3 passes of --update-examples-fixpoint: my_file.md:1-4']
+    )
+    assert md_file.read_text().startswith('```py\nimport time\n\nprint(time.perf_counter_ns())\n#> ')
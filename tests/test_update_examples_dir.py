@@ -33,13 +33,27 @@ def find_cases():
             yield pytest.param(f, example, output, test, test_count, id=f.name)
 
 
+@pytest.mark.parametrize('formatter', ['black', 'ruff'])
 @pytest.mark.parametrize('file_path,example,output,test_code,test_count', find_cases())
 def test_cases_update(
-    pytester: pytest.Pytester, file_path: Path, example: str, output: str, test_code: str, test_count: int
+    pytester: pytest.Pytester,
+    file_path: Path,
+    example: str,
+    output: str,
+    test_code: str,
+    test_count: int,
+    formatter: str,
 ):
     input_file = pytester.makefile(file_path.suffix, **{f'case_{file_path.stem}': example})
     pytester.makepyfile(test_code)
-    result = pytester.runpytest('-p', 'no:pretty', '-vs', '--update-examples', '--update-examples-disable-summary')
+    result = pytester.runpytest(
+        '-p',
+        'no:pretty',
+        '-vs',
+        '--update-examples',
+        '--update-examples-disable-summary',
+        f'--examples-formatter={formatter}',
+    )
     result.assert_outcomes(passed=test_count)
 
     # debug(input_file.read_text(), output)
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from pytest_examples import CodeExample, EvalExample
+from pytest_examples.virtual_time import VirtualTimeEventLoop, virtual_time
+
+
+def test_virtual_time_sync(tmp_path, eval_example: EvalExample):
+    # language=Python
+    code = """
+import time
+
+start = time.monotonic()
+wall_start = time.time()
+for attempt in range(3):
+    time.sleep(2**attempt * 30)
+    print(f'retry {attempt} after {time.monotonic() - start:.0f}s')
+    #> retry 0 after 30s
+    #> retry 1 after 90s
+    #> retry 2 after 210s
+print(round(time.time() - wall_start))
+#> 210
+"""
+    example = CodeExample.create(code, path=tmp_path / 'my_file.md')
+    eval_example.set_config(virtual_time=True)
+    start = time.perf_counter()
+    eval_example.run_print_check(example)
+    assert time.perf_counter() - start < 1
+    assert time.sleep.__module__ == 'time'
+
+
+def test_virtual_time_asyncio_run(tmp_path, eval_example: EvalExample):
+    # language=Python
+    code = """
+import asyncio
+
+
+async def worker(name, delay):
+    await asyncio.sleep(delay)
+    print(name)
+    #> fast
+    #> medium
+    #> slow
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(worker('slow', 300), worker('fast', 100), worker('medium', 200))
+    try:
+        await asyncio.wait_for(asyncio.sleep(3600), timeout=60)
+    except asyncio.TimeoutError:
+        print('timed out after', round(loop.time() - start))
+        #> timed out after 360
+
+
+asyncio.run(main())
+"""
+    example = CodeExample.create(code, path=tmp_path / 'my_file.md', prefix='py virtual_time="true"')
+    start = time.perf_counter()
+    eval_example.run_print_check(example)
+    assert time.perf_counter() - start < 1
+
+
+def test_virtual_time_async_mode(tmp_path, eval_example: EvalExample):
+    # language=Python
+    code = """
+import asyncio
+import time
+
+start = time.monotonic()
+await asyncio.sleep(3600)
+print(round(time.monotonic() - start))
+#> 3600
+"""
+    example = CodeExample.create(code, path=tmp_path / 'my_file.md')
+    eval_example.async_mode = True
+    eval_example.set_config(virtual_time=True)
+    eval_example.run_print_check(example)
+
+
+def test_virtual_time_disabled(tmp_path, eval_example: EvalExample):
+    example = CodeExample.create(
+        'import time\n\ntime.sleep(0.01)\n', path=tmp_path / 'my_file.md', prefix='py virtual_time="false"'
+    )
+    eval_example.set_config(virtual_time=True)
+    start = time.perf_counter()
+    eval_example.run(example)
+    assert time.perf_counter() - start >= 0.01
+
+    example = CodeExample.create('x = 1', path=tmp_path / 'my_file.md', prefix='py virtual_time="yes"')
+    with pytest.raises(ValueError, match='invalid value for virtual_time \'yes\', expected "true" or "false"'):
+        eval_example.run(example)
+
+
+def test_virtual_time_loop_outside_context():
+    loop = VirtualTimeEventLoop()
+    try:
+        start = time.perf_counter()
+        loop.run_until_complete(asyncio.sleep(0.01))
+        assert time.perf_counter() - start >= 0.01
+    finally:
+        loop.close()
+
+    with virtual_time() as clock:
+        asyncio.run(asyncio.sleep(100))
+        assert clock.elapsed == pytest.approx(100, abs=0.1)
+    assert asyncio.new_event_loop.__module__ == 'asyncio.events'